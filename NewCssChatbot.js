@@ -24,7 +24,8 @@ const Chatbot = (function () {
       agentType: null,
       maxWidth: 550,
       maxHeight: 650,
-      formatPreference: "natural_language"
+      formatPreference: "natural_language",
+      exportFormat: null // "xlsx", "csv", "csv.gz" or "csv.zst"; null uses the server default
     };
   
     let messagesContainer, chatWindow, formatToggle, selectionScreen;
@@ -598,7 +599,9 @@ const Chatbot = (function () {
       input.value = "";
       showThinkingIndicator();
       try {
-        const responseData = await askAgent(text);
+        // One key per send: a retried POST gets the server's stored answer instead of re-running the question
+        const idempotencyKey = newIdempotencyKey();
+        const responseData = await askAgent(text, idempotencyKey);
         removeThinkingIndicator();
         addMessage(responseData.response, "bot-message");
       } catch (error) {
@@ -608,23 +611,37 @@ const Chatbot = (function () {
       }
     }
   
-    async function askAgent(question) {
+    function newIdempotencyKey() {
+      if (window.crypto && window.crypto.randomUUID) return window.crypto.randomUUID();
+      return Date.now().toString(36) + "-" + Math.random().toString(36).slice(2);
+    }
+  
+    async function askAgent(question, idempotencyKey) {
       try {
         const payload = {
           question,
           thread_id: config.threadId,
           format_preference: config.formatPreference,
-          agent_type: config.agentType
+          agent_type: config.agentType,
+          export_format: config.exportFormat || undefined
         };
         const apiUrl = config.apiUrls[config.agentType];
         console.log("Request payload:", JSON.stringify(payload));
         console.log("Using API URL:", apiUrl);
-        const response = await fetch(apiUrl, {
+        const request = {
           method: "POST",
-          headers: { "Content-Type": "application/json" },
+          headers: { "Content-Type": "application/json", "Idempotency-Key": idempotencyKey },
           credentials: "include",
           body: JSON.stringify(payload)
-        });
+        };
+        let response;
+        try {
+          response = await fetch(apiUrl, request);
+        } catch (networkError) {
+          // Network failure: retry once with the same key, so a request that did reach the server is not run twice
+          console.warn("Request failed, retrying once:", networkError);
+          response = await fetch(apiUrl, request);
+        }
         if (!response.ok) {
           const errorData = await response.json().catch(() => ({}));
           throw new Error(`Server error: ${response.status} - ${errorData.detail || "Unknown error"}`);
@@ -0,0 +1,270 @@
+import asyncio
+import logging
+import math
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import closing
+from typing import Any, Dict, Optional, Tuple
+
+import oracledb
+
+from config import Config
+import oracle_db_utils
+from rate_limit import TokenBucket
+
+logger = logging.getLogger("admission")
+
+GLOBAL_KEY = "*global*"
+
+
+class AdmissionRejected(Exception):
+    """The caller is over its rate and cannot wait for a token within ADMISSION_MAX_WAIT_SECONDS (or its wait queue is full)."""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+def _refilled(tokens: float, updated: float, now: float, capacity: float, refill_rate: float) -> float:
+    return min(capacity, tokens + max(0.0, now - updated) * refill_rate)
+
+
+class AdmissionBackend(ABC):
+    """
+    Token buckets by key. take() removes `amount` tokens and returns 0.0, or returns the seconds until
+    they would be available and takes nothing; a negative amount gives tokens back.
+    """
+
+    @abstractmethod
+    def take(self, key: str, amount: float, capacity: float, refill_rate: float) -> float:
+        raise NotImplementedError
+
+
+class MemoryAdmissionBackend(AdmissionBackend):
+    """Buckets of this worker process only (rate_limit.TokenBucket); N workers admit N times the configured rate."""
+
+    # Buckets unused this long are full again and are dropped, so one-off callers do not accumulate
+    IDLE_SWEEP_SECONDS = 60
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[TokenBucket, float]] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.monotonic()
+
+    def take(self, key: str, amount: float, capacity: float, refill_rate: float) -> float:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep > self.IDLE_SWEEP_SECONDS:
+                refill_seconds = capacity / refill_rate
+                self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < refill_seconds}
+                self._last_sweep = now
+            bucket = self._buckets[key][0] if key in self._buckets else TokenBucket(capacity, refill_rate)
+            self._buckets[key] = (bucket, now)
+        if amount < 0:
+            bucket.adjust(-amount)
+            return 0.0
+        return bucket.try_acquire(amount)
+
+
+class SQLiteAdmissionBackend(AdmissionBackend):
+    """Buckets in a SQLite file, shared by the worker processes of one host."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(sqlite3.connect(self.path, timeout=30)) as conn, conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS admission_buckets (bucket_key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)")
+        logger.info(f"SQLiteAdmissionBackend initialized at {path}")
+
+    def take(self, key: str, amount: float, capacity: float, refill_rate: float) -> float:
+        amount = min(float(amount), capacity)
+        with closing(sqlite3.connect(self.path, timeout=30, isolation_level=None)) as conn:
+            # BEGIN IMMEDIATE takes the write lock up front, so concurrent workers read-modify-write in turn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute("SELECT tokens, updated_at FROM admission_buckets WHERE bucket_key = ?", (key,)).fetchone()
+                now = time.time()
+                tokens = capacity if row is None else _refilled(row[0], row[1], now, capacity, refill_rate)
+                wait = 0.0 if tokens >= amount else (amount - tokens) / refill_rate
+                if wait == 0.0:
+                    tokens = min(capacity, tokens - amount)
+                conn.execute(
+                    "INSERT INTO admission_buckets (bucket_key, tokens, updated_at) VALUES (?, ?, ?) "
+                    "ON CONFLICT(bucket_key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                    (key, tokens, now)
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+class OracleAdmissionBackend(AdmissionBackend):
+    """Buckets in the ADMISSION_BUCKETS table (migration v006), shared by every worker and pod."""
+
+    def take(self, key: str, amount: float, capacity: float, refill_rate: float) -> float:
+        amount = min(float(amount), capacity)
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            for attempt in range(2):
+                # The row lock serializes workers taking from the same bucket; the transaction is two statements long
+                cursor.execute("SELECT TOKENS, UPDATED_AT FROM ADMISSION_BUCKETS WHERE BUCKET_KEY = :bucket_key FOR UPDATE", bucket_key=key)
+                row = cursor.fetchone()
+                now = time.time()
+                tokens = capacity if row is None else _refilled(float(row[0]), float(row[1]), now, capacity, refill_rate)
+                wait = 0.0 if tokens >= amount else (amount - tokens) / refill_rate
+                if wait == 0.0:
+                    tokens = min(capacity, tokens - amount)
+                try:
+                    if row is None:
+                        cursor.execute(
+                            "INSERT INTO ADMISSION_BUCKETS (BUCKET_KEY, TOKENS, UPDATED_AT) VALUES (:bucket_key, :tokens, :updated_at)",
+                            bucket_key=key, tokens=tokens, updated_at=now
+                        )
+                    else:
+                        cursor.execute(
+                            "UPDATE ADMISSION_BUCKETS SET TOKENS = :tokens, UPDATED_AT = :updated_at WHERE BUCKET_KEY = :bucket_key",
+                            bucket_key=key, tokens=tokens, updated_at=now
+                        )
+                    conn.commit()
+                    return wait
+                except oracledb.IntegrityError:
+                    # Another worker created the bucket first (ORA-00001); read it again under its row lock
+                    conn.rollback()
+                    if attempt:
+                        raise
+            return wait
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error updating admission bucket {key}: {error_obj.message}", exc_info=True)
+            raise
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+
+class AdmissionController:
+    """
+    Per-caller admission for the query endpoints. Each caller (gateway-set user, else client address)
+    has a token bucket of `burst` requests refilled at `rate_per_minute`; with global_rate_per_minute
+    set, all callers together also share one bucket. A caller over its rate waits for a token if one
+    comes within `max_wait` seconds and fewer than `max_queue` of its requests are already waiting;
+    otherwise the request is rejected at once (429 with Retry-After). If the backend fails, requests
+    are admitted: the limiter must not take the service down with it.
+    """
+
+    def __init__(self, backend: AdmissionBackend, rate_per_minute: float, burst: float, max_wait: float,
+                 max_queue: int, global_rate_per_minute: float = 0, global_burst: float = 0):
+        self.backend = backend
+        self.refill_rate = rate_per_minute / 60.0
+        self.burst = max(1.0, burst)
+        self.max_wait = max_wait
+        self.max_queue = max_queue
+        self.global_refill_rate = global_rate_per_minute / 60.0
+        self.global_burst = max(1.0, global_burst or global_rate_per_minute)
+        self._waiting: Dict[str, int] = {}
+        self._stats_lock = threading.Lock()
+        self.admitted = 0
+        self.delayed = 0
+        self.rejected = 0
+        self.backend_errors = 0
+
+    def _take(self, key: str, cost: float) -> float:
+        wait = self.backend.take(key, cost, self.burst, self.refill_rate)
+        if wait > 0 or self.global_refill_rate <= 0:
+            return wait
+        global_wait = self.backend.take(GLOBAL_KEY, cost, self.global_burst, self.global_refill_rate)
+        if global_wait > 0:
+            # The caller's tokens are given back so that waiting on the global limit costs it nothing
+            self.backend.take(key, -cost, self.burst, self.refill_rate)
+        return global_wait
+
+    def _count(self, counter: str) -> None:
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    async def admit(self, caller: str, cost: float = 1) -> float:
+        """Waits until `caller` may run a request costing `cost` tokens; returns the seconds waited. Raises AdmissionRejected."""
+        if cost > self.burst:
+            # The buckets cap a take at their capacity, which would silently charge less than `cost`
+            raise ValueError(f"A cost of {cost} tokens exceeds the burst of {self.burst} and could never be charged in full")
+        started = time.monotonic()
+        queued = False
+        try:
+            while True:
+                try:
+                    wait = await asyncio.get_running_loop().run_in_executor(None, self._take, caller, cost)
+                except Exception as e:
+                    self._count("backend_errors")
+                    logger.error(f"Admission backend failed, admitting {caller}: {str(e)}", exc_info=True)
+                    return 0.0
+                waited = time.monotonic() - started
+                if wait <= 0:
+                    self._count("admitted")
+                    if queued:
+                        self._count("delayed")
+                    return waited
+                if waited + wait > self.max_wait:
+                    self._count("rejected")
+                    raise AdmissionRejected(f"Rate limit exceeded for {caller}; retry in {wait:.1f}s", wait)
+                if not queued:
+                    with self._stats_lock:
+                        if self._waiting.get(caller, 0) >= self.max_queue:
+                            self.rejected += 1
+                            raise AdmissionRejected(f"Too many requests from {caller} already waiting", wait)
+                        self._waiting[caller] = self._waiting.get(caller, 0) + 1
+                    queued = True
+                await asyncio.sleep(wait)
+        finally:
+            if queued:
+                with self._stats_lock:
+                    self._waiting[caller] -= 1
+                    if not self._waiting[caller]:
+                        del self._waiting[caller]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "backend": self.backend.__class__.__name__,
+                "rate_per_minute": round(self.refill_rate * 60, 3), "burst": self.burst,
+                "global_rate_per_minute": round(self.global_refill_rate * 60, 3),
+                "max_wait_seconds": self.max_wait, "max_queue": self.max_queue,
+                "admitted": self.admitted, "delayed": self.delayed, "rejected": self.rejected,
+                "backend_errors": self.backend_errors, "waiting_now": sum(self._waiting.values()),
+            }
+
+
+_controller: Optional[AdmissionController] = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController:
+    """Returns the controller with the configured backend (ADMISSION_BACKEND = "memory", "sqlite" or "oracle"), creating it on first use."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            if Config.ADMISSION_BACKEND == "oracle":
+                backend = OracleAdmissionBackend()
+            elif Config.ADMISSION_BACKEND == "sqlite":
+                backend = SQLiteAdmissionBackend(Config.ADMISSION_SQLITE_PATH)
+            else:
+                backend = MemoryAdmissionBackend()
+            _controller = AdmissionController(
+                backend,
+                rate_per_minute=Config.ADMISSION_RATE_PER_MINUTE,
+                burst=Config.ADMISSION_BURST,
+                max_wait=Config.ADMISSION_MAX_WAIT_SECONDS,
+                max_queue=Config.ADMISSION_MAX_QUEUE,
+                global_rate_per_minute=Config.ADMISSION_GLOBAL_RATE_PER_MINUTE,
+                global_burst=Config.ADMISSION_GLOBAL_BURST,
+            )
+            logger.info(f"Admission control: {_controller.stats()}")
+        return _controller
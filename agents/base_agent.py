@@ -3,33 +3,34 @@ from langgraph.graph import StateGraph, END #
 # from langgraph.checkpoint.sqlite import SqliteSaver # Removed
 from langgraph.graph.message import add_messages #
 from typing import TypedDict, Annotated, List, Dict, Optional, Literal #
-from langchain_openai import AzureChatOpenAI #
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage #
-from tools.base_query_tools import SCMQueryTools, HCMQueryTools, oracle_bip_tool, ContextMatcher #
+from tools.base_query_tools import SCMQueryTools, HCMQueryTools, oracle_bip_tool, ContextMatcher, PREVIEW_TOTAL_COLUMN #
+from tools.sql_validator import sql_validator
 import logging #
 from config import Config #
+from llm_utils import get_llm
+from request_deadline import Deadline, DeadlineExceeded, stage_timeout
+from request_memory import MemoryBudget, SpilledCSV, SpilledFile, frame_bytes, record_stage
+from request_coalescing import normalize_question
+from run_cache import RunCache, cached
+from bip_routing import BIPEndpoint, get_bip_router
 import pandas as pd #
 from io import StringIO, BytesIO #
-import base64 #
 import requests #
 from datetime import datetime #
 import uuid #
 
-# Import Oracle DB utilities
-import oracle_db_utils #
-import oracledb # For Oracle error handling #
-
-# Configure logging with file output
-logging.basicConfig( #
-    level=logging.DEBUG,  #
-    filename="chatbot.log", #
-    filemode="a", #
-    format="%(asctime)s:%(levelname)s:%(name)s:%(message)s" #
-)
+from jobs.export_jobs import export_job_manager
+from markdown_render import render_markdown_table
+from result_cache import result_cache
+from export_formats import CSV_FORMATS, dataframe_to_xlsx, encode_csv, export_filename, export_label, export_mimetype, export_spilled
+from storage.chat_store import get_chat_store
+
+# Handlers and levels are configured centrally (logging_config.setup_logging)
 logger = logging.getLogger("agent") #
-console_handler = logging.StreamHandler() #
-console_handler.setLevel(logging.DEBUG) #
-logger.addHandler(console_handler) #
+
+# Distinct values counted per text column when describing a spilled result chunk by chunk
+MAX_TRACKED_UNIQUE_VALUES = 10000
 
 class AgentState(TypedDict): #
     messages: Annotated[List[BaseMessage], add_messages] #
@@ -41,110 +42,39 @@ class AgentState(TypedDict): #
     format_preference: Optional[str] #
     agent_type: Optional[str] # This refers to the agent_stream for DB
     attachment: Optional[Dict[str, str]] # ADDED: To hold generated file data
+    context_id: Optional[int] # ID of the matched QUERY_CONTEXTS row, used to key cached validator metadata
+    total_rows: Optional[int] # Row count of the full result; csv_data may only hold a preview of it
+    export_deferred: Optional[bool] # The preview does not hold every row; run() hands the full extract to a background export job
+    deadline: Optional[Deadline] # End-to-end time budget of the request; each node derives its LLM/BIP timeout from it
+    export_format: Optional[str] # Download format of the full result: "xlsx", "csv", "csv.gz" or "csv.zst"
+    memory_budget: Optional[MemoryBudget] # Per-request memory budget; stages record their sizes against it
+    spilled_result: Optional[SpilledCSV] # Full result in a memory-mapped temp file when it outgrew the budget; csv_data then holds only its first rows
+    run_cache: Optional[RunCache] # Lookups shared by the questions of one /batch request (contexts, classifications, SQL)
+    bip_endpoint: Optional[BIPEndpoint] # Fusion pod that runs this request's reports (routed by tenant or agent stream)
 
 class BaseAgent:
     def __init__(self, query_tools, classification_prompt: str, general_response: str): #
-        self.llm = AzureChatOpenAI( #
-            azure_endpoint=Config.AZURE_OPENAI_ENDPOINT, #
-            api_key=Config.AZURE_OPENAI_KEY, #
-            api_version="2024-08-01-preview", #
-            deployment_name="gpt-35-turbo" #
-        )
+        self.llm = get_llm() #
         self.query_tools = query_tools #
         self.context_matcher = ContextMatcher() #
         self.oracle_bip_tool = oracle_bip_tool #
+        self.sql_validator = sql_validator
+        self.chat_store = get_chat_store()
         self.classification_prompt = classification_prompt #
         self.general_response = general_response #
         self.graph = self._build_graph().compile() #
-        logger.info(f"Initialized {self.__class__.__name__} without persistent graph checkpointer. History managed in Oracle.") #
+        logger.info(f"Initialized {self.__class__.__name__} without persistent graph checkpointer. History managed by {self.chat_store.__class__.__name__}.") #
 
-    def _save_message_to_oracle(self, thread_id: str, sender_role: str, content: str, agent_stream: str) -> Optional[int]: # MODIFIED: to return message ID
-        """Saves a single message turn to Oracle and returns the new MESSAGE_ID."""
-        conn = None #
-        try:
-            conn = oracle_db_utils.get_oracle_connection() #
-            cursor = conn.cursor() #
-            
-            # Create a variable to hold the returned ID
-            new_id_var = cursor.var(oracledb.NUMBER)
-            
-            sql = """
-                INSERT INTO CHATBOT_CONVERSATION_HISTORY 
-                (THREAD_ID, MESSAGE_TIMESTAMP, SENDER_ROLE, MESSAGE_CONTENT, AGENT_STREAM)
-                VALUES (:thread_id, CURRENT_TIMESTAMP, :sender_role, :message_content, :agent_stream)
-                RETURNING MESSAGE_ID INTO :new_id
-            """ #
-            logger.debug(f"Saving message to Oracle: Thread ID {thread_id}, Sender Role {sender_role}, Agent Stream {agent_stream}, Content (truncated): {content[:100]}") #
-            cursor.execute(sql, thread_id=thread_id, sender_role=sender_role, message_content=content, agent_stream=agent_stream, new_id=new_id_var) #
-            
-            # Get the returned ID
-            message_id = new_id_var.getvalue()[0]
-            
-            conn.commit() #
-            logger.info(f"Message saved to Oracle with MESSAGE_ID: {message_id} for thread_id: {thread_id}") #
-            return message_id
-        except oracledb.Error as e: #
-            error_obj, = e.args #
-            logger.error(f"Oracle DB error saving message for thread_id {thread_id}: {error_obj.message}", exc_info=True) #
-            return None
-        except ConnectionError as e: #
-            logger.error(f"Connection error saving message to Oracle: {str(e)}", exc_info=True) #
-            return None
-        except Exception as e: #
-            logger.error(f"Unexpected error saving message to Oracle: {str(e)}", exc_info=True) #
-            return None
-        finally:
-            if conn: #
-                oracle_db_utils.release_oracle_connection(conn) #
-
-    def _load_recent_messages_from_oracle(self, thread_id: str, agent_stream: str, limit: int = 20) -> List[BaseMessage]: #
-        """Loads the most recent messages for a given thread_id and agent_stream from Oracle."""
+    def _load_recent_messages(self, thread_id: str, agent_stream: str, limit: int = 20) -> List[BaseMessage]: #
+        """Loads the most recent messages for a given thread_id and agent_stream from the chat store."""
         messages: List[BaseMessage] = [] #
-        conn = None #
-        try:
-            conn = oracle_db_utils.get_oracle_connection() #
-            cursor = conn.cursor() #
-            sql = """
-                SELECT SENDER_ROLE, MESSAGE_CONTENT 
-                FROM (
-                    SELECT SENDER_ROLE, MESSAGE_CONTENT, MESSAGE_TIMESTAMP
-                    FROM CHATBOT_CONVERSATION_HISTORY
-                    WHERE THREAD_ID = :thread_id AND AGENT_STREAM = :agent_stream
-                    ORDER BY MESSAGE_TIMESTAMP DESC
-                )
-                WHERE ROWNUM <= :limit
-            """ #
-            cursor.execute(sql, thread_id=thread_id, agent_stream=agent_stream, limit=limit) #
-            
-            fetched_rows = cursor.fetchall() #
-            logger.debug(f"Loaded {len(fetched_rows)} message rows from Oracle for thread {thread_id}, agent_stream {agent_stream}.") #
-
-            for row in reversed(fetched_rows): #
-                sender_role, message_content_lob = row #
-                if message_content_lob is None: #
-                    continue #
-                
-                content_str = message_content_lob.read() if hasattr(message_content_lob, 'read') else str(message_content_lob) #
-
-                if sender_role == "USER": #
-                    messages.append(HumanMessage(content=content_str)) #
-                elif sender_role == "AI": #
-                    messages.append(AIMessage(content=content_str)) #
-            logger.info(f"Reconstructed {len(messages)} messages from Oracle for thread_id: {thread_id}") #
-            return messages #
-        except oracledb.Error as e: #
-            error_obj, = e.args #
-            logger.error(f"Oracle DB error loading messages for thread_id {thread_id}: {error_obj.message}", exc_info=True) #
-            return [] #
-        except ConnectionError as e: #
-            logger.error(f"Connection error loading messages from Oracle: {str(e)}", exc_info=True) #
-            return [] #
-        except Exception as e: #
-            logger.error(f"Unexpected error loading messages from Oracle: {str(e)}", exc_info=True) #
-            return [] #
-        finally:
-            if conn: #
-                oracle_db_utils.release_oracle_connection(conn) #
+        for sender_role, content_str in self.chat_store.load_recent_messages(thread_id, agent_stream, limit): #
+            if sender_role == "USER": #
+                messages.append(HumanMessage(content=content_str)) #
+            elif sender_role == "AI": #
+                messages.append(AIMessage(content=content_str)) #
+        logger.info(f"Reconstructed {len(messages)} messages for thread_id: {thread_id}") #
+        return messages #
 
     def _build_graph(self) -> StateGraph: #
         logger.info(f"Building LangGraph workflow for {self.__class__.__name__}") #
@@ -187,8 +117,12 @@ class BaseAgent:
 
         logger.info(f"{self.__class__.__name__}: Classifying question: {latest_message_content} for agent_stream: {agent_stream_from_state}") #
         try:
-            response = self.llm.invoke(self.classification_prompt.format(latest_message=latest_message_content)) #
-            question_type = response.content.strip().lower() #
+            timeout = stage_timeout(state.get("deadline"), "question classification")
+            # Classification only looks at the latest message, so a batch classifies each distinct question once
+            question_type = cached(
+                state.get("run_cache"), "classification", normalize_question(latest_message_content),
+                lambda: self.llm.invoke(self.classification_prompt.format(latest_message=latest_message_content), timeout=timeout).content.strip().lower()
+            ) #
             if question_type not in ["non-general", "general"]: # Updated "inventory" to "non-general"
                 logger.warning(f"{self.__class__.__name__}: Invalid question type '{question_type}', defaulting to 'non-general'") # Updated default
                 question_type = "non-general" # Updated default
@@ -198,6 +132,14 @@ class BaseAgent:
                 "format_preference": state.get("format_preference", "natural_language"), #
                 "agent_type": agent_stream_from_state #
             }
+        except DeadlineExceeded as e:
+            logger.warning(f"{self.__class__.__name__}: {str(e)}")
+            return {
+                "question_type": "non-general",
+                "error": str(e),
+                "format_preference": state.get("format_preference", "natural_language"),
+                "agent_type": agent_stream_from_state
+            }
         except Exception as e: #
             logger.error(f"{self.__class__.__name__}: Error classifying question: {str(e)}", exc_info=True) #
             return { #
@@ -222,24 +164,38 @@ class BaseAgent:
 
         agent_stream_from_state = state.get("agent_type", "").lower() # agent_type in state now refers to agent_stream #
         logger.info(f"{self.__class__.__name__}: Matching context for question: {latest_question_content}, agent_stream: {agent_stream_from_state}") #
+        if state.get("error"):
+            # Classification already ran out of time; do not spend more of the budget
+            logger.warning(f"{self.__class__.__name__}: Skipping context matching due to earlier error")
+            return {}
         
         try:
-            contexts = self.context_matcher.get_contexts(agent_stream_from_state) #
-            logger.debug(f"{self.__class__.__name__}: Available contexts for {agent_stream_from_state}: {contexts}") #
+            run_cache = state.get("run_cache")
+            contexts = cached(run_cache, "contexts", agent_stream_from_state, lambda: self.context_matcher.get_contexts(agent_stream_from_state), keep=bool) #
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"{self.__class__.__name__}: Available contexts for {agent_stream_from_state}: {[c.get('id') for c in contexts]}") #
             if not contexts: #
                 logger.warning(f"{self.__class__.__name__}: No contexts available for agent_stream: {agent_stream_from_state}") #
                 return {"error": "No contexts found for the specified agent type."} #
-            context_id = self.context_matcher.match_context(latest_question_content, agent_stream_from_state) #
+            timeout = stage_timeout(state.get("deadline"), "context matching")
+            context_id = cached(
+                run_cache, "context_match", (agent_stream_from_state, normalize_question(latest_question_content)),
+                lambda: self.context_matcher.match_context(latest_question_content, agent_stream_from_state, timeout, contexts),
+                keep=lambda matched: matched is not None
+            ) #
             if not context_id: #
                 logger.warning(f"{self.__class__.__name__}: No matching context found for question: {latest_question_content}") #
                 return {"error": "I couldn't identify the query type. Please clarify your question."} #
-            selected_query = self.context_matcher.get_query_by_id(context_id) #
+            selected_query = cached(run_cache, "context_query", context_id, lambda: self.context_matcher.get_query_by_id(context_id), keep=bool) #
             if not selected_query: #
                 logger.error(f"{self.__class__.__name__}: No query found for context_id: {context_id}") #
                 return {"error": "Error retrieving query for the matched context."} #
             logger.info(f"{self.__class__.__name__}: Context matched, selected context ID: {context_id}, query starts with: {selected_query[:50]}...") #
             logger.debug(f"{self.__class__.__name__}: Full selected query: {selected_query}") #
-            return {"selected_query": selected_query} #
+            return {"selected_query": selected_query, "context_id": context_id} #
+        except DeadlineExceeded as e:
+            logger.warning(f"{self.__class__.__name__}: {str(e)}")
+            return {"error": str(e)}
         except Exception as e: #
             logger.error(f"{self.__class__.__name__}: Error matching context: {str(e)}", exc_info=True) #
             return {"error": f"Error matching context: {str(e)}"} #
@@ -260,10 +216,29 @@ class BaseAgent:
             return {"error": "No query selected to process."} #
         try:
             logger.debug(f"{self.__class__.__name__}: Base query: {selected_query}") #
-            modified_query = self.query_tools.generate_sql(conversation_history_str, selected_query) #
-            logger.info(f"{self.__class__.__name__}: Query modified successfully") #
-            logger.debug(f"{self.__class__.__name__}: Modified query: {modified_query}") #
-            return {"query": modified_query} #
+            feedback = None
+            for attempt in range(Config.SQL_VALIDATION_RETRIES + 1):
+                timeout = stage_timeout(state.get("deadline"), "SQL generation")
+                modified_query = cached(
+                    state.get("run_cache"), "sql", (conversation_history_str, selected_query, feedback),
+                    lambda: self.query_tools.generate_sql(conversation_history_str, selected_query, feedback, timeout)
+                ) #
+                logger.info(f"{self.__class__.__name__}: Query modified successfully (attempt {attempt + 1})") #
+                logger.debug(f"{self.__class__.__name__}: Modified query: {modified_query}") #
+                validation = self.sql_validator.validate(
+                    self.oracle_bip_tool.clean_query(modified_query),
+                    selected_query,
+                    self.query_tools.columns,
+                    state.get("context_id")
+                )
+                if validation["valid"]:
+                    return {"query": modified_query} #
+                feedback = "\n".join(f"- {err}" for err in validation["errors"])
+                logger.warning(f"{self.__class__.__name__}: Generated SQL failed validation on attempt {attempt + 1}: {validation['errors']}")
+            return {"query": modified_query, "error": f"The generated SQL failed validation: {'; '.join(validation['errors'])}"}
+        except DeadlineExceeded as e:
+            logger.warning(f"{self.__class__.__name__}: {str(e)}")
+            return {"error": str(e)}
         except Exception as e: #
             logger.error(f"{self.__class__.__name__}: Error processing query: {str(e)}", exc_info=True) #
             return {"error": f"Error processing query: {str(e)}"} #
@@ -273,16 +248,55 @@ class BaseAgent:
             logger.warning(f"{self.__class__.__name__}: Skipping query execution due to error or missing query") #
             return {} #
         query = state.get("query") #
+        try:
+            timeout = stage_timeout(state.get("deadline"), "query execution", Config.BIP_TIMEOUT_SECONDS)
+        except DeadlineExceeded as e:
+            logger.warning(f"{self.__class__.__name__}: {str(e)}")
+            return {"error": str(e)}
+        if state.get("format_preference") == "table":
+            # Table mode only renders a few rows inline, so fetch a capped preview plus the total count. When the
+            # preview does not hold every row, the download is built by a background export job, so the answer
+            # still costs a single small BIP round trip.
+            try:
+                preview_query = self.oracle_bip_tool.build_preview_query(query, Config.PREVIEW_ROW_LIMIT)
+                logger.info(f"{self.__class__.__name__}: Executing preview query (limit {Config.PREVIEW_ROW_LIMIT}): {query[:100]}...")
+                preview_csv, total_rows = self._split_preview_total(self.oracle_bip_tool.execute_query(preview_query, timeout, state.get("bip_endpoint")))
+                logger.info(f"{self.__class__.__name__}: Preview executed, full result has {total_rows} rows")
+                return {
+                    "csv_data": preview_csv,
+                    "total_rows": total_rows,
+                    "export_deferred": total_rows > Config.PREVIEW_ROW_LIMIT
+                }
+            except Exception as e:
+                # e.g. ORA-00918 when the generated SELECT list has duplicate column names; the unwrapped query may still work
+                logger.warning(f"{self.__class__.__name__}: Preview query failed, falling back to full execution: {str(e)}")
         logger.info(f"{self.__class__.__name__}: Executing query: {query[:100]}...") #
         try:
-            csv_data = self.oracle_bip_tool.execute_query(query) #
+            timeout = stage_timeout(state.get("deadline"), "query execution", Config.BIP_TIMEOUT_SECONDS)
+            report = self.oracle_bip_tool.execute_query_spillable(query, timeout, state.get("memory_budget"), endpoint=state.get("bip_endpoint"))
+            if isinstance(report, SpilledCSV):
+                logger.info(f"{self.__class__.__name__}: Query executed, result of {report.size} bytes spilled to disk")
+                return {"csv_data": report.head_text(Config.PREVIEW_ROW_LIMIT), "spilled_result": report}
+            csv_data = report.decode("utf-8")
             logger.info(f"{self.__class__.__name__}: Query executed, CSV data received") #
             logger.debug(f"{self.__class__.__name__}: CSV data: {csv_data[:200]}...") #
             return {"csv_data": csv_data} #
+        except DeadlineExceeded as e:
+            logger.warning(f"{self.__class__.__name__}: {str(e)}")
+            return {"error": str(e)}
         except Exception as e: #
             logger.error(f"{self.__class__.__name__}: Error executing query: {str(e)}", exc_info=True) #
             return {"error": f"Error executing query: {str(e)}"} #
 
+    def _split_preview_total(self, preview_csv: str) -> tuple:
+        """Removes the preview count column from a preview CSV and returns (csv_without_count, total_rows)."""
+        df = pd.read_csv(StringIO(preview_csv))
+        count_column = next((col for col in df.columns if str(col).upper() == PREVIEW_TOTAL_COLUMN), None)
+        if count_column is None:
+            raise ValueError(f"Preview result is missing the {PREVIEW_TOTAL_COLUMN} column")
+        total_rows = int(df[count_column].iloc[0]) if len(df) else 0
+        return df.drop(columns=[count_column]).to_csv(index=False), total_rows
+
     def answer_general_question(self, state: AgentState) -> Dict: #
         messages = state["messages"] #
         latest_question_content = messages[-1].content if messages and isinstance(messages[-1], BaseMessage) else "" #
@@ -292,27 +306,73 @@ class BaseAgent:
 
     def _df_to_markdown(self, df: pd.DataFrame) -> str: #
         logger.debug(f"{self.__class__.__name__}: Converting DataFrame to Markdown table") #
-        headers = df.columns.tolist() #
-        rows = df.values.tolist() #
-        markdown_table = "| " + " | ".join(headers) + " |\n" #
-        markdown_table += "| " + " | ".join(["---"] * len(headers)) + " |\n" #
-        for row in rows: #
-            markdown_table += "| " + " | ".join(str(cell) for cell in row) + " |\n" #
-        return markdown_table #
-
-    def _df_to_base64_excel(self, df: pd.DataFrame) -> str: #
-        logger.debug(f"{self.__class__.__name__}: Converting DataFrame to base64-encoded Excel") #
-        output = BytesIO() #
-        with pd.ExcelWriter(output, engine='openpyxl') as writer: #
-            df.to_excel(writer, index=False) #
-        output.seek(0) #
-        return base64.b64encode(output.read()).decode('utf-8') #
-
-    def _generate_natural_language_response(self, user_question: str, df: pd.DataFrame) -> str: #
-        logger.info(f"{self.__class__.__name__}: Generating natural language response for question: {user_question}") #
-        num_rows = len(df) #
-        columns = df.columns.tolist() #
-        sample_data = df.head(10).to_string(index=False) #
+        # Width, size and number formatting limits come from Config.MARKDOWN_*
+        return render_markdown_table(df) #
+
+    def _build_attachment(self, export_format: str, csv_data: Optional[str] = None, df: Optional[pd.DataFrame] = None,
+                          spilled: Optional[SpilledCSV] = None) -> Dict:
+        """
+        Download file for the full result. CSV formats reuse the BIP CSV text as-is; only xlsx goes through pandas/openpyxl.
+        The export of a spilled result is written to a temp file (content is then a SpilledFile, closed by the caller):
+        compressed straight from the memory-mapped report, or written to the workbook chunk by chunk.
+        """
+        filename = export_filename(export_format)
+        if spilled is not None:
+            content = export_spilled(spilled, export_format)
+        elif export_format in CSV_FORMATS:
+            content = encode_csv(csv_data.encode("utf-8"), export_format)
+        else:
+            content = dataframe_to_xlsx(df if df is not None else pd.read_csv(StringIO(csv_data)))
+        size = content.size if isinstance(content, SpilledFile) else len(content)
+        logger.debug(f"{self.__class__.__name__}: Built {export_format} attachment {filename} ({size} bytes)")
+        return {"filename": filename, "mimetype": export_mimetype(export_format), "content": content}
+
+    def _compute_data_stats_chunked(self, spilled: SpilledCSV) -> tuple:
+        """
+        _compute_data_stats over a spilled result read in chunks; returns (data_stats, row_count).
+        Distinct values are tracked up to MAX_TRACKED_UNIQUE_VALUES per column and reported as a lower bound beyond that.
+        """
+        num_rows = 0
+        numeric: Dict[str, Dict] = {}
+        uniques: Dict[str, Optional[Dict]] = {}
+        columns: List[str] = []
+        for chunk in spilled.iter_frames():
+            if not columns:
+                columns = chunk.columns.tolist()
+            num_rows += len(chunk)
+            for col in chunk.columns:
+                series = chunk[col]
+                if col not in uniques and pd.api.types.is_numeric_dtype(series):
+                    agg = numeric.setdefault(col, {"min": None, "max": None, "sum": 0, "count": 0})
+                    if series.count():
+                        agg["min"] = series.min() if agg["min"] is None else min(agg["min"], series.min())
+                        agg["max"] = series.max() if agg["max"] is None else max(agg["max"], series.max())
+                        agg["sum"] += series.sum()
+                        agg["count"] += series.count()
+                    continue
+                # A column read as numbers in earlier chunks may turn out to hold text; describe it as text from here on
+                numeric.pop(col, None)
+                counts = uniques.setdefault(col, {})
+                if counts is not None:
+                    for value, count in series.value_counts().items():
+                        counts[value] = counts.get(value, 0) + count
+                    if len(counts) > MAX_TRACKED_UNIQUE_VALUES:
+                        uniques[col] = None
+        data_stats = {}
+        for col in columns:
+            if col in numeric:
+                agg = numeric[col]
+                data_stats[col] = {"min": agg["min"], "max": agg["max"], "avg": agg["sum"] / agg["count"] if agg["count"] else None, "sum": agg["sum"]}
+            elif uniques.get(col) is None:
+                data_stats[col] = {"unique_values": f"more than {MAX_TRACKED_UNIQUE_VALUES}"}
+            elif len(uniques[col]) <= 10:
+                data_stats[col] = {"unique_values": len(uniques[col]), "value_counts": uniques[col]}
+            else:
+                data_stats[col] = {"unique_values": len(uniques[col])}
+        return data_stats, num_rows
+
+    def _compute_data_stats(self, df: pd.DataFrame) -> Dict: #
+        """Per-column statistics included in the summarization prompt."""
         data_stats = {} #
         for col in df.columns: #
             if pd.api.types.is_numeric_dtype(df[col]): #
@@ -329,6 +389,16 @@ class BaseAgent:
                     data_stats[col] = {"unique_values": unique_values, "value_counts": value_counts} #
                 else: #
                     data_stats[col] = {"unique_values": unique_values} #
+        return data_stats #
+
+    def _generate_natural_language_response(self, user_question: str, df: pd.DataFrame, timeout: Optional[float] = None,
+                                            num_rows: Optional[int] = None, data_stats: Optional[Dict] = None) -> str: #
+        """num_rows and data_stats describe the full result when df only holds its first rows (spilled results)."""
+        logger.info(f"{self.__class__.__name__}: Generating natural language response for question: {user_question}") #
+        num_rows = len(df) if num_rows is None else num_rows #
+        columns = df.columns.tolist() #
+        sample_data = df.head(10).to_string(index=False) #
+        data_stats = self._compute_data_stats(df) if data_stats is None else data_stats #
         prompt = f"""
         Based on the data retrieved, answer the user's question with a concise bulleted list in Markdown format.
 
@@ -354,66 +424,21 @@ class BaseAgent:
 
         DO NOT include any explanatory text outside the bullet points.
         """ #
-        response = self.llm.invoke(prompt) #
+        response = self.llm.invoke(prompt, timeout=timeout) #
         response_content = response.content.strip() #
         logger.debug(f"{self.__class__.__name__}: Generated natural language response: {response_content}") #
         return response_content #
 
-    def _save_attachment_to_oracle(self, message_id: int, filename: str, mimetype: str, file_content: bytes) -> Optional[int]:
-        """Saves a file to the CHATBOT_ATTACHMENTS table and returns the attachment ID."""
-        conn = None
-        try:
-            conn = oracle_db_utils.get_oracle_connection()
-            cursor = conn.cursor()
-            
-            attachment_id_var = cursor.var(oracledb.NUMBER)
-            
-            # This SQL is correct
-            sql = """
-                INSERT INTO CHATBOT_ATTACHMENTS (MESSAGE_ID, FILENAME, MIMETYPE, FILE_CONTENT)
-                VALUES (:msg_id, :fname, :mtype, :content)
-                RETURNING ATTACHMENT_ID INTO :att_id
-            """
-            
-            # REFINED LOGIC: Explicitly create a LOB object for the file content.
-            # This is the most reliable way to handle BLOBs.
-            file_blob = conn.createlob(oracledb.DB_TYPE_BLOB)
-            file_blob.write(file_content)
-            
-            # Pass the LOB object in the execute call, not the raw bytes.
-            cursor.execute(sql, msg_id=message_id, fname=filename, mtype=mimetype, content=file_blob, att_id=attachment_id_var)
-            
-            attachment_id = attachment_id_var.getvalue()[0]
-            conn.commit()
-            logger.info(f"Saved attachment to Oracle with ATTACHMENT_ID: {attachment_id} for MESSAGE_ID: {message_id}")
-            return attachment_id
-        except oracledb.Error as e:
-            error_obj, = e.args
-            logger.error(f"Oracle DB error saving attachment for MESSAGE_ID {message_id}: {error_obj.message}", exc_info=True)
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error saving attachment: {str(e)}", exc_info=True)
-            return None
-        finally:
-            if conn:
-                oracle_db_utils.release_oracle_connection(conn)
-
-    def _update_message_content(self, message_id: int, new_content: str):
-        """Updates the content of an existing message in the history table."""
-        conn = None
-        try:
-            conn = oracle_db_utils.get_oracle_connection()
-            cursor = conn.cursor()
-            sql = "UPDATE CHATBOT_CONVERSATION_HISTORY SET MESSAGE_CONTENT = :content WHERE MESSAGE_ID = :msg_id"
-            cursor.execute(sql, content=new_content, msg_id=message_id)
-            conn.commit()
-            logger.info(f"Updated message content for MESSAGE_ID: {message_id}")
-        except oracledb.Error as e:
-            error_obj, = e.args
-            logger.error(f"Oracle DB error updating message {message_id}: {error_obj.message}", exc_info=True)
-        finally:
-            if conn:
-                oracle_db_utils.release_oracle_connection(conn)
+    def _summarize_without_llm(self, df: pd.DataFrame, num_rows: int) -> str:
+        """Plain summary used when the time budget does not leave room for the summarizing LLM call."""
+        if num_rows == 0:
+            return "* The query returned no records."
+        sample = self._df_to_markdown(df.head(5))
+        return (
+            f"* The query returned {num_rows} records with columns: {', '.join(str(col) for col in df.columns)}.\n"
+            f"* A written summary could not be produced in time; the first rows are shown below.\n\n"
+            f"{sample}"
+        )
 
     def _get_download_link(self, attachment_id: int) -> str:
         """Generates a download link for an attachment stored in the database."""
@@ -423,6 +448,25 @@ class BaseAgent:
         logger.debug(f"{self.__class__.__name__}: Generated download link: {download_link}")
         return download_link
 
+    def _cache_result(self, result: Dict, thread_id: str, agent_stream: str) -> Optional[str]:
+        """Keeps the executed result for paging (/results/{id}); returns its result ID, or None if there is nothing to keep."""
+        if not Config.RESULT_CACHE_ENABLED or not result.get("csv_data"):
+            return None
+        try:
+            if result.get("spilled_result") is not None:
+                # The temp file moves into the cache's spill directory as it is
+                result_id = result_cache.register(agent_stream, thread_id, result.get("total_rows"))
+                result_cache.put_spilled(result_id, result["spilled_result"])
+                return result_id
+            if result.get("export_deferred"):
+                # The background export job fetches the full result and fills this entry in
+                return result_cache.register(agent_stream, thread_id, result.get("total_rows"))
+            # Natural-language answers and previews that already hold every row
+            return result_cache.add(result["csv_data"], agent_stream, thread_id, result.get("total_rows"))
+        except Exception as e:
+            logger.error(f"{self.__class__.__name__}: Could not cache result for paging: {str(e)}", exc_info=True)
+            return None
+
     def format_response(self, state: AgentState) -> Dict: #
         user_question_content = "" #
         if state["messages"] and isinstance(state["messages"][-1], BaseMessage): #
@@ -431,6 +475,7 @@ class BaseAgent:
              user_question_content = state["messages"][-1] #
 
         format_preference = state.get("format_preference", "natural_language") #
+        export_format = state.get("export_format") or "xlsx"
         logger.info(f"{self.__class__.__name__}: Formatting response for question: {user_question_content}, format_preference: {format_preference}") #
         
         attachment_data = None
@@ -454,7 +499,15 @@ class BaseAgent:
                 return {"messages": [response]} #
             
             df = pd.read_csv(StringIO(csv_data)) #
-            num_rows = len(df) #
+            budget = state.get("memory_budget")
+            record_stage(budget, "parse", frame_bytes(df))
+            spilled = state.get("spilled_result")
+            preview_limit = Config.PREVIEW_ROW_LIMIT
+            num_rows = state.get("total_rows") if state.get("total_rows") is not None else len(df) #
+            data_stats = None
+            if spilled is not None and state.get("total_rows") is None:
+                # csv_data only holds the first rows; count and describe the full result from disk, chunk by chunk
+                data_stats, num_rows = self._compute_data_stats_chunked(spilled)
             logger.info(f"{self.__class__.__name__}: Formatting {num_rows} rows of data") #
             
             response_content = "" #
@@ -462,38 +515,41 @@ class BaseAgent:
             DOWNLOAD_LINK_PLACEHOLDER = "[DOWNLOAD_LINK_PLACEHOLDER]"
 
             if format_preference == "natural_language": #
-                response_content = self._generate_natural_language_response(user_question_content, df) #
-                if num_rows > 10: #
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") #
-                    filename = f"Data_{timestamp}.xlsx" #
-                    base64_data = self._df_to_base64_excel(df) #
-                    attachment_data = {"filename": filename, "base64_data": base64_data}
+                try:
+                    timeout = stage_timeout(state.get("deadline"), "response summarization")
+                    response_content = self._generate_natural_language_response(user_question_content, df, timeout, num_rows if spilled is not None else None, data_stats) #
+                except (DeadlineExceeded, TimeoutError) as e:
+                    logger.warning(f"{self.__class__.__name__}: Summarization skipped ({str(e)}), returning a plain summary")
+                    response_content = self._summarize_without_llm(df, num_rows)
+                if num_rows > preview_limit: #
+                    attachment_data = self._build_attachment(export_format, csv_data, df, spilled)
                     
                     if not response_content.endswith("\n"): #
                         response_content += "\n" #
                     response_content += f"* {DOWNLOAD_LINK_PLACEHOLDER}" # NOTE: Removed record count from here
             else: # Table format #
-                if num_rows <= 10: # MODIFIED: <= 10 for consistency
+                if num_rows <= preview_limit:
                     markdown_table = self._df_to_markdown(df) #
                     response_content = f"Here's the data for your question: \"{user_question_content}\"\n\n{markdown_table}" #
                 else: #
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S") #
-                    filename = f"Data_{timestamp}.xlsx" #
-                    base64_data = self._df_to_base64_excel(df) #
-                    attachment_data = {"filename": filename, "base64_data": base64_data}
+                    if not state.get("export_deferred"):
+                        # The preview query failed and the plain query ran instead, so csv_data (or the spill) is the full result
+                        attachment_data = self._build_attachment(export_format, csv_data, df, spilled)
                     
-                    first_10_rows_df = df.head(10) #
-                    first_10_rows_markdown = self._df_to_markdown(first_10_rows_df) #
+                    preview_df = df.head(preview_limit) #
+                    preview_markdown = self._df_to_markdown(preview_df) #
                     response_content = ( #
-                        f"Here's the first 10 rows of the data for your question: \"{user_question_content}\"\n\n" #
-                        f"{first_10_rows_markdown}\n\n" #
+                        f"Here's the first {len(preview_df)} rows of the data for your question: \"{user_question_content}\"\n\n" #
+                        f"{preview_markdown}\n\n" #
                         f"{DOWNLOAD_LINK_PLACEHOLDER}" #
                     )
+            if attachment_data and not isinstance(attachment_data["content"], SpilledFile):
+                record_stage(budget, "export", len(attachment_data["content"]))
             logger.info(f"{self.__class__.__name__}: Response generated: {response_content[:100]}...") #
             logger.debug(f"{self.__class__.__name__}: Full response: {response_content}") #
             response = AIMessage(content=response_content) #
             
-            return {"messages": [response], "error": None, "attachment": attachment_data, "csv_data": csv_data}
+            return {"messages": [response], "error": None, "attachment": attachment_data, "csv_data": csv_data, "total_rows": num_rows}
         except Exception as e: #
             logger.error(f"{self.__class__.__name__}: Error in format_response: {str(e)}", exc_info=True) #
             error_message = f"Error formatting response: {str(e)}" #
@@ -502,7 +558,7 @@ class BaseAgent:
             response = AIMessage(content=error_message) #
             return {"messages": [response], "error": str(e)} #
 
-    def run(self, question: str, thread_id: Optional[str] = None, format_preference: str = "natural_language", agent_stream: Optional[str] = None) -> Dict: #
+    def run(self, question: str, thread_id: Optional[str] = None, format_preference: str = "natural_language", agent_stream: Optional[str] = None, deadline_seconds: Optional[float] = None, export_format: str = "xlsx", run_cache: Optional[RunCache] = None, tenant: Optional[str] = None) -> Dict: #
         logger.info(f"{self.__class__.__name__}: Starting run for question: {question}, agent_stream: {agent_stream}, thread_id: {thread_id}") #
         
         if not thread_id: #
@@ -514,19 +570,28 @@ class BaseAgent:
             return { "response": "Error: Agent stream is required.", "thread_id": thread_id }
 
         # ... (rest of the initial setup is the same)
-        loaded_history = self._load_recent_messages_from_oracle(thread_id, agent_stream, limit=20) #
+        loaded_history = self._load_recent_messages(thread_id, agent_stream, limit=20) #
         current_human_message = HumanMessage(content=question) #
         initial_messages_for_graph = loaded_history + [current_human_message] #
 
+        deadline = Deadline(deadline_seconds) if deadline_seconds else None
+        memory_budget = MemoryBudget(Config.REQUEST_MEMORY_BUDGET_MB * 1024 * 1024, f"thread {thread_id}") if Config.REQUEST_MEMORY_BUDGET_MB > 0 else None
+        bip_endpoint = get_bip_router().resolve(agent_stream, tenant)
         input_data = { #
             "messages": initial_messages_for_graph, #
             "format_preference": format_preference, #
-            "agent_type": agent_stream #
+            "agent_type": agent_stream, #
+            "deadline": deadline,
+            "export_format": export_format,
+            "memory_budget": memory_budget,
+            "run_cache": run_cache,
+            "bip_endpoint": bip_endpoint
         }
         
         config = {"configurable": {"thread_id": thread_id}} #
-        logger.debug(f"{self.__class__.__name__}: Invoking graph with input: {input_data}, config: {config}") #
+        logger.debug(f"{self.__class__.__name__}: Invoking graph with {len(initial_messages_for_graph)} messages, format {format_preference}, config: {config}") #
         
+        result = None
         try:
             result = self.graph.invoke(input_data, config) #
             
@@ -535,45 +600,85 @@ class BaseAgent:
                 ai_response_message_content = result["messages"][-1].content #
             
             logger.info(f"{self.__class__.__name__}: Run completed, response: {ai_response_message_content[:100]}...") #
+            if deadline:
+                logger.info(f"{self.__class__.__name__}: Graph finished with {deadline.remaining():.1f}s of the {deadline.budget:.0f}s budget left")
+            if memory_budget:
+                if memory_budget.violations:
+                    logger.warning(f"{self.__class__.__name__}: Memory budget exceeded; memory by stage: {memory_budget.summary()}")
+                else:
+                    logger.debug(f"{self.__class__.__name__}: Memory by stage: {memory_budget.summary()}")
             
             final_ai_response = ai_response_message_content
+            job_id = None
+            result_id = None
 
             if not result.get("error"):
+                result_id = self._cache_result(result, thread_id, agent_stream)
                 logger.info(f"Operation successful. Saving conversation for thread_id: {thread_id}")
-                self._save_message_to_oracle(thread_id, "USER", question, agent_stream)
-                ai_message_id = self._save_message_to_oracle(thread_id, "AI", ai_response_message_content, agent_stream)
+                self.chat_store.save_message(thread_id, "USER", question, agent_stream)
+                ai_message_id = self.chat_store.save_message(thread_id, "AI", ai_response_message_content, agent_stream)
                 
                 attachment_info = result.get("attachment")
                 if attachment_info and ai_message_id:
                     logger.info(f"Attachment data found for AI Message ID: {ai_message_id}. Attempting to save.")
-                    file_content_bytes = base64.b64decode(attachment_info['base64_data'])
-                    
-                    attachment_id = self._save_attachment_to_oracle(
+                    attachment_id = self.chat_store.save_attachment(
                         message_id=ai_message_id,
                         filename=attachment_info['filename'],
-                        mimetype="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                        file_content=file_content_bytes
+                        mimetype=attachment_info['mimetype'],
+                        file_content=attachment_info['content']
                     )
                     
                     if attachment_id:
                         logger.info(f"Successfully saved attachment with ID: {attachment_id}. Creating and replacing link.")
                         download_link = self._get_download_link(attachment_id)
                         
-                        # Get total number of rows from the original data for the link text
-                        df = pd.read_csv(StringIO(result.get("csv_data", "")))
-                        num_rows = len(df)
+                        # Total number of rows of the full result (format_response sets it; csv_data may only be a preview)
+                        num_rows = result.get("total_rows") or 0
 
-                        link_text = f"Download the full dataset ({num_rows} records)" if format_preference == "natural_language" else f"Download the full Excel file ({num_rows} records)"
+                        link_text = f"Download the full dataset ({num_rows} records)" if format_preference == "natural_language" else f"Download the full {export_label(export_format)} ({num_rows} records)"
                         final_link = f"[{link_text}]({download_link})"
                         
                         final_ai_response = ai_response_message_content.replace("[DOWNLOAD_LINK_PLACEHOLDER]", final_link)
-                        self._update_message_content(ai_message_id, final_ai_response)
+                        self.chat_store.update_message_content(ai_message_id, final_ai_response)
                         logger.info(f"Replaced placeholder with real download link for message {ai_message_id}")
                     else:
                         logger.error(f"Failed to save attachment to database for AI Message ID: {ai_message_id}. The download link will not be available.")
                         error_text = "(Download is currently unavailable due to a system error.)"
                         final_ai_response = ai_response_message_content.replace("[DOWNLOAD_LINK_PLACEHOLDER]", error_text)
-                        self._update_message_content(ai_message_id, final_ai_response)
+                        self.chat_store.update_message_content(ai_message_id, final_ai_response)
+
+                elif result.get("export_deferred") and ai_message_id:
+                    # The status text goes in before the job starts: a job that finishes (or fails) quickly writes its
+                    # download link (or error) over it, never the other way round.
+                    job_id = uuid.uuid4().hex
+                    status_text = (
+                        f"The full {export_label(export_format)} ({result.get('total_rows')} records) is being prepared in the background "
+                        f"(job [{job_id}]({Config.BASE_URL}/jobs/{job_id})). The download link will appear here when it is ready."
+                    )
+                    final_ai_response = ai_response_message_content.replace("[DOWNLOAD_LINK_PLACEHOLDER]", status_text)
+                    self.chat_store.update_message_content(ai_message_id, final_ai_response)
+                    try:
+                        export_job_manager.submit(
+                            agent=self,
+                            query=result.get("query"),
+                            message_id=ai_message_id,
+                            message_content=ai_response_message_content,
+                            thread_id=thread_id,
+                            agent_stream=agent_stream,
+                            total_rows=result.get("total_rows") or 0,
+                            export_format=export_format,
+                            result_id=result_id,
+                            bip_endpoint=bip_endpoint,
+                            job_id=job_id
+                        )
+                    except Exception as e:
+                        logger.error(f"Failed to submit export job for AI Message ID: {ai_message_id}: {str(e)}", exc_info=True)
+                        job_id = None
+                        if result_id:
+                            result_cache.discard(result_id)
+                            result_id = None
+                        final_ai_response = ai_response_message_content.replace("[DOWNLOAD_LINK_PLACEHOLDER]", "(Download is currently unavailable due to a system error.)")
+                        self.chat_store.update_message_content(ai_message_id, final_ai_response)
 
             else:
                 logger.warning(f"Operation resulted in an error. Skipping conversation save for thread_id: {thread_id}. Error: {result.get('error')}")
@@ -584,7 +689,10 @@ class BaseAgent:
                 "error": result.get("error"), #
                 "thread_id": thread_id, #
                 "question_type": result.get("question_type", "unknown"), #
-                "format_preference": format_preference #
+                "format_preference": format_preference, #
+                "job_id": job_id,
+                "result_id": result_id,
+                "total_rows": result.get("total_rows")
             }
         except Exception as e: #
             logger.error(f"{self.__class__.__name__}: Unhandled error in agent run: {str(e)}", exc_info=True) #
@@ -598,6 +706,13 @@ class BaseAgent:
                 "question_type": "unknown", #
                 "format_preference": format_preference #
             }
+        finally:
+            # The result cache has taken the spill file over by now (or the request failed); release the mapping
+            if result and result.get("spilled_result") is not None:
+                result["spilled_result"].close()
+            # An export built on disk has been copied into the chat store (or the request failed)
+            if result and result.get("attachment") and isinstance(result["attachment"]["content"], SpilledFile):
+                result["attachment"]["content"].close()
 
 class SCMAgent(BaseAgent): #
     def __init__(self): #
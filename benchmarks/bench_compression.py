@@ -0,0 +1,180 @@
+"""
+Size and latency of storing message content and attachments with and without zstd
+(storage/compression.py). Needs the zstandard package; pandas/openpyxl for the workbook case.
+
+Payloads (synthetic, shaped like production data):
+  - messages:  AI answers with a markdown preview table and bullets, as saved to MESSAGE_CONTENT
+  - csv:       a full BIP CSV extract (--csv-rows)
+  - xlsx:      the same extract as a workbook (export_formats.dataframe_to_xlsx output is already deflated)
+
+For each codec (none, zstd at each --levels, zstd with a dictionary trained on a separate half of
+the messages) it reports stored bytes, ratio, and per-item compress/decompress time. The
+"sqlite" section saves --messages messages through SQLiteChatStore and times a 20-message
+history load, with compression off and on, and reports the database file size.
+
+Usage:
+    python benchmarks/bench_compression.py --messages 2000 --csv-rows 100000 --levels 1,3,9
+"""
+import argparse
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("ORACLE_FUSION_URL", "http://localhost")
+os.environ.setdefault("LOG_CONSOLE", "false")
+
+from config import Config  # noqa: E402
+from storage import compression  # noqa: E402
+from fakes import build_csv, build_hcm_csv  # noqa: E402
+
+
+def build_messages(count: int):
+    """AI answers: a short lead-in, a markdown preview table of 5-20 rows and a few bullets."""
+    messages = []
+    for i in range(count):
+        lines = (build_csv if i % 2 else build_hcm_csv)(5 + i % 16)
+        header = lines[0].split(",")
+        table = "| " + " | ".join(header) + " |\n| " + " | ".join(["---"] * len(header)) + " |\n"
+        offset = i * 37
+        for line in lines[1:]:
+            cells = line.split(",")
+            cells[0] = f"{cells[0]}-{offset}"
+            table += "| " + " | ".join(cells) + " |\n"
+        messages.append(
+            f"Here are the results for your question ({len(lines) - 1} of {len(lines) - 1 + i} records shown).\n\n{table}\n"
+            f"* The highest value appears in row {i % 7 + 1}.\n* {i % 5} records have no secondary quantity.\n\n"
+            "[Download the full dataset](https://example.invalid/download/1)"
+        )
+    return messages
+
+
+def configure(codec: str, level: int = 3, dict_path: str = "") -> None:
+    Config.STORE_COMPRESSION = "none" if codec == "none" else "zstd"
+    Config.STORE_COMPRESSION_LEVEL = level
+    Config.STORE_COMPRESSION_DICT_PATH = dict_path
+    # Drop cached compressors and the loaded dictionary so the new settings apply
+    compression._local = threading.local()
+    compression._dictionary = None
+    compression._dictionaries = {}
+    compression._dictionary_loaded = False
+
+
+def measure_texts(texts):
+    stored, compress_times, decompress_times = [], [], []
+    for text in texts:
+        start = time.perf_counter()
+        value = compression.compress_text(text)
+        compress_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        restored = compression.decompress_text(value)
+        decompress_times.append(time.perf_counter() - start)
+        assert restored == text
+        stored.append(len(value.encode("utf-8")))
+    return sum(len(t.encode("utf-8")) for t in texts), sum(stored), compress_times, decompress_times
+
+
+def measure_blob(data: bytes, repeat: int):
+    compress_times, decompress_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = compression.compress_blob(data)
+        compress_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        restored = compression.decompress_blob(value)
+        decompress_times.append(time.perf_counter() - start)
+    assert restored == data
+    return len(data), len(value), compress_times, decompress_times
+
+
+def report(name, original, stored, compress_times, decompress_times):
+    print(
+        f"{name:<24} {original:>12,} {stored:>12,} {original / stored:>7.2f}x "
+        f"{statistics.median(compress_times) * 1e6:>12.1f} {statistics.median(decompress_times) * 1e6:>12.1f}"
+    )
+
+
+def bench_sqlite(messages, label, codec_args, work_dir):
+    import sqlite3
+    from storage.chat_store import SQLiteChatStore
+    configure(*codec_args)
+    path = os.path.join(work_dir, f"chat-{label}.db")
+    store = SQLiteChatStore(path)
+    start = time.perf_counter()
+    for i, message in enumerate(messages):
+        store.save_message(f"thread-{i % 50}", "AI", message, "scm")
+    save_seconds = time.perf_counter() - start
+    loads = []
+    for i in range(200):
+        start = time.perf_counter()
+        store.load_recent_messages(f"thread-{i % 50}", "scm", limit=20)
+        loads.append(time.perf_counter() - start)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.close()
+    size = os.path.getsize(path)
+    print(
+        f"sqlite/{label:<17} save {save_seconds / len(messages) * 1e6:>9.1f} us/msg   "
+        f"load(20) {statistics.median(loads) * 1e3:>7.3f} ms   file {size:>12,} bytes"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--csv-rows", type=int, default=100000)
+    parser.add_argument("--levels", default="1,3,9")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dict-size", type=int, default=65536)
+    parser.add_argument("--no-xlsx", action="store_true")
+    args = parser.parse_args()
+    if compression.zstandard is None:
+        sys.exit("zstandard is not installed")
+
+    # Compress everything the benchmark feeds in, however small
+    Config.STORE_COMPRESSION_MIN_BYTES = 0
+    Config.STORE_COMPRESSION_MIN_SAVING = 0.0
+
+    messages = build_messages(args.messages * 2)
+    training, messages = messages[:args.messages], messages[args.messages:]
+    csv_bytes = ("\n".join(build_csv(args.csv_rows)) + "\n").encode("utf-8")
+    blobs = {"csv": csv_bytes}
+    if not args.no_xlsx:
+        from io import StringIO
+        import pandas as pd
+        from export_formats import dataframe_to_xlsx
+        blobs["xlsx"] = dataframe_to_xlsx(pd.read_csv(StringIO(csv_bytes.decode("utf-8"))))
+
+    work_dir = tempfile.mkdtemp(prefix="fusion-assist-compression-")
+    try:
+        dict_path = os.path.join(work_dir, "message.dict")
+        configure("zstd")
+        with open(dict_path, "wb") as dict_file:
+            dict_file.write(compression.train_dictionary(training, args.dict_size))
+
+        codecs = [("none",)] + [("zstd", int(level)) for level in args.levels.split(",")]
+        print(f"{'case':<24} {'original':>12} {'stored':>12} {'ratio':>8} {'compress us':>12} {'decomp. us':>12}")
+        for codec in codecs + [("zstd", 3, dict_path)]:
+            label = "none" if codec[0] == "none" else f"zstd-{codec[1]}" + ("+dict" if len(codec) > 2 else "")
+            configure(*codec)
+            report(f"messages/{label}", *measure_texts(messages))
+            if len(codec) > 2:
+                continue
+            for name, data in blobs.items():
+                report(f"{name}/{label}", *measure_blob(data, args.repeat))
+
+        print()
+        for label, codec_args in [("none", ("none",)), ("zstd-3", ("zstd", 3)), ("zstd-3+dict", ("zstd", 3, dict_path))]:
+            bench_sqlite(messages, label, codec_args, work_dir)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Micro-benchmarks for the response formatting pipeline (pure CPU/memory, no LLM, BIP or DB).
+
+For synthetic SCM- and HCM-shaped CSVs of each requested size it measures, per stage:
+  - read_csv:        pd.read_csv of the BIP CSV
+  - markdown_preview _df_to_markdown of the first PREVIEW_ROW_LIMIT rows
+  - markdown_full    _df_to_markdown of the whole frame (up to --max-markdown-rows)
+  - stats            _compute_data_stats (the statistics block of the summarization prompt)
+  - excel            export_formats.dataframe_to_xlsx (up to --max-excel-rows; openpyxl is slow and xlsx caps at 1,048,576 rows)
+  - format_table     format_response in table mode (up to --max-excel-rows, it builds the workbook)
+  - format_nl        format_response in natural-language mode with an instant fake LLM (same cap)
+
+Each stage reports the median wall time over --repeat runs and its peak traced memory
+(tracemalloc, measured in a separate run so tracing does not distort the timings).
+
+Baselines: --save-baseline writes the results to --baseline (default
+benchmarks/baselines/format_response.json). When that file exists, later runs compare against
+it and flag any stage whose time or peak memory grew by more than --threshold (default 20%);
+--fail-on-regression turns flags into a non-zero exit code.
+
+Usage:
+    python benchmarks/bench_format_response.py --sizes 10,1000,100000,1000000
+    python benchmarks/bench_format_response.py --save-baseline
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from io import StringIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("ORACLE_FUSION_URL", "http://localhost")
+
+import pandas as pd  # noqa: E402
+from langchain_core.messages import HumanMessage  # noqa: E402
+
+from agents.base_agent import BaseAgent  # noqa: E402
+from config import Config  # noqa: E402
+from export_formats import dataframe_to_xlsx  # noqa: E402
+from fakes import FakeChatModel, build_csv, build_hcm_csv  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(REPO_ROOT, "benchmarks", "baselines", "format_response.json")
+SHAPES = {"scm": build_csv, "hcm": build_hcm_csv}
+
+
+def make_agent() -> BaseAgent:
+    """A BaseAgent with only what the formatting code touches (no graph, DB or real LLM)."""
+    agent = BaseAgent.__new__(BaseAgent)
+    agent.llm = FakeChatModel(latency_ms=0, jitter_ms=0)
+    return agent
+
+
+def stages_for(agent: BaseAgent, csv_data: str, rows: int, args) -> dict:
+    df = pd.read_csv(StringIO(csv_data))
+
+    def state(format_preference):
+        return {
+            "messages": [HumanMessage(content="Show on-hand quantity by organization")],
+            "csv_data": csv_data,
+            "format_preference": format_preference,
+        }
+
+    stages = {
+        "read_csv": lambda: pd.read_csv(StringIO(csv_data)),
+        "markdown_preview": lambda: agent._df_to_markdown(df.head(Config.PREVIEW_ROW_LIMIT)),
+        "stats": lambda: agent._compute_data_stats(df),
+    }
+    if rows <= args.max_markdown_rows:
+        stages["markdown_full"] = lambda: agent._df_to_markdown(df)
+    if rows <= args.max_excel_rows:
+        stages["excel"] = lambda: dataframe_to_xlsx(df)
+        stages["format_table"] = lambda: agent.format_response(state("table"))
+        stages["format_nl"] = lambda: agent.format_response(state("natural_language"))
+    return stages
+
+
+def measure(fn, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"median_ms": round(statistics.median(timings) * 1000, 3), "peak_mib": round(peak / (1024 * 1024), 3)}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    regressions = []
+    for key, current in results.items():
+        previous = baseline.get(key)
+        if not previous:
+            continue
+        for metric in ("median_ms", "peak_mib"):
+            # Ignore noise on stages too small to measure reliably
+            floor = 1.0 if metric == "median_ms" else 0.5
+            if previous[metric] >= floor and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{key} {metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,1000,100000,1000000", help="Comma-separated row counts")
+    parser.add_argument("--shapes", default="scm,hcm")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-markdown-rows", type=int, default=10000)
+    parser.add_argument("--max-excel-rows", type=int, default=100000)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.20)
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    agent = make_agent()
+    results = {}
+    print(f"{'case':<28} {'median (ms)':>12} {'peak (MiB)':>11}")
+    for shape in args.shapes.split(","):
+        for rows in (int(size) for size in args.sizes.split(",")):
+            csv_data = "\n".join(SHAPES[shape](rows)) + "\n"
+            # Large sizes are dominated by a single run; fewer repeats keep the suite practical
+            repeat = args.repeat if rows <= 100000 else max(1, args.repeat // 5)
+            for stage, fn in stages_for(agent, csv_data, rows, args).items():
+                key = f"{shape}/{rows}/{stage}"
+                results[key] = measure(fn, repeat)
+                print(f"{key:<28} {results[key]['median_ms']:>12.2f} {results[key]['peak_mib']:>11.2f}", flush=True)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, "w") as output:
+            json.dump(results, output, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+            for line in regressions:
+                print(f"  REGRESSION {line}")
+            if args.fail_on_regression:
+                sys.exit(1)
+        else:
+            print(f"\nNo regressions above {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
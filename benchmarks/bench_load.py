@@ -0,0 +1,207 @@
+"""
+End-to-end load test of the API against local stand-ins (no Azure OpenAI, Fusion BIP or ATP needed).
+
+Starts benchmarks/load_server.py in a subprocess (the real FastAPI app with a scripted chat model,
+a fake BIP SOAP server and the SQLite chat and job stores), then drives /scm/query and /hcm/query with
+`--concurrency` concurrent clients and reports latency percentiles, throughput, error counts and
+the server's resident memory (current and peak, sampled from /proc).
+
+Usage:
+    python benchmarks/bench_load.py --concurrency 16 --requests 400 --bip-rows 2000
+    python benchmarks/bench_load.py --duration 60 --format table --json results.json
+
+Options after "--" are passed to load_server.py unchanged (e.g. -- --tpm 120000).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import httpx
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVER_SCRIPT = os.path.join(REPO_ROOT, "benchmarks", "load_server.py")
+
+QUESTIONS = {
+    "scm": [
+        "Show on-hand quantity for items in organization M1",
+        "Which items have stock in subinventory SUB3?",
+        "List open purchase orders that are late",
+        "What is the inventory quantity by locator for item ITEM-0000042?",
+    ],
+    "hcm": [
+        "How many employees are in each location?",
+        "List employees hired in the last 6 months",
+        "Show the grade distribution across departments",
+        "Which employees report to each manager?",
+    ],
+}
+
+
+def read_rss_kib(pid: int) -> Dict[str, Optional[int]]:
+    """Current (VmRSS) and peak (VmHWM) resident memory of a process, from /proc (Linux only)."""
+    values = {"rss": None, "peak": None}
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    values["rss"] = int(line.split()[1])
+                elif line.startswith("VmHWM:"):
+                    values["peak"] = int(line.split()[1])
+    except OSError:
+        pass
+    return values
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, int(round(pct / 100.0 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+async def wait_until_ready(client: httpx.AsyncClient, base_url: str, process: subprocess.Popen, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Load server exited with code {process.returncode}")
+        try:
+            if (await client.get(f"{base_url}/metrics/llm")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError("Load server did not become ready in time")
+
+
+async def drive(args, base_url: str, server_pid: int) -> Dict:
+    streams = ["scm", "hcm"] if args.stream == "both" else [args.stream]
+    formats = ["natural_language", "table"] if args.format == "mixed" else [args.format]
+    rng = random.Random(args.seed)
+    counter = itertools.count()
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    rss_samples: List[int] = []
+    stop_at = time.monotonic() + args.duration if args.duration else None
+
+    async with httpx.AsyncClient(timeout=args.request_timeout, limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        await wait_until_ready(client, base_url, args.process)
+        baseline_rss = read_rss_kib(server_pid)["rss"]
+
+        async def worker():
+            while True:
+                n = next(counter)
+                if (stop_at is None and n >= args.requests) or (stop_at is not None and time.monotonic() >= stop_at):
+                    return
+                stream = rng.choice(streams)
+                # A unique suffix keeps requests from being coalesced unless duplicates are asked for
+                question = rng.choice(QUESTIONS[stream])
+                if rng.random() >= args.duplicate_ratio:
+                    question = f"{question} (request {n})"
+                payload = {"question": question, "agent_type": stream, "format_preference": rng.choice(formats)}
+                started = time.perf_counter()
+                try:
+                    response = await client.post(f"{base_url}/{stream}/query", json=payload)
+                    outcome = str(response.status_code)
+                    if response.status_code == 200 and response.json().get("status") != "success":
+                        outcome = "200-error"
+                except httpx.HTTPError as e:
+                    outcome = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                statuses[outcome] = statuses.get(outcome, 0) + 1
+
+        async def sample_rss():
+            while True:
+                rss = read_rss_kib(server_pid)["rss"]
+                if rss:
+                    rss_samples.append(rss)
+                await asyncio.sleep(0.5)
+
+        sampler = asyncio.ensure_future(sample_rss())
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started
+        sampler.cancel()
+
+    ordered = sorted(latencies)
+    memory = read_rss_kib(server_pid)
+    return {
+        "requests": len(latencies),
+        "concurrency": args.concurrency,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "latency_ms": {
+            "p50": round(percentile(ordered, 50) * 1000, 1),
+            "p95": round(percentile(ordered, 95) * 1000, 1),
+            "p99": round(percentile(ordered, 99) * 1000, 1),
+            "mean": round(statistics.mean(ordered) * 1000, 1) if ordered else None,
+            "max": round(ordered[-1] * 1000, 1) if ordered else None,
+        },
+        "statuses": statuses,
+        "server_rss_mib": {
+            "baseline": round(baseline_rss / 1024, 1) if baseline_rss else None,
+            "max_sampled": round(max(rss_samples) / 1024, 1) if rss_samples else None,
+            "end": round(memory["rss"] / 1024, 1) if memory["rss"] else None,
+            "peak": round(memory["peak"] / 1024, 1) if memory["peak"] else None,
+        },
+    }
+
+
+def main():
+    argv = sys.argv[1:]
+    server_extra = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, server_extra = argv[:split], argv[split + 1:]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=None, help="Run for this many seconds instead of a fixed request count")
+    parser.add_argument("--stream", choices=["scm", "hcm", "both"], default="both")
+    parser.add_argument("--format", choices=["natural_language", "table", "mixed"], default="mixed")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Fraction of requests that repeat a question verbatim")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--bip-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--bip-rows", type=int, default=200)
+    parser.add_argument("--request-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", dest="json_path", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    command = [
+        sys.executable, SERVER_SCRIPT, "--port", str(args.port),
+        "--llm-latency-ms", str(args.llm_latency_ms),
+        "--bip-latency-ms", str(args.bip_latency_ms),
+        "--bip-rows", str(args.bip_rows),
+    ] + server_extra
+    args.process = subprocess.Popen(command, cwd=REPO_ROOT)
+    try:
+        results = asyncio.run(drive(args, f"http://127.0.0.1:{args.port}", args.process.pid))
+    finally:
+        args.process.terminate()
+        try:
+            args.process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            args.process.kill()
+
+    results["settings"] = {
+        "llm_latency_ms": args.llm_latency_ms, "bip_latency_ms": args.bip_latency_ms,
+        "bip_rows": args.bip_rows, "format": args.format, "stream": args.stream,
+        "duplicate_ratio": args.duplicate_ratio, "server_args": server_extra,
+    }
+    print(json.dumps(results, indent=2))
+    if args.json_path:
+        with open(args.json_path, "w") as output:
+            json.dump(results, output, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Logging overhead benchmark.
+
+Replays the log calls made while serving one table-mode request (prompts, generated SQL, the
+SOAP response, CSV previews, the formatted answer) and measures the time they cost the request
+thread under two setups:
+  - legacy: logging.basicConfig(DEBUG) writing chatbot.log synchronously, per-module console
+            handlers, and the SOAP response printed to stdout
+  - queued: logging_config.setup_logging() - one QueueHandler, file/console I/O on the listener
+            thread, INFO level by default, large payloads truncated/sampled
+
+Log output goes to a temporary directory; console output is sent to os.devnull.
+
+Usage:
+    python benchmarks/bench_logging.py [--requests 500] [--soap-kb 512] [--level INFO]
+"""
+import argparse
+import contextlib
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("ORACLE_FUSION_URL", "http://localhost")
+
+from config import Config  # noqa: E402
+import logging_config  # noqa: E402
+
+MODULES = ("agent", "query_tools", "oracle_db_utils", "query_api")
+
+
+def make_payloads(soap_kb: int) -> dict:
+    columns = ", ".join(f"COLUMN_{i}" for i in range(25))
+    return {
+        "question": "Show on-hand quantity for items in warehouse M1 with lot numbers",
+        "prompt": ("You are an Oracle SQL expert. Modify the base query. " + columns + "\n") * 60,
+        "sql": f"SELECT {columns} FROM EGP_SYSTEM_ITEMS_B ESIB JOIN INV_ONHAND_QUANTITIES_DETAIL IOQD ON 1 = 1 " * 12,
+        "soap": "A" * (soap_kb * 1024),
+        "csv": "\n".join(",".join(str(r * c) for c in range(25)) for r in range(200)),
+        "answer": "| " + " | ".join(f"COL_{i}" for i in range(25)) + " |\n" * 12,
+    }
+
+
+def simulate_request(loggers: dict, p: dict, print_soap: bool) -> None:
+    agent, tools, db, api = (loggers[m] for m in MODULES)
+    api.info("Received question")
+    api.info(f"Received query request for agent_stream: scm, question: {p['question']}, thread_id: t-1, format_preference: table")
+    db.debug("Acquired connection from pool")
+    agent.info(f"SCMAgent: Starting run for question: {p['question']}, agent_stream: scm, thread_id: t-1")
+    agent.info("Reconstructed 12 messages from Oracle for thread_id: t-1")
+    agent.info(f"SCMAgent: Classifying question: {p['question']} for agent_stream: scm")
+    agent.info("SCMAgent: Question classified as: non-general")
+    tools.debug(f"Context matching prompt: {p['prompt']}")
+    tools.debug("Raw LLM response for context ID: 3")
+    agent.debug(f"SCMAgent: Full selected query: {p['sql']}")
+    tools.info(f"Modifying query based on user input: {p['question']}")
+    tools.debug(f"Query modification prompt: {p['prompt'][:200]}...")
+    tools.debug(f"Modified query: {p['sql']}")
+    agent.debug(f"SCMAgent: Modified query: {p['sql']}")
+    tools.debug(f"OracleBIPTool: Cleaned SQL query for BIP: {p['sql'][:100]}...")
+    tools.debug(f"OracleBIPTool: Base64 encoded query: {p['sql']}")
+    tools.info("OracleBIPTool: Sending SOAP request to Oracle BIP service")
+    tools.info("OracleBIPTool: Received response with status code: 200")
+    if print_soap:
+        print("OracleBIPTool: SOAP Response Text:" + p["soap"])
+    else:
+        tools.debug(f"OracleBIPTool: SOAP response of {len(p['soap'])} chars")
+    tools.debug(f"OracleBIPTool: CSV Data: {p['csv'][:200]}...")
+    agent.info("SCMAgent: Preview executed, full result has 4200 rows")
+    agent.info(f"SCMAgent: Response generated: {p['answer'][:100]}...")
+    agent.debug(f"SCMAgent: Full response: {p['answer']}")
+    for _ in range(3):
+        db.debug("Released connection to pool")
+        agent.info("Message saved to Oracle with MESSAGE_ID: 1 for thread_id: t-1")
+    api.info(f"Query processed successfully, response: {p['answer'][:100]}...")
+
+
+def configure_legacy(log_dir: str, devnull) -> None:
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    logging.basicConfig(
+        level=logging.DEBUG,
+        filename=os.path.join(log_dir, "legacy.log"),
+        filemode="a",
+        format=logging_config.LOG_FORMAT,
+        force=True,
+    )
+    for name in MODULES:
+        console_handler = logging.StreamHandler(devnull)
+        console_handler.setLevel(logging.DEBUG)
+        logging.getLogger(name).addHandler(console_handler)
+
+
+def reset_module_loggers() -> None:
+    for name in MODULES:
+        module_logger = logging.getLogger(name)
+        for handler in list(module_logger.handlers):
+            module_logger.removeHandler(handler)
+        module_logger.setLevel(logging.NOTSET)
+
+
+def run(mode: str, requests: int, payloads: dict, log_dir: str, level: str) -> list:
+    reset_module_loggers()
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), contextlib.redirect_stderr(devnull):
+        if mode == "legacy":
+            configure_legacy(log_dir, devnull)
+        else:
+            Config.LOG_FILE = os.path.join(log_dir, "queued.log")
+            Config.LOG_LEVEL = level
+            logging_config.setup_logging(force=True)
+        loggers = {name: logging.getLogger(name) for name in MODULES}
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            simulate_request(loggers, payloads, print_soap=(mode == "legacy"))
+            samples.append(time.perf_counter() - start)
+        if mode == "queued":
+            logging_config.shutdown_logging()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--soap-kb", type=int, default=512, help="Size of the SOAP response the legacy path prints")
+    parser.add_argument("--level", default="INFO", help="Root level for the queued setup (DEBUG to compare like for like)")
+    args = parser.parse_args()
+
+    payloads = make_payloads(args.soap_kb)
+    with tempfile.TemporaryDirectory() as log_dir:
+        results = {mode: run(mode, args.requests, payloads, log_dir, args.level) for mode in ("legacy", "queued")}
+        sizes = {name: os.path.getsize(os.path.join(log_dir, name)) for name in os.listdir(log_dir)}
+
+    print(f"{'setup':<8} {'median (us)':>12} {'p95 (us)':>10} {'max (us)':>10}")
+    for mode, samples in results.items():
+        micros = sorted(s * 1e6 for s in samples)
+        p95 = micros[int(0.95 * (len(micros) - 1))]
+        print(f"{mode:<8} {statistics.median(micros):>12.1f} {p95:>10.1f} {micros[-1]:>10.1f}")
+    for name, size in sorted(sizes.items()):
+        print(f"{name}: {size / args.requests / 1024:.1f} KiB written per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Markdown table rendering: the original BaseAgent._df_to_markdown (row loop with "+=" and str()
+per cell, kept below as legacy_df_to_markdown) against markdown_render.render_markdown_table.
+
+Frames come from the fake BIP extracts (benchmarks/fakes.py); the "wide" case adds a free-text
+column of --text-chars characters with pipes and newlines, as in comment/description fields.
+For each case it reports the median render time and the output size:
+  - legacy:     the old implementation
+  - unlimited:  the new renderer with width and size caps off (same table, escaped)
+  - default:    the new renderer with the Config.MARKDOWN_* caps
+
+Usage:
+    python benchmarks/bench_markdown.py --rows 10,1000,10000,50000 --repeat 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+from io import StringIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("ORACLE_FUSION_URL", "http://localhost")
+os.environ.setdefault("LOG_CONSOLE", "false")
+
+import pandas as pd  # noqa: E402
+
+from config import Config  # noqa: E402
+from markdown_render import render_markdown_table  # noqa: E402
+from fakes import build_csv, build_hcm_csv  # noqa: E402
+
+
+def legacy_df_to_markdown(df: pd.DataFrame) -> str:
+    headers = df.columns.tolist()
+    rows = df.values.tolist()
+    markdown_table = "| " + " | ".join(headers) + " |\n"
+    markdown_table += "| " + " | ".join(["---"] * len(headers)) + " |\n"
+    for row in rows:
+        markdown_table += "| " + " | ".join(str(cell) for cell in row) + " |\n"
+    return markdown_table
+
+
+def build_frames(rows: int, text_chars: int):
+    scm = pd.read_csv(StringIO("\n".join(build_csv(rows))))
+    hcm = pd.read_csv(StringIO("\n".join(build_hcm_csv(rows))))
+    wide = scm.copy()
+    note = ("Backordered | awaiting supplier confirmation.\nSee ticket for details. " * (text_chars // 60 + 1))[:text_chars]
+    wide["COMMENTS"] = [f"{i}: {note}" for i in range(rows)]
+    return {"scm": scm, "hcm": hcm, "wide": wide}
+
+
+def measure(render, df, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        text = render(df)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times), len(text.encode("utf-8"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10,1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--text-chars", type=int, default=400)
+    args = parser.parse_args()
+
+    renderers = [
+        ("legacy", legacy_df_to_markdown),
+        ("unlimited", lambda df: render_markdown_table(df, max_column_width=0, max_bytes=0)),
+        ("default", render_markdown_table),
+    ]
+    print(f"caps: MARKDOWN_MAX_COLUMN_WIDTH={Config.MARKDOWN_MAX_COLUMN_WIDTH} MARKDOWN_MAX_BYTES={Config.MARKDOWN_MAX_BYTES}")
+    print(f"{'case':<14} {'renderer':<10} {'ms':>10} {'bytes':>13} {'speedup':>8}")
+    for rows in (int(r) for r in args.rows.split(",")):
+        for name, df in build_frames(rows, args.text_chars).items():
+            baseline = None
+            for label, render in renderers:
+                seconds, size = measure(render, df, args.repeat)
+                baseline = baseline or seconds
+                print(f"{name + '/' + str(rows):<14} {label:<10} {seconds * 1e3:>10.2f} {size:>13,} {baseline / seconds:>7.1f}x")
+        print()
+
+
+if __name__ == "__main__":
+    main()
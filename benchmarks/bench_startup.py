@@ -0,0 +1,75 @@
+"""
+Startup-time benchmark for the API worker.
+
+Each sample runs in a fresh interpreter (like a new uvicorn worker) and measures:
+  - import:   importing mainforQuery (module-level work done by every worker)
+  - lifespan: running the FastAPI lifespan startup phase
+  - ready:    import + lifespan, i.e. time until the worker can accept requests
+  - agent:    first get_agent() call (lazy LLM client and graph construction)
+
+The lifespan includes the schema-version check (one DB round trip); set
+SCHEMA_CHECK_ON_STARTUP=false to measure a worker without a reachable database.
+
+Usage:
+    python benchmarks/bench_startup.py [--samples 5] [--skip-agent]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_SAMPLE_SCRIPT = r"""
+import asyncio, json, sys, time
+start = time.perf_counter()
+import mainforQuery
+imported = time.perf_counter()
+
+async def run_lifespan():
+    async with mainforQuery.app.router.lifespan_context(mainforQuery.app):
+        ready = time.perf_counter()
+        agent_seconds = None
+        if "--with-agent" in sys.argv:
+            t0 = time.perf_counter()
+            mainforQuery.get_agent("scm")
+            agent_seconds = time.perf_counter() - t0
+        return ready, agent_seconds
+
+ready, agent_seconds = asyncio.run(run_lifespan())
+print(json.dumps({
+    "import": imported - start,
+    "lifespan": ready - imported,
+    "ready": ready - start,
+    "agent": agent_seconds,
+}))
+"""
+
+
+def run_sample(with_agent: bool) -> dict:
+    args = [sys.executable, "-c", _SAMPLE_SCRIPT]
+    if with_agent:
+        args.append("--with-agent")
+    completed = subprocess.run(args, cwd=REPO_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=5)
+    parser.add_argument("--skip-agent", action="store_true", help="Do not measure lazy agent construction")
+    args = parser.parse_args()
+
+    samples = [run_sample(with_agent=not args.skip_agent) for _ in range(args.samples)]
+    print(f"{'phase':<10} {'min (ms)':>10} {'median (ms)':>12} {'max (ms)':>10}")
+    for phase in ("import", "lifespan", "ready", "agent"):
+        values = [s[phase] * 1000 for s in samples if s.get(phase) is not None]
+        if not values:
+            continue
+        print(f"{phase:<10} {min(values):>10.1f} {statistics.median(values):>12.1f} {max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Local stand-ins for the service's external dependencies, used by the load-test harness:
+  - FakeChatModel:  scripted replacement for the Azure OpenAI chat model (configurable latency)
+  - FakeBIPServer:  local HTTP server answering BIP runReport SOAP calls with base64 CSV reportBytes
+The database side needs no fake: the harness runs the app with CHAT_STORE_BACKEND=sqlite.
+"""
+import base64
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+PREVIEW_MARKER = "PREVIEW_TOTAL_ROWS"
+_ROWNUM_RE = re.compile(r"ROWNUM\s*<=\s*(\d+)", re.IGNORECASE)
+_SOAP_QUERY_RE = re.compile(r"<pub:values>\s*<pub:item>([A-Za-z0-9+/=\s]+)</pub:item>")
+_CONTEXT_RE = re.compile(r"\(Database ID: (\d+)\)\s*(.*)")
+_BASE_QUERY_RE = re.compile(r"```sql\s*(.*?)```", re.DOTALL)
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+class FakeResponse:
+    """Mimics the parts of a LangChain AIMessage the service reads."""
+
+    def __init__(self, content: str, prompt_tokens: int, completion_tokens: int):
+        self.content = content
+        self.usage_metadata = {
+            "input_tokens": prompt_tokens,
+            "output_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+        self.response_metadata = {}
+
+
+class FakeChatModel:
+    """
+    Answers each prompt the agents send with a plausible, valid reply:
+    classification -> "non-general", context matching -> best keyword-overlap ID,
+    SQL generation -> the base query unchanged, summarization -> a short bullet list.
+    Each call sleeps for latency_ms +/- jitter_ms to model the model's response time.
+    """
+
+    def __init__(self, latency_ms: float = 800.0, jitter_ms: float = 200.0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _sleep(self) -> None:
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+        time.sleep(delay / 1000.0)
+
+    def _reply(self, prompt: str) -> str:
+        if "Return only one word: either \"non-general\" or \"general\"" in prompt:
+            return "non-general"
+        if "predefined query contexts" in prompt:
+            question = prompt.split("User Question:", 1)[-1].split("Available Contexts:", 1)[0]
+            question_words = set(_WORD_RE.findall(question.lower()))
+            best_id, best_score = None, -1
+            for context_id, text in _CONTEXT_RE.findall(prompt):
+                score = len(question_words & set(_WORD_RE.findall(text.lower())))
+                if score > best_score:
+                    best_id, best_score = context_id, score
+            return best_id or "none"
+        base_query = _BASE_QUERY_RE.search(prompt)
+        if base_query:
+            return base_query.group(1).strip()
+        return (
+            "* The query returned the requested records.\n"
+            "* Quantities are concentrated in a few organizations.\n"
+            "* No anomalies were found in the sample."
+        )
+
+    def invoke(self, prompt: Any, **kwargs: Any) -> FakeResponse:
+        text = prompt if isinstance(prompt, str) else str(prompt)
+        self._sleep()
+        reply = self._reply(text)
+        return FakeResponse(reply, max(1, len(text) // 4), max(1, len(reply) // 4))
+
+
+def build_csv(rows: int, columns: int = 9) -> List[str]:
+    """SCM-shaped CSV lines: header first, then `rows` data lines."""
+    header = ["Item Number", "Organization Code", "Quantity Onhand", "Primary UOM", "Secondary Quantity Onhand",
+              "Secondary UOM", "Item Description", "Subinventory Code", "Locator"][:columns]
+    lines = [",".join(header)]
+    for i in range(rows):
+        values = [f"ITEM-{i:07d}", f"M{i % 7}", str((i * 37) % 5000), "EA", str((i * 11) % 300), "BOX",
+                  f"Description for item {i}", f"SUB{i % 13}", f"A.{i % 50}.{i % 9}"][:columns]
+        lines.append(",".join(values))
+    return lines
+
+
+def build_hcm_csv(rows: int) -> List[str]:
+    """HCM-shaped CSV lines (employee assignments): header first, then `rows` data lines."""
+    lines = ["Person Number,Full Name,Hire Date,Organization,Position,Location,Manager,Grade,Assignment Status"]
+    for i in range(rows):
+        lines.append(
+            f"{100000 + i},Employee {i},20{i % 24:02d}-{i % 12 + 1:02d}-{i % 28 + 1:02d},Org {i % 40},"
+            f"Position {i % 120},Location {i % 15},Manager {i % 300},G{i % 9},{'Active' if i % 11 else 'Inactive'}"
+        )
+    return lines
+
+
+class FakeBIPServer:
+    """
+    Serves BIP runReport SOAP requests on a local port. Full queries get `rows` rows; preview
+    queries (wrapped with PREVIEW_TOTAL_ROWS and ROWNUM <= n) get the first n rows plus the
+    count column, like the real report would.
+    """
+
+    def __init__(self, rows: int = 200, latency_ms: float = 1500.0, host: str = "127.0.0.1", port: int = 0):
+        self.rows = rows
+        self.latency_ms = latency_ms
+        self.requests = 0
+        self._lines = build_csv(rows)
+        self._full_payload = base64.b64encode(("\n".join(self._lines) + "\n").encode("utf-8")).decode("ascii")
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+                server.requests += 1
+                payload = server._report_bytes(body)
+                time.sleep(server.latency_ms / 1000.0)
+                response = server._envelope(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/soap+xml;charset=UTF-8")
+                self.send_header("Content-Length", str(len(response)))
+                self.end_headers()
+                self.wfile.write(response)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.url = f"http://{host}:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fake-bip", daemon=True)
+
+    def _report_bytes(self, body: str) -> str:
+        match = _SOAP_QUERY_RE.search(body)
+        query = base64.b64decode(match.group(1)).decode("utf-8") if match else ""
+        if PREVIEW_MARKER not in query:
+            return self._full_payload
+        limit = int(_ROWNUM_RE.findall(query)[-1]) if _ROWNUM_RE.search(query) else 10
+        lines = [self._lines[0] + f",{PREVIEW_MARKER}"]
+        lines += [line + f",{self.rows}" for line in self._lines[1:limit + 1]]
+        return base64.b64encode(("\n".join(lines) + "\n").encode("utf-8")).decode("ascii")
+
+    @staticmethod
+    def _envelope(report_bytes: str) -> str:
+        return (
+            '<env:Envelope xmlns:env="http://www.w3.org/2003/05/soap-envelope">'
+            '<env:Body><ns2:runReportResponse xmlns:ns2="http://xmlns.oracle.com/oxp/service/PublicReportService">'
+            f"<ns2:runReportReturn><ns2:reportBytes>{report_bytes}</ns2:reportBytes>"
+            "<ns2:reportContentType>text/csv</ns2:reportContentType></ns2:runReportReturn>"
+            "</ns2:runReportResponse></env:Body></env:Envelope>"
+        )
+
+    def start(self) -> "FakeBIPServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
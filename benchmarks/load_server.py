@@ -0,0 +1,69 @@
+"""
+Runs the real FastAPI app (mainforQuery.app) under uvicorn with every external dependency
+replaced by a local stand-in from benchmarks/fakes.py. Started as a subprocess by
+benchmarks/bench_load.py so its RSS can be measured on its own; it can also be run by hand:
+
+    python benchmarks/load_server.py --port 8765 --bip-rows 2000 --llm-latency-ms 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--llm-latency-ms", type=float, default=800.0)
+    parser.add_argument("--llm-jitter-ms", type=float, default=200.0)
+    parser.add_argument("--bip-latency-ms", type=float, default=1500.0)
+    parser.add_argument("--bip-rows", type=int, default=200, help="Rows returned by every full BIP report")
+    parser.add_argument("--tpm", type=int, default=100_000_000, help="LLM tokens/minute quota (default effectively unlimited)")
+    parser.add_argument("--rpm", type=int, default=1_000_000, help="LLM requests/minute quota (default effectively unlimited)")
+    parser.add_argument("--data-dir", default=None, help="Directory for the SQLite files and log (default: a temp dir)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="fusion-assist-load-")
+
+    from fakes import FakeBIPServer, FakeChatModel
+    bip_server = FakeBIPServer(rows=args.bip_rows, latency_ms=args.bip_latency_ms).start()
+
+    # Config reads the environment at import time, so everything is set before the app is imported.
+    os.environ.update({
+        "ORACLE_FUSION_URL": bip_server.url,
+        "BASE_URL": f"http://{args.host}:{args.port}",
+        "SCHEMA_CHECK_ON_STARTUP": "false",
+        "RUN_MIGRATIONS_ON_STARTUP": "false",
+        "CHAT_STORE_BACKEND": "sqlite",
+        "CHAT_STORE_SQLITE_PATH": os.path.join(data_dir, "chat.db"),
+        "JOB_STORE_BACKEND": "sqlite",
+        "JOB_STORE_SQLITE_PATH": os.path.join(data_dir, "jobs.db"),
+        "LOG_FILE": os.path.join(data_dir, "chatbot.log"),
+        "LOG_CONSOLE": "false",
+        "AZURE_OPENAI_TPM": str(args.tpm),
+        "AZURE_OPENAI_RPM": str(args.rpm),
+    })
+
+    from config import Config
+    import llm_utils
+    llm_utils.register_llm(Config.AZURE_OPENAI_DEPLOYMENT, FakeChatModel(args.llm_latency_ms, args.llm_jitter_ms))
+
+    import uvicorn
+    import mainforQuery
+    print(f"Load server on http://{args.host}:{args.port} (fake BIP {bip_server.url}, data in {data_dir})", flush=True)
+    try:
+        uvicorn.run(mainforQuery.app, host=args.host, port=args.port, log_level="warning")
+    finally:
+        bip_server.stop()
+
+
+if __name__ == "__main__":
+    main()
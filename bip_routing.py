@@ -0,0 +1,168 @@
+import json
+import logging
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import Config
+
+logger = logging.getLogger("bip_routing")
+
+BIP_SERVICE_PATH = "/xmlpserver/services/ExternalReportWSSService?wsdl"
+DEFAULT_REPORT_PATH = "/Custom/SCM AI Agent/SQLConnectReportCSV.xdo"
+DEFAULT_ENDPOINT = "default"
+
+
+class BIPEndpointBusy(RuntimeError):
+    """No execution slot of the endpoint freed up in time."""
+
+
+class BIPEndpoint:
+    """
+    One Fusion pod's BIP service: its URL, credentials and report, a keep-alive HTTP session of its
+    own (max_connections) and at most max_concurrency reports running at once (0: unlimited).
+    """
+
+    def __init__(self, name: str, url: str, user: Optional[str], password: Optional[str],
+                 report_path: str = DEFAULT_REPORT_PATH, max_connections: int = 10, max_concurrency: int = 0):
+        self.name = name
+        self.url = url
+        self.auth = (user, password)
+        self.report_path = report_path
+        self.max_connections = max(1, max_connections)
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_connections)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency) if max_concurrency > 0 else None
+        self._stats_lock = threading.Lock()
+        self.running = 0
+        self.executed = 0
+        self.rejected = 0
+
+    @contextmanager
+    def slot(self, timeout: Optional[float] = None) -> Iterator[None]:
+        """Holds one of the endpoint's execution slots, waiting up to `timeout` seconds (None: indefinitely) for one."""
+        if self._slots is not None and not self._slots.acquire(timeout=timeout):
+            with self._stats_lock:
+                self.rejected += 1
+            raise BIPEndpointBusy(f"BIP endpoint '{self.name}' is at its limit of {self.max_concurrency} concurrent reports")
+        with self._stats_lock:
+            self.running += 1
+        try:
+            yield
+        finally:
+            with self._stats_lock:
+                self.running -= 1
+                self.executed += 1
+            if self._slots is not None:
+                self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            return {
+                "url": self.url, "max_connections": self.max_connections, "max_concurrency": self.max_concurrency,
+                "running": self.running, "executed": self.executed, "rejected": self.rejected,
+            }
+
+    def __repr__(self) -> str:
+        return f"BIPEndpoint({self.name}, {self.url})"
+
+
+def _credential(spec: Dict[str, Any], key: str, default: Optional[str]) -> Optional[str]:
+    # Given inline ("password") or, preferably, as the name of an environment variable holding it ("password_env")
+    if spec.get(key):
+        return spec[key]
+    if spec.get(f"{key}_env"):
+        return os.getenv(spec[f"{key}_env"])
+    return default
+
+
+def _endpoint_from_spec(name: str, spec: Dict[str, Any]) -> BIPEndpoint:
+    url = spec.get("url") or ""
+    if url and "/xmlpserver/" not in url:
+        url = url.rstrip("/") + BIP_SERVICE_PATH
+    return BIPEndpoint(
+        name,
+        url,
+        _credential(spec, "user", Config.ORACLE_FUSION_USER),
+        _credential(spec, "password", Config.ORACLE_FUSION_PASS),
+        report_path=spec.get("report_path", DEFAULT_REPORT_PATH),
+        max_connections=int(spec.get("max_connections", Config.BIP_MAX_CONNECTIONS)),
+        max_concurrency=int(spec.get("max_concurrency", Config.BIP_MAX_CONCURRENCY)),
+    )
+
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """Parses BIP_ROUTES: "scm=pod-a,hcm=pod-b,acme=pod-c" -> {"scm": "pod-a", ...} (keys are tenants or agent streams)."""
+    routes = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        key, _, endpoint = item.partition("=")
+        if not key.strip() or not endpoint.strip():
+            logger.warning(f"Ignoring invalid BIP_ROUTES entry: {item!r}")
+            continue
+        routes[key.strip().lower()] = endpoint.strip()
+    return routes
+
+
+class BIPRouter:
+    """
+    Picks the BIP endpoint of a request: the route of its tenant if there is one, else the route of its
+    agent stream, else the default endpoint (ORACLE_FUSION_URL with ORACLE_FUSION_USER/PASS).
+    """
+
+    def __init__(self, endpoints: Dict[str, BIPEndpoint], routes: Dict[str, str], default: str = DEFAULT_ENDPOINT):
+        unknown = {key: name for key, name in routes.items() if name not in endpoints}
+        if unknown:
+            raise ValueError(f"BIP_ROUTES refers to undefined endpoints: {unknown}")
+        if default not in endpoints:
+            raise ValueError(f"Default BIP endpoint '{default}' is not defined")
+        self.endpoints = endpoints
+        self.routes = routes
+        self.default = default
+
+    @classmethod
+    def from_config(cls) -> "BIPRouter":
+        endpoints = {DEFAULT_ENDPOINT: _endpoint_from_spec(DEFAULT_ENDPOINT, {"url": Config.ORACLE_BIP_ENDPOINT})}
+        specs = json.loads(Config.BIP_ENDPOINTS) if Config.BIP_ENDPOINTS else {}
+        for name, spec in specs.items():
+            endpoints[name] = _endpoint_from_spec(name, spec)
+        router = cls(endpoints, parse_routes(Config.BIP_ROUTES), Config.BIP_DEFAULT_ENDPOINT or DEFAULT_ENDPOINT)
+        if specs or router.routes:
+            logger.info(f"BIP endpoints: {list(endpoints)}; routes: {router.routes}; default: {router.default}")
+        return router
+
+    def resolve(self, agent_stream: Optional[str] = None, tenant: Optional[str] = None) -> BIPEndpoint:
+        for key in (tenant, agent_stream):
+            if key and key.lower() in self.routes:
+                return self.endpoints[self.routes[key.lower()]]
+        return self.endpoints[self.default]
+
+    def get(self, name: Optional[str]) -> BIPEndpoint:
+        """The endpoint called `name`; the default one for None or a name no longer configured."""
+        return self.endpoints.get(name or self.default) or self.endpoints[self.default]
+
+    def all(self) -> List[BIPEndpoint]:
+        return list(self.endpoints.values())
+
+    def stats(self) -> Dict[str, Any]:
+        return {"default": self.default, "routes": dict(self.routes), "endpoints": {e.name: e.stats() for e in self.all()}}
+
+
+_router: Optional[BIPRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_bip_router() -> BIPRouter:
+    """The process-wide router, built from the configuration on first use."""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = BIPRouter.from_config()
+    return _router
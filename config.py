@@ -17,4 +17,148 @@ class Config:
     ORACLE_DB_DSN = "aipocatp_high" 
     ORACLE_DB_CONFIG_DIR = r"/Wallet"
     ORACLE_DB_WALLET_LOCATION = r"/Wallet"
-    ORACLE_DB_WALLET_PASSWORD = "Mastek@123456" # Replace with your wallet password
\ No newline at end of file
+    ORACLE_DB_WALLET_PASSWORD = "Mastek@123456" # Replace with your wallet password
+    # Number of regenerate-with-feedback attempts when generated SQL fails pre-flight validation
+    SQL_VALIDATION_RETRIES = int(os.getenv("SQL_VALIDATION_RETRIES", "1"))
+    # Rows rendered inline in table mode; table-mode queries fetch only this many rows (plus a total count) first
+    PREVIEW_ROW_LIMIT = int(os.getenv("PREVIEW_ROW_LIMIT", "10"))
+    # Table-mode downloads (results with more than PREVIEW_ROW_LIMIT rows) are built by these background export workers
+    EXPORT_JOB_WORKERS = int(os.getenv("EXPORT_JOB_WORKERS", "2"))
+    JOB_STORE_BACKEND = os.getenv("JOB_STORE_BACKEND", "oracle")  # "oracle" or "sqlite"
+    JOB_STORE_SQLITE_PATH = os.getenv("JOB_STORE_SQLITE_PATH", "export_jobs.db")
+    # Apply pending schema migrations in the application lifespan; normally done once per deployment via "python db_migrate.py"
+    RUN_MIGRATIONS_ON_STARTUP = os.getenv("RUN_MIGRATIONS_ON_STARTUP", "false").lower() == "true"
+    # Otherwise startup only compares SCHEMA_MIGRATIONS against the latest migration script (one query)
+    SCHEMA_CHECK_ON_STARTUP = os.getenv("SCHEMA_CHECK_ON_STARTUP", "true").lower() == "true"
+    # Azure OpenAI deployment and its quota; one shared, rate-limited client is created per deployment
+    AZURE_OPENAI_API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
+    AZURE_OPENAI_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-35-turbo")
+    AZURE_OPENAI_TPM = int(os.getenv("AZURE_OPENAI_TPM", "120000"))
+    AZURE_OPENAI_RPM = int(os.getenv("AZURE_OPENAI_RPM", "720"))
+    LLM_COMPLETION_TOKEN_ESTIMATE = int(os.getenv("LLM_COMPLETION_TOKEN_ESTIMATE", "300"))
+    LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "60"))
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+    LLM_REQUEST_TIMEOUT_SECONDS = float(os.getenv("LLM_REQUEST_TIMEOUT_SECONDS", "60"))
+    # End-to-end budget per API request (clients may ask for less via "timeout_seconds"); BIP calls are capped separately
+    REQUEST_TIMEOUT_SECONDS = float(os.getenv("REQUEST_TIMEOUT_SECONDS", "90"))
+    BIP_TIMEOUT_SECONDS = float(os.getenv("BIP_TIMEOUT_SECONDS", "60"))
+    # Concurrent identical questions in the same conversation share one agent run (questions starting a new
+    # conversation never do); retried POSTs with the same Idempotency-Key from the same caller replay the stored response
+    COALESCE_DUPLICATE_REQUESTS = os.getenv("COALESCE_DUPLICATE_REQUESTS", "true").lower() == "true"
+    IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+    IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "1000"))
+    # Logging: root level, per-logger overrides ("agent=DEBUG,query_tools=WARNING"), rotating file, and payload size limits
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+    LOG_FILE = os.getenv("LOG_FILE", "chatbot.log")
+    LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", str(50 * 1024 * 1024)))
+    LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", "5"))
+    LOG_CONSOLE = os.getenv("LOG_CONSOLE", "true").lower() == "true"
+    LOG_MAX_MESSAGE_CHARS = int(os.getenv("LOG_MAX_MESSAGE_CHARS", "2000"))
+    LOG_LARGE_MESSAGE_SAMPLE_RATE = float(os.getenv("LOG_LARGE_MESSAGE_SAMPLE_RATE", "0.1"))
+    # Store for contexts, conversation history and attachments: "oracle" (ATP) or "sqlite" (edge deployments, load tests)
+    CHAT_STORE_BACKEND = os.getenv("CHAT_STORE_BACKEND", "oracle").lower()
+    CHAT_STORE_SQLITE_PATH = os.getenv("CHAT_STORE_SQLITE_PATH", "chatbot.db")
+    # Oracle session pool: size, how long an acquire may wait (0 = indefinitely), statement cache, idle-session health ping
+    POOL_MIN = int(os.getenv("POOL_MIN", "2"))
+    POOL_MAX = int(os.getenv("POOL_MAX", "10"))
+    POOL_INCREMENT = int(os.getenv("POOL_INCREMENT", "1"))
+    POOL_ACQUIRE_TIMEOUT_SECONDS = float(os.getenv("POOL_ACQUIRE_TIMEOUT_SECONDS", "10"))
+    POOL_STMT_CACHE_SIZE = int(os.getenv("POOL_STMT_CACHE_SIZE", "50"))
+    POOL_PING_INTERVAL_SECONDS = int(os.getenv("POOL_PING_INTERVAL_SECONDS", "60"))
+    POOL_IDLE_TIMEOUT_SECONDS = int(os.getenv("POOL_IDLE_TIMEOUT_SECONDS", "0"))
+    POOL_WARM_ON_STARTUP = os.getenv("POOL_WARM_ON_STARTUP", "true").lower() == "true"
+    # Statements (";"-separated) run once on each new pooled session, e.g. ALTER SESSION SET TIME_ZONE = 'UTC'
+    ORACLE_SESSION_INIT_SQL = os.getenv("ORACLE_SESSION_INIT_SQL", "")
+    # Stored message content and attachment blobs: "zstd" compresses on write (reads detect the format marker either way)
+    STORE_COMPRESSION = os.getenv("STORE_COMPRESSION", "none").lower()
+    STORE_COMPRESSION_LEVEL = int(os.getenv("STORE_COMPRESSION_LEVEL", "3"))
+    STORE_COMPRESSION_MIN_BYTES = int(os.getenv("STORE_COMPRESSION_MIN_BYTES", "512"))
+    STORE_COMPRESSION_MIN_SAVING = float(os.getenv("STORE_COMPRESSION_MIN_SAVING", "0.1"))
+    STORE_COMPRESSION_DICT_PATH = os.getenv("STORE_COMPRESSION_DICT_PATH", "")
+    # Comma-separated dictionaries that were replaced by STORE_COMPRESSION_DICT_PATH; only used to read older rows
+    STORE_COMPRESSION_OLD_DICT_PATHS = os.getenv("STORE_COMPRESSION_OLD_DICT_PATHS", "")
+    # Retention of conversation history and attachments (0 = keep forever). Per-stream ages ("hcm=30,scm=180") override
+    # RETENTION_MAX_AGE_DAYS. Enable the in-process purger on one worker only, or run python -m jobs.retention from cron.
+    RETENTION_ENABLED = os.getenv("RETENTION_ENABLED", "false").lower() == "true"
+    RETENTION_MAX_AGE_DAYS = float(os.getenv("RETENTION_MAX_AGE_DAYS", "0"))
+    RETENTION_STREAM_MAX_AGE_DAYS = os.getenv("RETENTION_STREAM_MAX_AGE_DAYS", "")
+    RETENTION_MAX_MESSAGES_PER_THREAD = int(os.getenv("RETENTION_MAX_MESSAGES_PER_THREAD", "0"))
+    RETENTION_BATCH_SIZE = int(os.getenv("RETENTION_BATCH_SIZE", "500"))
+    RETENTION_INTERVAL_SECONDS = float(os.getenv("RETENTION_INTERVAL_SECONDS", "3600"))
+    RETENTION_ARCHIVE_DIR = os.getenv("RETENTION_ARCHIVE_DIR", "")
+    # Download format of full results: "xlsx", or the BIP CSV as-is ("csv") or compressed ("csv.gz", "csv.zst"), which skips pandas/openpyxl
+    DEFAULT_EXPORT_FORMAT = os.getenv("DEFAULT_EXPORT_FORMAT", "xlsx").lower()
+    EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+    EXPORT_ZSTD_LEVEL = int(os.getenv("EXPORT_ZSTD_LEVEL", "3"))
+    # Markdown tables in answers (stored in history and re-sent as context): cell width cap, total size cap, float decimals
+    MARKDOWN_MAX_COLUMN_WIDTH = int(os.getenv("MARKDOWN_MAX_COLUMN_WIDTH", "60"))
+    MARKDOWN_MAX_BYTES = int(os.getenv("MARKDOWN_MAX_BYTES", "20000"))
+    MARKDOWN_FLOAT_DECIMALS = int(os.getenv("MARKDOWN_FLOAT_DECIMALS", "2"))
+    # Cache of executed results for paging (/results/{id}): memory limit before spilling to disk, disk limit, TTL, spill directory (default: system temp)
+    RESULT_CACHE_ENABLED = os.getenv("RESULT_CACHE_ENABLED", "true").lower() == "true"
+    RESULT_CACHE_MAX_MEMORY_MB = int(os.getenv("RESULT_CACHE_MAX_MEMORY_MB", "256"))
+    RESULT_CACHE_MAX_DISK_MB = int(os.getenv("RESULT_CACHE_MAX_DISK_MB", "2048"))
+    RESULT_CACHE_TTL_SECONDS = int(os.getenv("RESULT_CACHE_TTL_SECONDS", "3600"))
+    RESULT_CACHE_SPILL_DIR = os.getenv("RESULT_CACHE_SPILL_DIR", "")
+    # Also write every result to the spill directory when stored, so workers sharing it can serve each other's results
+    RESULT_CACHE_WRITE_THROUGH = os.getenv("RESULT_CACHE_WRITE_THROUGH", "false").lower() == "true"
+    RESULT_PAGE_DEFAULT_LIMIT = int(os.getenv("RESULT_PAGE_DEFAULT_LIMIT", "100"))
+    RESULT_PAGE_MAX_LIMIT = int(os.getenv("RESULT_PAGE_MAX_LIMIT", "1000"))
+    # Per-request memory budget: results whose CSV passes a quarter of it are spilled to memory-mapped temp files
+    # (REQUEST_SPILL_DIR, default: system temp) and read back in chunks of SPILL_CHUNK_ROWS; 0 disables it
+    REQUEST_MEMORY_BUDGET_MB = int(os.getenv("REQUEST_MEMORY_BUDGET_MB", "512"))
+    REQUEST_SPILL_DIR = os.getenv("REQUEST_SPILL_DIR", "")
+    SPILL_CHUNK_ROWS = int(os.getenv("SPILL_CHUNK_ROWS", "50000"))
+    # POST /batch: questions per request, agent runs in flight across all batches of a worker, and per batch (default and cap of "concurrency")
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
+    BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "8"))
+    BATCH_MAX_CONCURRENCY_PER_REQUEST = int(os.getenv("BATCH_MAX_CONCURRENCY_PER_REQUEST", "4"))
+    # QUERY_CONTEXTS rows and context queries are cached per process for this long (0: read the table on every request)
+    CONTEXT_CACHE_TTL_SECONDS = float(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "300"))
+    # Keep-alive connections kept open to the BIP host by the shared HTTP session
+    BIP_MAX_CONNECTIONS = int(os.getenv("BIP_MAX_CONNECTIONS", "10"))
+    # Startup prewarm (prewarm.py), run in the background after startup; /ready answers 503 until it finishes.
+    # PREWARM_BLOCKING makes startup wait for it instead (for load balancers that do not probe /ready).
+    # PREWARM_POOL_TARGET: pool sessions to open (0: POOL_MIN; keep POOL_IDLE_TIMEOUT_SECONDS at 0 or they are closed again).
+    # PREWARM_QUESTION: optional question run once per stream in PREWARM_AGENT_STREAMS; it is saved to history like any other.
+    PREWARM_ENABLED = os.getenv("PREWARM_ENABLED", "true").lower() == "true"
+    PREWARM_BLOCKING = os.getenv("PREWARM_BLOCKING", "false").lower() == "true"
+    PREWARM_AGENT_STREAMS = os.getenv("PREWARM_AGENT_STREAMS", "scm,hcm")
+    PREWARM_POOL_TARGET = int(os.getenv("PREWARM_POOL_TARGET", "0"))
+    PREWARM_LLM_CONNECTIONS = int(os.getenv("PREWARM_LLM_CONNECTIONS", "2"))
+    PREWARM_BIP_CONNECTIONS = int(os.getenv("PREWARM_BIP_CONNECTIONS", "2"))
+    PREWARM_QUESTION = os.getenv("PREWARM_QUESTION", "")
+    # Background health monitor behind /health and /health/ready: checks run (any of "database,bip,llm"), refresh
+    # interval, per-check timeout, and the checks readiness requires (others are reported but do not fail it)
+    HEALTH_CHECKS = os.getenv("HEALTH_CHECKS", "database,bip,llm")
+    HEALTH_CHECK_INTERVAL_SECONDS = float(os.getenv("HEALTH_CHECK_INTERVAL_SECONDS", "15"))
+    HEALTH_CHECK_TIMEOUT_SECONDS = float(os.getenv("HEALTH_CHECK_TIMEOUT_SECONDS", "5"))
+    HEALTH_READY_REQUIRES = os.getenv("HEALTH_READY_REQUIRES", "database")
+    # BIP endpoints besides the default one (ORACLE_FUSION_URL), as JSON: {"name": {"url": "https://pod...", "user_env": "VAR",
+    # "password_env": "VAR", "report_path": "...", "max_connections": 10, "max_concurrency": 4}}, and the routes choosing
+    # them per tenant or agent stream ("scm=pod-a,acme=pod-b"; tenant first). BIP_MAX_CONCURRENCY: running reports per endpoint (0: unlimited)
+    # BIP_TENANT_HEADER: request header holding the caller's tenant, which the authenticating gateway must set (and overwrite);
+    # unset, tenant routes are never used. The tenant picks the pod and its credentials, so it is never taken from the request body.
+    BIP_ENDPOINTS = os.getenv("BIP_ENDPOINTS", "")
+    BIP_ROUTES = os.getenv("BIP_ROUTES", "")
+    BIP_DEFAULT_ENDPOINT = os.getenv("BIP_DEFAULT_ENDPOINT", "default")
+    BIP_MAX_CONCURRENCY = int(os.getenv("BIP_MAX_CONCURRENCY", "0"))
+    BIP_TENANT_HEADER = os.getenv("BIP_TENANT_HEADER", "")
+    # Per-caller admission on the query endpoints: a token bucket of ADMISSION_BURST requests refilled at ADMISSION_RATE_PER_MINUTE
+    # per caller: the value of ADMISSION_USER_HEADER, a header the authenticating gateway must set (and overwrite), else the client
+    # address. Off by default: behind a proxy without that header every caller shares the proxy's address and so one bucket.
+    # Each /batch question takes its own token when it starts running.
+    # Callers over their rate wait up to ADMISSION_MAX_WAIT_SECONDS with at most ADMISSION_MAX_QUEUE requests waiting, else get 429.
+    # ADMISSION_BACKEND: "memory" (per worker), "sqlite" (workers of one host) or "oracle" (all pods; migration v006).
+    # ADMISSION_GLOBAL_RATE_PER_MINUTE (0: off) also caps all callers together.
+    ADMISSION_ENABLED = os.getenv("ADMISSION_ENABLED", "false").lower() == "true"
+    ADMISSION_BACKEND = os.getenv("ADMISSION_BACKEND", "memory").lower()
+    ADMISSION_SQLITE_PATH = os.getenv("ADMISSION_SQLITE_PATH", "admission.db")
+    ADMISSION_USER_HEADER = os.getenv("ADMISSION_USER_HEADER", "")
+    ADMISSION_RATE_PER_MINUTE = float(os.getenv("ADMISSION_RATE_PER_MINUTE", "60"))
+    ADMISSION_BURST = float(os.getenv("ADMISSION_BURST", "20"))
+    ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "5"))
+    ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "2"))
+    ADMISSION_GLOBAL_RATE_PER_MINUTE = float(os.getenv("ADMISSION_GLOBAL_RATE_PER_MINUTE", "0"))
+    ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "0"))
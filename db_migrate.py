@@ -0,0 +1,157 @@
+import importlib
+import logging
+import os
+import re
+import sys
+from typing import List, Tuple
+
+# Import Oracle DB utilities
+import oracle_db_utils
+import oracledb # Import for error handling
+from logging_config import setup_logging
+
+logger = logging.getLogger("db_migrate")
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+_MIGRATION_FILE_RE = re.compile(r"^v(\d{3,})_[a-z0-9_]+\.py$")
+
+SCHEMA_MIGRATIONS_DDL = """
+    CREATE TABLE SCHEMA_MIGRATIONS (
+        VERSION NUMBER PRIMARY KEY,
+        DESCRIPTION VARCHAR2(400) NOT NULL,
+        APPLIED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+    )
+"""
+
+
+def discover_migrations() -> List:
+    """
+    Loads the migration scripts in migrations/ (vNNN_description.py) ordered by version.
+    Each script defines VERSION, DESCRIPTION and either STATEMENTS (with optional
+    IGNORED_ERROR_CODES) or an upgrade(cursor) function.
+    """
+    migrations = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = _MIGRATION_FILE_RE.match(filename)
+        if not match:
+            continue
+        module = importlib.import_module(f"migrations.{filename[:-3]}")
+        if module.VERSION != int(match.group(1)):
+            raise ValueError(f"Migration {filename} declares VERSION {module.VERSION}, expected {int(match.group(1))}")
+        migrations.append(module)
+    versions = [m.VERSION for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Duplicate migration versions: {versions}")
+    return migrations
+
+
+def latest_version() -> int:
+    migrations = discover_migrations()
+    return migrations[-1].VERSION if migrations else 0
+
+
+def get_current_version(cursor) -> int:
+    """Returns the highest applied migration version, or 0 if SCHEMA_MIGRATIONS does not exist yet."""
+    try:
+        cursor.execute("SELECT NVL(MAX(VERSION), 0) FROM SCHEMA_MIGRATIONS")
+        return int(cursor.fetchone()[0])
+    except oracledb.Error as e:
+        error_obj, = e.args
+        if error_obj.code == 942: # ORA-00942: table or view does not exist
+            return 0
+        raise
+
+
+def _apply_migration(cursor, migration) -> None:
+    if hasattr(migration, "upgrade"):
+        migration.upgrade(cursor)
+        return
+    ignored = getattr(migration, "IGNORED_ERROR_CODES", ())
+    for statement in migration.STATEMENTS:
+        try:
+            cursor.execute(statement)
+        except oracledb.Error as e:
+            error_obj, = e.args
+            if error_obj.code in ignored:
+                logger.warning(f"Migration {migration.VERSION}: ignoring ORA-{error_obj.code:05d} ({error_obj.message.strip()})")
+            else:
+                raise
+
+
+def migrate() -> Tuple[int, int]:
+    """Applies every pending migration in order. Returns (version_before, version_after)."""
+    migrations = discover_migrations()
+    conn = None
+    try:
+        conn = oracle_db_utils.get_oracle_connection()
+        cursor = conn.cursor()
+        current = get_current_version(cursor)
+        if current == 0:
+            try:
+                cursor.execute(SCHEMA_MIGRATIONS_DDL)
+                logger.info("SCHEMA_MIGRATIONS table created (Oracle).")
+            except oracledb.Error as e:
+                error_obj, = e.args
+                if error_obj.code != 955:
+                    raise
+
+        starting_version = current
+        for migration in migrations:
+            if migration.VERSION <= current:
+                continue
+            logger.info(f"Applying migration {migration.VERSION}: {migration.DESCRIPTION}")
+            _apply_migration(cursor, migration)
+            cursor.execute(
+                "INSERT INTO SCHEMA_MIGRATIONS (VERSION, DESCRIPTION) VALUES (:version, :description)",
+                version=migration.VERSION, description=migration.DESCRIPTION[:400]
+            )
+            conn.commit()
+            current = migration.VERSION
+            logger.info(f"Migration {migration.VERSION} applied.")
+
+        if current == starting_version:
+            logger.info(f"Schema is up to date at version {current}.")
+        return starting_version, current
+    except oracledb.Error as e:
+        error_obj, = e.args
+        logger.error(f"Oracle DB error while applying migrations: {error_obj.message}", exc_info=True)
+        raise
+    except ConnectionError as e:
+        logger.error(f"Failed to get Oracle DB connection for migrations: {str(e)}", exc_info=True)
+        raise
+    finally:
+        if conn:
+            oracle_db_utils.release_oracle_connection(conn)
+
+
+def check_schema_version() -> Tuple[int, int]:
+    """Single round trip used at startup: returns (current_version, latest_version) and warns if behind."""
+    conn = None
+    try:
+        conn = oracle_db_utils.get_oracle_connection()
+        current = get_current_version(conn.cursor())
+    finally:
+        if conn:
+            oracle_db_utils.release_oracle_connection(conn)
+    latest = latest_version()
+    if current < latest:
+        logger.warning(f"Database schema is at version {current} but version {latest} is available. Run: python db_migrate.py")
+    else:
+        logger.info(f"Database schema version {current} is current.")
+    return current, latest
+
+
+if __name__ == "__main__":
+    # One-shot schema migration, run once per deployment (not by every uvicorn worker):
+    #   python db_migrate.py            apply pending migrations
+    #   python db_migrate.py --status   show current and latest version
+    setup_logging()
+    try:
+        if "--status" in sys.argv[1:]:
+            current, latest = check_schema_version()
+            print(f"current={current} latest={latest}")
+        else:
+            before, after = migrate()
+            print(f"Migrated schema from version {before} to {after}.")
+    finally:
+        oracle_db_utils.close_oracle_connection_pool()
@@ -0,0 +1,187 @@
+import gzip
+import logging
+import mmap
+import re
+import shutil
+import tempfile
+import zipfile
+from datetime import datetime
+from io import BytesIO
+from typing import BinaryIO, Iterable, Optional, Union
+
+import pandas as pd
+
+from config import Config
+from request_memory import WRITE_CHUNK_BYTES, SpilledCSV, SpilledFile, iter_chunks, write_spilled
+
+try:
+    import zstandard
+except ImportError:  # "csv.zst" exports are unavailable
+    zstandard = None
+
+logger = logging.getLogger("export_formats")
+
+XLSX_MIMETYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+# Download formats offered for full results: format -> (file extension, mimetype, link label).
+# The CSV formats are the BIP report bytes as returned (optionally compressed); only xlsx needs pandas.
+EXPORT_FORMATS = {
+    "xlsx": ("xlsx", XLSX_MIMETYPE, "Excel file"),
+    "csv": ("csv", "text/csv", "CSV file"),
+    "csv.gz": ("csv.gz", "application/gzip", "CSV file (gzip)"),
+    "csv.zst": ("csv.zst", "application/zstd", "CSV file (zstd)"),
+}
+CSV_FORMATS = ("csv", "csv.gz", "csv.zst")
+_FORMAT_ALIASES = {"excel": "xlsx", "gz": "csv.gz", "gzip": "csv.gz", "zst": "csv.zst", "zstd": "csv.zst"}
+
+# openpyxl stamps the zip entries and docProps/core.xml with the current time, so two exports of the
+# same data never matched byte for byte. Fixing both lets the content-addressed attachment store
+# deduplicate repeated downloads.
+_XLSX_ZIP_TIMESTAMP = (1980, 1, 1, 0, 0, 0)
+_XLSX_CORE_TIMESTAMP_RE = re.compile(rb"(<dcterms:(?:created|modified)[^>]*>)[^<]*(</dcterms:)")
+
+
+def normalize_export_format(value: Optional[str]) -> Optional[str]:
+    """Maps user input ("CSV", ".csv.gz", "zstd", "excel") to a key of EXPORT_FORMATS; None if unknown or unavailable."""
+    if not value:
+        return None
+    export_format = str(value).strip().lower().lstrip(".")
+    export_format = _FORMAT_ALIASES.get(export_format, export_format)
+    if export_format not in EXPORT_FORMATS:
+        return None
+    if export_format == "csv.zst" and zstandard is None:
+        logger.warning("csv.zst export requested but the zstandard package is not installed")
+        return None
+    return export_format
+
+
+def format_from_filename(filename: str) -> Optional[str]:
+    """Export format of a stored attachment, from its file extension."""
+    lowered = filename.lower()
+    # Longest extensions first so "x.csv.gz" is not taken for plain csv
+    for export_format, (extension, _, _) in sorted(EXPORT_FORMATS.items(), key=lambda item: -len(item[1][0])):
+        if lowered.endswith("." + extension):
+            return export_format
+    return None
+
+
+def export_filename(export_format: str, stem: Optional[str] = None) -> str:
+    stem = stem or f"Data_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+    return f"{stem}.{EXPORT_FORMATS[export_format][0]}"
+
+
+def export_mimetype(export_format: str) -> str:
+    return EXPORT_FORMATS[export_format][1]
+
+
+def export_label(export_format: str) -> str:
+    return EXPORT_FORMATS.get(export_format, EXPORT_FORMATS["xlsx"])[2]
+
+
+def write_csv(csv_bytes: Union[bytes, mmap.mmap], export_format: str, target: BinaryIO) -> None:
+    """
+    Writes the CSV in export_format ("csv", "csv.gz" or "csv.zst") to target, in chunks, so a
+    memory-mapped result is compressed without being copied into memory first.
+    """
+    if export_format == "csv":
+        writer = target
+    elif export_format == "csv.gz":
+        # mtime=0 and no file name keep the output identical for identical data (attachments are deduplicated by hash)
+        writer = gzip.GzipFile(filename="", mode="wb", compresslevel=Config.EXPORT_GZIP_LEVEL, fileobj=target, mtime=0)
+    elif export_format == "csv.zst":
+        writer = zstandard.ZstdCompressor(level=Config.EXPORT_ZSTD_LEVEL).stream_writer(target, size=len(csv_bytes), closefd=False)
+    else:
+        raise ValueError(f"Not a CSV export format: {export_format}")
+    for chunk in iter_chunks(csv_bytes):
+        writer.write(chunk)
+    if writer is not target:
+        writer.close()
+
+
+def encode_csv(csv_bytes: bytes, export_format: str) -> bytes:
+    """The CSV as stored and downloaded in export_format ("csv", "csv.gz" or "csv.zst")."""
+    if export_format == "csv":
+        return csv_bytes
+    output = BytesIO()
+    write_csv(csv_bytes, export_format, output)
+    return output.getvalue()
+
+
+def decode_csv(content: bytes, export_format: str) -> bytes:
+    if export_format == "csv":
+        return content
+    if export_format == "csv.gz":
+        return gzip.decompress(content)
+    if export_format == "csv.zst":
+        if zstandard is None:
+            raise RuntimeError("Reading a csv.zst export requires the zstandard package")
+        return zstandard.ZstdDecompressor().decompressobj().decompress(content)
+    raise ValueError(f"Not a CSV export format: {export_format}")
+
+
+def reproducible_xlsx(source: BinaryIO, target: BinaryIO) -> None:
+    """Copies the workbook in source to target with fixed timestamps, member by member without reading a member whole."""
+    with zipfile.ZipFile(source) as workbook, zipfile.ZipFile(target, "w", zipfile.ZIP_DEFLATED) as output:
+        for info in workbook.infolist():
+            member = zipfile.ZipInfo(info.filename, date_time=_XLSX_ZIP_TIMESTAMP)
+            member.compress_type = zipfile.ZIP_DEFLATED
+            member.file_size = info.file_size  # lets zipfile decide on ZIP64 up front
+            if info.filename == "docProps/core.xml":
+                content = _XLSX_CORE_TIMESTAMP_RE.sub(rb"\g<1>2000-01-01T00:00:00Z\g<2>", workbook.read(info.filename))
+                output.writestr(member, content)
+                continue
+            with workbook.open(info) as member_source, output.open(member, "w") as member_target:
+                shutil.copyfileobj(member_source, member_target, WRITE_CHUNK_BYTES)
+
+
+def dataframe_to_xlsx(df: pd.DataFrame) -> bytes:
+    workbook = BytesIO()
+    with pd.ExcelWriter(workbook, engine="openpyxl") as writer:
+        df.to_excel(writer, index=False)
+    workbook.seek(0)
+    output = BytesIO()
+    reproducible_xlsx(workbook, output)
+    return output.getvalue()
+
+
+def frames_to_xlsx(frames: Iterable[pd.DataFrame], target: BinaryIO) -> None:
+    """
+    Workbook written chunk by chunk in openpyxl's write-only mode, for results read from disk in
+    pieces. openpyxl's own output goes to a temp file first and is then copied to target.
+    """
+    from openpyxl import Workbook
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Sheet1")
+    header_written = False
+    for frame in frames:
+        if not header_written:
+            sheet.append([str(col) for col in frame.columns])
+            header_written = True
+        for row in frame.astype(object).where(frame.notna(), None).itertuples(index=False, name=None):
+            sheet.append(row)
+    with tempfile.TemporaryFile(dir=Config.REQUEST_SPILL_DIR or None) as unstamped:
+        workbook.save(unstamped)
+        unstamped.seek(0)
+        reproducible_xlsx(unstamped, target)
+
+
+def export_spilled(spilled: SpilledCSV, export_format: str) -> SpilledFile:
+    """
+    The export of a spilled result as a new temp file in REQUEST_SPILL_DIR: CSV formats are compressed
+    straight from the memory-mapped report, xlsx is written chunk by chunk. The caller closes it.
+    """
+    suffix = "." + EXPORT_FORMATS[export_format][0]
+    if export_format in CSV_FORMATS:
+        return write_spilled(suffix, lambda target: write_csv(spilled.buffer, export_format, target))
+    return write_spilled(suffix, lambda target: frames_to_xlsx(spilled.iter_frames(), target))
+
+
+def convert_export(content: bytes, source_format: str, target_format: str) -> bytes:
+    """Re-encodes a stored export for download. Within the CSV formats this is (de)compression only."""
+    if source_format == target_format:
+        return content
+    if source_format in CSV_FORMATS and target_format in CSV_FORMATS:
+        return encode_csv(decode_csv(content, source_format), target_format)
+    if target_format == "xlsx":
+        return dataframe_to_xlsx(pd.read_csv(BytesIO(decode_csv(content, source_format))))
+    return encode_csv(pd.read_excel(BytesIO(content)).to_csv(index=False).encode("utf-8"), target_format)
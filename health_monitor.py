@@ -0,0 +1,154 @@
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+import oracle_db_utils
+
+logger = logging.getLogger("health_monitor")
+
+# Upstream statuses that mean the service itself is down, as opposed to rejecting our unauthenticated probe
+_UNAVAILABLE_STATUSES = (502, 503, 504)
+
+
+def check_database(timeout: float) -> Dict[str, Any]:
+    conn = oracle_db_utils.get_oracle_connection()
+    try:
+        conn.call_timeout = int(timeout * 1000)
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM DUAL")
+        cursor.fetchone()
+    finally:
+        conn.call_timeout = 0
+        oracle_db_utils.release_oracle_connection(conn)
+    return {"pool": {key: value for key, value in oracle_db_utils.get_pool_stats().items() if key in ("open", "busy", "max")}}
+
+
+def check_bip(timeout: float) -> Dict[str, Any]:
+    """Every routed BIP endpoint must answer; the detail lists each endpoint's HTTP status or error."""
+    from bip_routing import get_bip_router
+    endpoints, failures = {}, []
+    for endpoint in get_bip_router().all():
+        try:
+            response = endpoint.session.get(endpoint.url, timeout=timeout)
+            response.close()
+            if response.status_code in _UNAVAILABLE_STATUSES:
+                raise ConnectionError(f"answered HTTP {response.status_code}")
+            endpoints[endpoint.name] = response.status_code
+        except Exception as e:
+            endpoints[endpoint.name] = str(e)
+            failures.append(f"BIP endpoint '{endpoint.name}': {e}")
+    if failures:
+        raise ConnectionError("; ".join(failures))
+    return {"endpoints": endpoints}
+
+
+def check_llm(timeout: float) -> Dict[str, Any]:
+    from llm_utils import get_http_client
+    response = get_http_client().get(Config.AZURE_OPENAI_ENDPOINT, timeout=timeout)
+    if response.status_code in _UNAVAILABLE_STATUSES:
+        raise ConnectionError(f"Azure OpenAI endpoint answered HTTP {response.status_code}")
+    return {"http_status": response.status_code}
+
+
+class HealthMonitor:
+    """
+    Checks the reachability of the database, BIP and the LLM every `interval` seconds on a background
+    thread and keeps the latest results, so liveness/readiness probes read a dict instead of taking
+    a pool connection or making network calls. Results older than three intervals count as failed
+    (the monitor itself has stalled).
+    """
+
+    def __init__(self, interval: float = 15, timeout: float = 5, checks: Optional[List[str]] = None,
+                 required: Optional[List[str]] = None):
+        self.interval = interval
+        self.timeout = timeout
+        self.checks = checks if checks is not None else ["database", "bip", "llm"]
+        self.required = required if required is not None else ["database"]
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self._probes: Dict[str, Callable[[float], Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _configure(self, uses_oracle: bool) -> None:
+        available = {"database": check_database, "bip": check_bip, "llm": check_llm}
+        self._probes = {name: available[name] for name in self.checks if name in available}
+        # Checks of services this deployment does not use are reported as skipped, and pass
+        skipped = {"database": not uses_oracle, "llm": not Config.AZURE_OPENAI_ENDPOINT}
+        for name in list(self._probes):
+            if skipped.get(name):
+                del self._probes[name]
+                self.results[name] = {"ok": True, "status": "skipped", "checked_at": None}
+
+    def run_once(self) -> Dict[str, Dict[str, Any]]:
+        for name, probe in self._probes.items():
+            started = time.monotonic()
+            result: Dict[str, Any] = {}
+            try:
+                result.update(probe(self.timeout))
+                result.update({"ok": True, "status": "up"})
+            except Exception as e:
+                result.update({"ok": False, "status": "down", "error": str(e)})
+            result["latency_ms"] = round((time.monotonic() - started) * 1000, 1)
+            result["checked_at"] = time.time()
+            with self._lock:
+                previous = self.results.get(name)
+                self.results[name] = result
+            if previous is None or previous.get("ok") != result["ok"]:
+                log = logger.info if result["ok"] else logger.error
+                log(f"Health check '{name}' is {result['status']}{': ' + result['error'] if not result['ok'] else ''}")
+        return self.snapshot()
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        stale_after = time.time() - 3 * self.interval
+        with self._lock:
+            snapshot = {name: dict(result) for name, result in self.results.items()}
+        for name in self._probes:
+            result = snapshot.setdefault(name, {"ok": False, "status": "pending", "checked_at": None})
+            if result.get("checked_at") is not None and result["checked_at"] < stale_after:
+                result.update({"ok": False, "status": "stale"})
+        return snapshot
+
+    def healthy(self, snapshot: Optional[Dict[str, Dict[str, Any]]] = None) -> bool:
+        """True when every required check passed at its last run."""
+        snapshot = snapshot if snapshot is not None else self.snapshot()
+        return all(snapshot.get(name, {"ok": True})["ok"] for name in self.required)
+
+    def _loop(self) -> None:
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Health monitor pass failed: {str(e)}", exc_info=True)
+            if self._stop.wait(self.interval):
+                break
+
+    def start(self, uses_oracle: bool = True) -> None:
+        if self._thread is not None:
+            return
+        self._configure(uses_oracle)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="health-monitor", daemon=True)
+        self._thread.start()
+        logger.info(f"Health monitor started: checks {list(self._probes) or 'none'}, every {self.interval}s, readiness requires {self.required}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 5)
+            self._thread = None
+            logger.info("Health monitor stopped")
+
+
+def _names(spec: str) -> List[str]:
+    return [name.strip().lower() for name in spec.split(",") if name.strip()]
+
+
+health_monitor = HealthMonitor(
+    interval=Config.HEALTH_CHECK_INTERVAL_SECONDS,
+    timeout=Config.HEALTH_CHECK_TIMEOUT_SECONDS,
+    checks=_names(Config.HEALTH_CHECKS),
+    required=_names(Config.HEALTH_READY_REQUIRES),
+)
@@ -0,0 +1,145 @@
+import logging
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from typing import Optional
+
+import pandas as pd
+
+from config import Config
+from bip_routing import BIPEndpoint
+from export_formats import CSV_FORMATS, dataframe_to_xlsx, encode_csv, export_filename, export_label, export_mimetype
+from request_memory import MemoryBudget, SpilledCSV, SpilledFile, frame_bytes, record_stage
+from result_cache import result_cache
+from jobs.job_store import (
+    get_job_store, JOB_STATUS_QUEUED, JOB_STATUS_RUNNING, JOB_STATUS_COMPLETED, JOB_STATUS_FAILED
+)
+
+logger = logging.getLogger("export_jobs")
+
+DOWNLOAD_LINK_PLACEHOLDER = "[DOWNLOAD_LINK_PLACEHOLDER]"
+
+
+class ExportJobManager:
+    """
+    Runs full-result exports for large queries outside the HTTP request. Jobs execute on a
+    dedicated worker pool (separate from the threads serving requests); their state lives in
+    the configured JobStore so any worker can answer /jobs/{id}.
+    """
+
+    def __init__(self, max_workers: int):
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export-job")
+                logger.info(f"Export job pool started with {self.max_workers} worker(s)")
+            return self._executor
+
+    def submit(self, agent, query: str, message_id: int, message_content: str, thread_id: str, agent_stream: str, total_rows: int,
+               export_format: str = "xlsx", result_id: Optional[str] = None, bip_endpoint: Optional[BIPEndpoint] = None,
+               job_id: Optional[str] = None) -> str:
+        """
+        Registers a job and queues it; returns the job ID immediately. The fetched rows also fill in result_id of
+        the result cache. The report runs on bip_endpoint (the pod that answered the question; default: the default one).
+        job_id may be chosen by the caller, so the message can point at the job before the job can update it.
+        """
+        job_id = job_id or uuid.uuid4().hex
+        get_job_store().create_job({
+            "job_id": job_id,
+            "status": JOB_STATUS_QUEUED,
+            "progress": 0,
+            "stage": "Queued",
+            "thread_id": thread_id,
+            "message_id": message_id,
+            "agent_stream": agent_stream,
+            "total_rows": total_rows,
+            "query_text": query,
+        })
+        self._get_executor().submit(self._run_job, job_id, agent, query, message_id, message_content, total_rows, export_format, result_id, bip_endpoint)
+        logger.info(f"Submitted {export_format} export job {job_id} for MESSAGE_ID {message_id} ({total_rows} rows)")
+        return job_id
+
+    def _run_job(self, job_id: str, agent, query: str, message_id: int, message_content: str, total_rows: int,
+                 export_format: str = "xlsx", result_id: Optional[str] = None, bip_endpoint: Optional[BIPEndpoint] = None) -> None:
+        store = get_job_store()
+        spilled = None
+        file_content = None
+        try:
+            store.update_job(job_id, status=JOB_STATUS_RUNNING, progress=10, stage="Running report")
+            budget = MemoryBudget(Config.REQUEST_MEMORY_BUDGET_MB * 1024 * 1024, f"export job {job_id}") if Config.REQUEST_MEMORY_BUDGET_MB > 0 else None
+            report = agent.oracle_bip_tool.execute_query_spillable(query, budget=budget, endpoint=bip_endpoint)
+
+            if isinstance(report, SpilledCSV):
+                # Compressed from the memory-mapped file, or written to the workbook chunk by chunk, into a temp file
+                spilled = report
+                store.update_job(job_id, progress=60, stage="Building workbook" if export_format not in CSV_FORMATS else "Compressing file")
+                file_content = agent._build_attachment(export_format, spilled=spilled)["content"]
+                row_count = total_rows
+            elif export_format in CSV_FORMATS:
+                # The report bytes go to storage unchanged (or compressed); the row count comes from the preview
+                store.update_job(job_id, progress=60, stage="Compressing file" if export_format != "csv" else "Preparing file")
+                file_content = encode_csv(report, export_format)
+                row_count = total_rows
+            else:
+                store.update_job(job_id, progress=60, stage="Building workbook")
+                df = pd.read_csv(BytesIO(report))
+                record_stage(budget, "parse", frame_bytes(df))
+                file_content = dataframe_to_xlsx(df)
+                row_count = len(df)
+                del df
+            if not isinstance(file_content, SpilledFile):
+                record_stage(budget, "export", len(file_content))
+            if result_id:
+                if spilled is not None:
+                    result_cache.put_spilled(result_id, spilled)
+                else:
+                    result_cache.put(result_id, report.decode("utf-8"))
+            filename = export_filename(export_format)
+
+            store.update_job(job_id, progress=90, stage="Saving attachment")
+            attachment_id = agent.chat_store.save_attachment(
+                message_id=message_id,
+                filename=filename,
+                mimetype=export_mimetype(export_format),
+                file_content=file_content
+            )
+            if not attachment_id:
+                raise RuntimeError("The export file could not be saved to the database.")
+
+            download_link = agent._get_download_link(attachment_id)
+            final_link = f"[Download the full {export_label(export_format)} ({row_count} records)]({download_link})"
+            agent.chat_store.update_message_content(message_id, message_content.replace(DOWNLOAD_LINK_PLACEHOLDER, final_link))
+            store.update_job(
+                job_id, status=JOB_STATUS_COMPLETED, progress=100, stage="Completed",
+                attachment_id=attachment_id, download_url=download_link, total_rows=row_count
+            )
+            logger.info(f"Export job {job_id} completed with ATTACHMENT_ID {attachment_id}")
+        except Exception as e:
+            logger.error(f"Export job {job_id} failed: {str(e)}", exc_info=True)
+            if result_id:
+                result_cache.discard(result_id)
+            agent.chat_store.update_message_content(
+                message_id,
+                message_content.replace(DOWNLOAD_LINK_PLACEHOLDER, "(Download is currently unavailable due to a system error.)")
+            )
+            store.update_job(job_id, status=JOB_STATUS_FAILED, stage="Failed", error_message=str(e)[:4000])
+        finally:
+            if spilled is not None:
+                spilled.close()
+            if isinstance(file_content, SpilledFile):
+                file_content.close()
+
+    def shutdown(self, wait: bool = False) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+                logger.info("Export job pool shut down")
+
+
+export_job_manager = ExportJobManager(Config.EXPORT_JOB_WORKERS)
@@ -0,0 +1,166 @@
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+from config import Config
+
+# Import Oracle DB utilities and oracledb for error handling
+import oracle_db_utils
+import oracledb
+
+logger = logging.getLogger("job_store")
+
+# Columns persisted for every export job, in table order.
+JOB_FIELDS = [
+    "job_id", "status", "progress", "stage", "thread_id", "message_id", "agent_stream",
+    "total_rows", "query_text", "attachment_id", "download_url", "error_message",
+    "created_at", "updated_at",
+]
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_COMPLETED = "completed"
+JOB_STATUS_FAILED = "failed"
+
+
+class JobStore(ABC):
+    """Interface for export job state. Implementations must be safe to call from worker threads."""
+
+    @abstractmethod
+    def create_job(self, job: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        raise NotImplementedError
+
+
+class OracleJobStore(JobStore):
+    """Stores jobs in the CHATBOT_EXPORT_JOBS table so every worker process sees the same state."""
+
+    def create_job(self, job: Dict[str, Any]) -> None:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            fields = [f for f in JOB_FIELDS if f not in ("created_at", "updated_at")]
+            sql = f"""
+                INSERT INTO CHATBOT_EXPORT_JOBS ({", ".join(f.upper() for f in fields)}, CREATED_AT, UPDATED_AT)
+                VALUES ({", ".join(":" + f for f in fields)}, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+            """
+            cursor.execute(sql, {f: job.get(f) for f in fields})
+            conn.commit()
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error creating export job {job.get('job_id')}: {error_obj.message}", exc_info=True)
+            raise
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            assignments = ", ".join(f"{f.upper()} = :{f}" for f in fields)
+            sql = f"UPDATE CHATBOT_EXPORT_JOBS SET {assignments}, UPDATED_AT = CURRENT_TIMESTAMP WHERE JOB_ID = :job_id"
+            cursor.execute(sql, dict(fields, job_id=job_id))
+            conn.commit()
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error updating export job {job_id}: {error_obj.message}", exc_info=True)
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {', '.join(f.upper() for f in JOB_FIELDS)} FROM CHATBOT_EXPORT_JOBS WHERE JOB_ID = :job_id", job_id=job_id)
+            row = cursor.fetchone()
+            if not row:
+                return None
+            job = dict(zip(JOB_FIELDS, row))
+            if hasattr(job["query_text"], "read"):
+                job["query_text"] = job["query_text"].read()
+            return job
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error fetching export job {job_id}: {error_obj.message}", exc_info=True)
+            return None
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+
+class SQLiteJobStore(JobStore):
+    """Local stand-in for development and load tests; job state lives in a single SQLite file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._execute(f"""
+            CREATE TABLE IF NOT EXISTS export_jobs (
+                job_id TEXT PRIMARY KEY,
+                {", ".join(f + " TEXT" for f in JOB_FIELDS if f != "job_id")}
+            )
+        """)
+        logger.info(f"SQLiteJobStore initialized at {path}")
+
+    def _execute(self, sql: str, params: Any = ()) -> Optional[sqlite3.Row]:
+        with self._lock, closing(sqlite3.connect(self.path, timeout=30)) as conn:
+            conn.row_factory = sqlite3.Row
+            with conn:
+                return conn.execute(sql, params).fetchone()
+
+    def create_job(self, job: Dict[str, Any]) -> None:
+        now = datetime.utcnow().isoformat()
+        record = {f: job.get(f) for f in JOB_FIELDS}
+        record.update(created_at=now, updated_at=now)
+        self._execute(
+            f"INSERT INTO export_jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join(':' + f for f in JOB_FIELDS)})",
+            record
+        )
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        fields["updated_at"] = datetime.utcnow().isoformat()
+        assignments = ", ".join(f"{f} = :{f}" for f in fields)
+        self._execute(f"UPDATE export_jobs SET {assignments} WHERE job_id = :job_id", dict(fields, job_id=job_id))
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._execute("SELECT * FROM export_jobs WHERE job_id = ?", (job_id,))
+        if not row:
+            return None
+        job = dict(row)
+        for numeric in ("progress", "message_id", "total_rows", "attachment_id"):
+            if job.get(numeric) is not None:
+                job[numeric] = int(job[numeric])
+        return job
+
+
+_job_store: Optional[JobStore] = None
+_job_store_lock = threading.Lock()
+
+
+def get_job_store() -> JobStore:
+    """Returns the configured job store (JOB_STORE_BACKEND = "oracle" or "sqlite"), creating it on first use."""
+    global _job_store
+    with _job_store_lock:
+        if _job_store is None:
+            if Config.JOB_STORE_BACKEND == "sqlite":
+                _job_store = SQLiteJobStore(Config.JOB_STORE_SQLITE_PATH)
+            else:
+                _job_store = OracleJobStore()
+            logger.info(f"Using {_job_store.__class__.__name__} for export jobs")
+        return _job_store
@@ -0,0 +1,211 @@
+import argparse
+import gzip
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+from config import Config
+from storage.chat_store import get_chat_store
+
+try:
+    import zstandard
+except ImportError:  # archives are written with gzip instead
+    zstandard = None
+
+logger = logging.getLogger("retention")
+
+# Oracle accepts at most 1000 expressions in an IN list
+MAX_BATCH_SIZE = 1000
+
+
+def parse_stream_ages(spec: str) -> Dict[str, float]:
+    """Parses RETENTION_STREAM_MAX_AGE_DAYS: "hcm=30,scm=180" -> {"hcm": 30.0, "scm": 180.0}."""
+    ages = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        stream, _, days = item.partition("=")
+        try:
+            ages[stream.strip().lower()] = float(days)
+        except ValueError:
+            logger.warning(f"Ignoring invalid RETENTION_STREAM_MAX_AGE_DAYS entry: {item!r}")
+    return ages
+
+
+class RetentionPolicy:
+    """What to purge: history older than max_age_days (per-stream overrides) and beyond max_messages_per_thread."""
+
+    def __init__(self, max_age_days: float = 0, stream_max_age_days: Optional[Dict[str, float]] = None,
+                 max_messages_per_thread: int = 0):
+        self.max_age_days = max_age_days
+        self.stream_max_age_days = stream_max_age_days or {}
+        self.max_messages_per_thread = max_messages_per_thread
+
+    @classmethod
+    def from_config(cls) -> "RetentionPolicy":
+        return cls(
+            max_age_days=Config.RETENTION_MAX_AGE_DAYS,
+            stream_max_age_days=parse_stream_ages(Config.RETENTION_STREAM_MAX_AGE_DAYS),
+            max_messages_per_thread=Config.RETENTION_MAX_MESSAGES_PER_THREAD,
+        )
+
+    def __repr__(self) -> str:
+        return (f"RetentionPolicy(max_age_days={self.max_age_days}, stream_max_age_days={self.stream_max_age_days}, "
+                f"max_messages_per_thread={self.max_messages_per_thread})")
+
+
+class _ArchiveWriter:
+    """NDJSON archive of purged rows (zstd, or gzip when zstandard is missing), opened on first write."""
+
+    def __init__(self, directory: str):
+        extension = "ndjson.zst" if zstandard is not None else "ndjson.gz"
+        self.path = os.path.join(directory, f"chat-archive-{datetime.now().strftime('%Y%m%dT%H%M%S')}.{extension}")
+        self.records = 0
+        self._stream = None
+
+    def write(self, records: List[Dict[str, Any]]) -> None:
+        if self._stream is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            if zstandard is not None:
+                self._stream = zstandard.ZstdCompressor(level=Config.STORE_COMPRESSION_LEVEL).stream_writer(open(self.path, "wb"))
+            else:
+                self._stream = gzip.open(self.path, "wb")
+        for record in records:
+            self._stream.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._stream.flush()
+        self.records += len(records)
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
+
+class RetentionPurger:
+    """
+    Applies a RetentionPolicy to the chat store in batches of `batch_size` messages, each deleted
+    in its own short transaction, optionally archiving every batch first. start() runs it every
+    `interval` seconds on a background thread; run_once() runs one pass and returns its report.
+    """
+
+    def __init__(self, policy: RetentionPolicy, batch_size: int = 500, interval: float = 3600,
+                 archive_dir: str = "", batch_pause: float = 0.1):
+        self.policy = policy
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.interval = interval
+        self.archive_dir = archive_dir
+        self.batch_pause = batch_pause
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._run_lock = threading.Lock()
+
+    def _purge(self, rule: str, find_ids: Callable[[int], List[int]], report: Dict[str, Any], archive) -> None:
+        store = get_chat_store()
+        while not self._stop.is_set():
+            message_ids = find_ids(self.batch_size)
+            if not message_ids:
+                return
+            if archive is not None:
+                archive.write(store.export_messages(message_ids))
+            messages, attachments, reclaimed = store.delete_messages(message_ids)
+            report["messages_deleted"] += messages
+            report["attachments_deleted"] += attachments
+            report["bytes_reclaimed"] += reclaimed
+            report["batches"] += 1
+            report["rules"][rule] = report["rules"].get(rule, 0) + messages
+            if messages == 0:
+                # The delete failed (already logged); stop instead of retrying the same batch forever
+                logger.warning(f"Retention rule {rule} deleted nothing from a batch of {len(message_ids)}; stopping this pass.")
+                return
+            if len(message_ids) < self.batch_size:
+                return
+            time.sleep(self.batch_pause)
+
+    def run_once(self) -> Dict[str, Any]:
+        """One purge pass over every rule of the policy; returns (and keeps as last_report) what was reclaimed."""
+        with self._run_lock:
+            store = get_chat_store()
+            policy = self.policy
+            started = time.monotonic()
+            report: Dict[str, Any] = {
+                "started_at": datetime.now().isoformat(timespec="seconds"),
+                "messages_deleted": 0, "attachments_deleted": 0, "bytes_reclaimed": 0, "batches": 0,
+                "blobs_deleted": 0, "blob_bytes_reclaimed": 0, "rules": {}, "archive_path": None, "error": None,
+            }
+            archive = _ArchiveWriter(self.archive_dir) if self.archive_dir else None
+            try:
+                for stream, days in policy.stream_max_age_days.items():
+                    if days > 0:
+                        self._purge(f"{stream}:age>{days:g}d", lambda limit, s=stream, d=days: store.expired_message_ids(d, limit, agent_stream=s), report, archive)
+                if policy.max_age_days > 0:
+                    overridden = list(policy.stream_max_age_days)
+                    self._purge(f"age>{policy.max_age_days:g}d", lambda limit: store.expired_message_ids(policy.max_age_days, limit, exclude_streams=overridden), report, archive)
+                if policy.max_messages_per_thread > 0:
+                    self._purge(f"thread>{policy.max_messages_per_thread}", lambda limit: store.excess_message_ids(policy.max_messages_per_thread, limit), report, archive)
+                report["blobs_deleted"], report["blob_bytes_reclaimed"] = store.purge_unreferenced_blobs()
+            except Exception as e:
+                logger.error(f"Retention purge failed: {str(e)}", exc_info=True)
+                report["error"] = str(e)
+            finally:
+                if archive is not None:
+                    archive.close()
+                    if archive.records:
+                        report["archive_path"] = archive.path
+            report["duration_seconds"] = round(time.monotonic() - started, 2)
+            logger.info(
+                f"Retention purge: {report['messages_deleted']} messages, {report['attachments_deleted']} attachments, "
+                f"{report['blobs_deleted']} blobs deleted; {report['bytes_reclaimed'] + report['blob_bytes_reclaimed']} bytes reclaimed "
+                f"in {report['batches']} batches ({report['duration_seconds']}s){', archived to ' + report['archive_path'] if report['archive_path'] else ''}"
+            )
+            self.last_report = report
+            return report
+
+    def _loop(self) -> None:
+        # The first pass waits a minute so it does not compete with startup and warm-up
+        wait = min(60.0, self.interval)
+        while not self._stop.wait(wait):
+            self.run_once()
+            wait = self.interval
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="retention-purger", daemon=True)
+        self._thread.start()
+        logger.info(f"Retention purger started: {self.policy}, every {self.interval}s, batches of {self.batch_size}")
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+            self._thread = None
+            logger.info("Retention purger stopped")
+
+
+retention_purger = RetentionPurger(
+    RetentionPolicy.from_config(),
+    batch_size=Config.RETENTION_BATCH_SIZE,
+    interval=Config.RETENTION_INTERVAL_SECONDS,
+    archive_dir=Config.RETENTION_ARCHIVE_DIR,
+)
+
+
+if __name__ == "__main__":
+    # One-shot purge, e.g. from cron instead of (or in addition to) the in-process purger:
+    #   python -m jobs.retention [--archive-dir DIR]
+    from logging_config import setup_logging
+    import oracle_db_utils
+
+    parser = argparse.ArgumentParser(description="Apply the configured retention policy once")
+    parser.add_argument("--archive-dir", default=Config.RETENTION_ARCHIVE_DIR)
+    args = parser.parse_args()
+    setup_logging()
+    retention_purger.archive_dir = args.archive_dir
+    try:
+        print(json.dumps(retention_purger.run_once(), indent=2))
+    finally:
+        oracle_db_utils.close_oracle_connection_pool()
@@ -0,0 +1,234 @@
+import logging
+import threading
+import time
+from typing import Dict, Any, Optional
+
+from config import Config
+from rate_limit import TokenBucket
+
+logger = logging.getLogger("llm_utils")
+
+try:
+    import tiktoken
+except ImportError:  # token estimates fall back to a characters-per-token heuristic
+    tiktoken = None
+
+_encoding = None
+_encoding_lock = threading.Lock()
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimates the prompt token count with tiktoken (cl100k_base, used by the gpt-35/gpt-4 families)."""
+    global _encoding
+    if tiktoken is not None:
+        with _encoding_lock:
+            if _encoding is None:
+                try:
+                    _encoding = tiktoken.get_encoding("cl100k_base")
+                except Exception as e:
+                    logger.warning(f"Could not load tiktoken encoding, using length heuristic: {str(e)}")
+                    _encoding = False
+        if _encoding:
+            return len(_encoding.encode(text, disallowed_special=()))
+    return max(1, len(text) // 4)
+
+
+def _prompt_text(prompt: Any) -> str:
+    if isinstance(prompt, str):
+        return prompt
+    if isinstance(prompt, list):
+        return "\n".join(str(getattr(m, "content", m)) for m in prompt)
+    return str(prompt)
+
+
+def _actual_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    if usage and usage.get("total_tokens"):
+        return int(usage["total_tokens"])
+    token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage") or {}
+    if token_usage.get("total_tokens"):
+        return int(token_usage["total_tokens"])
+    return None
+
+
+class RateLimitedLLM:
+    """
+    Wraps a chat model shared by every component that uses a deployment. Each invoke() first
+    reserves its estimated tokens (prompt + expected completion) and one request from the
+    deployment's TPM/RPM buckets, queueing until the quota has room instead of letting Azure
+    answer with 429s. The reservation is corrected once the real usage is reported.
+    """
+
+    def __init__(self, deployment: str, llm: Any, tokens_per_minute: int, requests_per_minute: int):
+        self.deployment = deployment
+        self.llm = llm
+        self.token_bucket = TokenBucket(tokens_per_minute, tokens_per_minute / 60.0)
+        self.request_bucket = TokenBucket(requests_per_minute, requests_per_minute / 60.0)
+        self._metrics_lock = threading.Lock()
+        self._metrics = {
+            "requests": 0,
+            "errors": 0,
+            "rate_limited": 0,
+            "queue_timeouts": 0,
+            "estimated_tokens": 0,
+            "actual_tokens": 0,
+            "total_queue_seconds": 0.0,
+            "max_queue_seconds": 0.0,
+        }
+
+    def _record(self, **increments: Any) -> None:
+        with self._metrics_lock:
+            for key, value in increments.items():
+                if key == "max_queue_seconds":
+                    self._metrics[key] = max(self._metrics[key], value)
+                else:
+                    self._metrics[key] += value
+
+    def invoke(self, prompt: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        """
+        Invokes the model once quota is available. `timeout` bounds the whole call (queueing plus
+        the HTTP request) and is normally derived from the request deadline.
+        """
+        estimated = estimate_tokens(_prompt_text(prompt)) + Config.LLM_COMPLETION_TOKEN_ESTIMATE
+        queue_timeout = Config.LLM_QUEUE_TIMEOUT_SECONDS if timeout is None else min(timeout, Config.LLM_QUEUE_TIMEOUT_SECONDS)
+        started = time.monotonic()
+        if not self.request_bucket.acquire(1, timeout=queue_timeout):
+            self._record(queue_timeouts=1)
+            raise TimeoutError(f"Timed out after {queue_timeout}s waiting for request quota on deployment {self.deployment}")
+        remaining = None if queue_timeout is None else max(0.0, queue_timeout - (time.monotonic() - started))
+        if not self.token_bucket.acquire(estimated, timeout=remaining):
+            self.request_bucket.adjust(1)
+            self._record(queue_timeouts=1)
+            raise TimeoutError(f"Timed out after {queue_timeout}s waiting for token quota on deployment {self.deployment}")
+        queued = time.monotonic() - started
+        if queued > 0.05:
+            logger.info(f"LLM request on {self.deployment} queued {queued:.2f}s for quota ({estimated} estimated tokens)")
+        self._record(requests=1, estimated_tokens=estimated, total_queue_seconds=queued, max_queue_seconds=queued)
+
+        if timeout is not None:
+            kwargs["timeout"] = max(0.1, timeout - queued)
+        try:
+            response = self.llm.invoke(prompt, **kwargs)
+        except Exception as e:
+            status_code = getattr(e, "status_code", None) or getattr(getattr(e, "response", None), "status_code", None)
+            if status_code == 429:
+                # Quota is tighter than configured (e.g. shared with another service): drain the bucket so queued callers back off.
+                self._record(rate_limited=1, errors=1)
+                self.token_bucket.adjust(-self.token_bucket.capacity)
+            else:
+                self._record(errors=1)
+            raise
+
+        actual = _actual_tokens(response)
+        if actual is not None:
+            self.token_bucket.adjust(estimated - actual)
+            self._record(actual_tokens=actual)
+        return response
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.llm, name)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            snapshot = dict(self._metrics)
+        tokens_available = self.token_bucket.available()
+        requests_available = self.request_bucket.available()
+        snapshot.update({
+            "deployment": self.deployment,
+            "tokens_per_minute": int(self.token_bucket.capacity),
+            "requests_per_minute": int(self.request_bucket.capacity),
+            "token_headroom": int(tokens_available),
+            "token_headroom_pct": round(100.0 * tokens_available / self.token_bucket.capacity, 1),
+            "request_headroom": int(requests_available),
+            "request_headroom_pct": round(100.0 * requests_available / self.request_bucket.capacity, 1),
+            "queued_now": self.token_bucket.waiting + self.request_bucket.waiting,
+        })
+        return snapshot
+
+
+_registry: Dict[str, RateLimitedLLM] = {}
+_registry_lock = threading.Lock()
+_http_client = None
+_http_client_lock = threading.Lock()
+
+
+def get_http_client():
+    """One keep-alive HTTP connection pool shared by every Azure OpenAI client (and probe) in the process."""
+    global _http_client
+    with _http_client_lock:
+        if _http_client is None:
+            import httpx
+            _http_client = httpx.Client(
+                limits=httpx.Limits(
+                    max_connections=Config.LLM_MAX_CONNECTIONS,
+                    max_keepalive_connections=Config.LLM_MAX_CONNECTIONS,
+                    keepalive_expiry=300,
+                ),
+                timeout=httpx.Timeout(Config.LLM_REQUEST_TIMEOUT_SECONDS, connect=10.0),
+            )
+        return _http_client
+
+
+def warm_llm_connections(count: int) -> int:
+    """
+    Opens up to `count` keep-alive connections from the shared HTTP client to the Azure OpenAI host
+    (concurrent unauthenticated GETs; any HTTP status means the TLS connection is up and pooled).
+    Returns how many got a response. No-op without AZURE_OPENAI_ENDPOINT.
+    """
+    if not Config.AZURE_OPENAI_ENDPOINT or count <= 0:
+        return 0
+    import httpx
+    from concurrent.futures import ThreadPoolExecutor
+    client = get_http_client()
+
+    def probe(_):
+        client.get(Config.AZURE_OPENAI_ENDPOINT)
+        return 1
+
+    opened = 0
+    with ThreadPoolExecutor(max_workers=count) as executor:
+        for future in [executor.submit(probe, i) for i in range(count)]:
+            try:
+                opened += future.result()
+            except httpx.HTTPError as e:
+                logger.warning(f"LLM connection warm-up request failed: {e}")
+    return opened
+
+
+def _create_chat_model(deployment: str):
+    from langchain_openai import AzureChatOpenAI
+    return AzureChatOpenAI(
+        azure_endpoint=Config.AZURE_OPENAI_ENDPOINT,
+        api_key=Config.AZURE_OPENAI_KEY,
+        api_version=Config.AZURE_OPENAI_API_VERSION,
+        deployment_name=deployment,
+        http_client=get_http_client(),
+    )
+
+
+def get_llm(deployment: Optional[str] = None) -> RateLimitedLLM:
+    """Returns the process-wide client for a deployment, creating it on first use."""
+    deployment = deployment or Config.AZURE_OPENAI_DEPLOYMENT
+    with _registry_lock:
+        if deployment not in _registry:
+            _registry[deployment] = RateLimitedLLM(
+                deployment,
+                _create_chat_model(deployment),
+                Config.AZURE_OPENAI_TPM,
+                Config.AZURE_OPENAI_RPM,
+            )
+            logger.info(f"Created shared LLM client for deployment {deployment} (TPM={Config.AZURE_OPENAI_TPM}, RPM={Config.AZURE_OPENAI_RPM})")
+        return _registry[deployment]
+
+
+def register_llm(deployment: str, llm: Any) -> RateLimitedLLM:
+    """Installs a pre-built chat model for a deployment (e.g. a scripted fake for load tests)."""
+    with _registry_lock:
+        _registry[deployment] = RateLimitedLLM(deployment, llm, Config.AZURE_OPENAI_TPM, Config.AZURE_OPENAI_RPM)
+        return _registry[deployment]
+
+
+def get_llm_metrics() -> Dict[str, Any]:
+    with _registry_lock:
+        clients = list(_registry.values())
+    return {client.deployment: client.metrics() for client in clients}
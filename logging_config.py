@@ -0,0 +1,134 @@
+import atexit
+import copy
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+from typing import Dict, List, Optional
+
+from config import Config
+
+LOG_FORMAT = "%(asctime)s:%(levelname)s:%(name)s:%(message)s"
+
+logger = logging.getLogger("logging_config")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def truncate(text: object, limit: Optional[int] = None) -> str:
+    """Shortens a payload (prompt, SQL, CSV, ...) for logging, noting how much was cut."""
+    text = str(text)
+    limit = Config.LOG_MAX_MESSAGE_CHARS if limit is None else limit
+    if limit <= 0 or len(text) <= limit:
+        return text
+    return f"{text[:limit]}... [{len(text) - limit} chars truncated]"
+
+
+def parse_level(name: str) -> Optional[int]:
+    """The numeric level for "DEBUG", "info", ...; None for a name logging does not know."""
+    level = logging.getLevelName((name or "").strip().upper())
+    return level if isinstance(level, int) else None
+
+
+def parse_levels(spec: str, invalid: Optional[List[str]] = None) -> Dict[str, int]:
+    """Parses "agent=DEBUG,query_tools=WARNING" into {"agent": 10, "query_tools": 30}; invalid entries are skipped (and added to `invalid`)."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in (spec or "").split(","))):
+        name, _, level_name = item.partition("=")
+        level = parse_level(level_name)
+        if name.strip() and level is not None:
+            levels[name.strip()] = level
+        elif invalid is not None:
+            invalid.append(item)
+    return levels
+
+
+class SizeAwareQueueHandler(logging.handlers.QueueHandler):
+    """
+    Hands records to the background listener. Messages longer than `max_chars` are truncated, and
+    large DEBUG records are additionally sampled (kept with probability `sample_rate`) so that full
+    prompts, SQL and CSV dumps cannot dominate the log volume. WARNING and above are never dropped.
+    """
+
+    def __init__(self, log_queue: queue.Queue, max_chars: int, sample_rate: float):
+        super().__init__(log_queue)
+        self.max_chars = max_chars
+        self.sample_rate = sample_rate
+        self.dropped = 0
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            message = record.getMessage()
+            if self.max_chars > 0 and len(message) > self.max_chars:
+                if record.levelno < logging.INFO and random.random() >= self.sample_rate:
+                    self.dropped += 1
+                    return
+                message = truncate(message, self.max_chars)
+            # The queue is in-process, so the record does not need to be made picklable: only the message
+            # is merged here and timestamp/traceback formatting is left to the listener thread.
+            prepared = copy.copy(record)
+            prepared.msg = message
+            prepared.args = None
+            self.enqueue(prepared)
+        except Exception:
+            self.handleError(record)
+
+
+def setup_logging(force: bool = False) -> None:
+    """
+    Configures logging once per process: the root logger gets a single queue handler and a
+    QueueListener thread does the file/console I/O, so request threads only pay for an enqueue.
+    Levels come from LOG_LEVEL and the per-logger overrides in LOG_LEVELS.
+    """
+    global _listener
+    with _setup_lock:
+        if _listener is not None and not force:
+            return
+        if _listener is not None:
+            _listener.stop()
+
+        formatter = logging.Formatter(LOG_FORMAT)
+        handlers = []
+        if Config.LOG_FILE:
+            file_handler = logging.handlers.RotatingFileHandler(
+                Config.LOG_FILE, maxBytes=Config.LOG_MAX_BYTES, backupCount=Config.LOG_BACKUP_COUNT
+            )
+            file_handler.setFormatter(formatter)
+            handlers.append(file_handler)
+        if Config.LOG_CONSOLE:
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(formatter)
+            handlers.append(console_handler)
+
+        log_queue: queue.Queue = queue.Queue(-1)
+        root = logging.getLogger()
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(SizeAwareQueueHandler(log_queue, Config.LOG_MAX_MESSAGE_CHARS, Config.LOG_LARGE_MESSAGE_SAMPLE_RATE))
+        root_level = parse_level(Config.LOG_LEVEL)
+        root.setLevel(root_level if root_level is not None else logging.INFO)
+        invalid: List[str] = []
+        for name, level in parse_levels(Config.LOG_LEVELS, invalid).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        _listener.start()
+        # A typo in a level must not keep the service from starting; it is reported once logging works
+        if root_level is None:
+            logger.warning(f"Invalid LOG_LEVEL {Config.LOG_LEVEL!r}; using INFO")
+        if invalid:
+            logger.warning(f"Ignoring invalid LOG_LEVELS entries: {invalid}")
+
+
+def shutdown_logging() -> None:
+    """Flushes queued records and stops the listener thread."""
+    global _listener
+    with _setup_lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+atexit.register(shutdown_logging)
@@ -1,32 +1,116 @@
 from fastapi import FastAPI, HTTPException, Request, Response #
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware #
-from pydantic import BaseModel #
-from agents.base_agent import SCMAgent, HCMAgent #
+from pydantic import BaseModel, Field #
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
+import asyncio
 import logging #
+import threading
+import time
 import json #
 import base64 #
 import requests #
 from datetime import datetime #
-from typing import Optional #
+from typing import Optional, Dict, List, Tuple #
 from config import Config #
 
 # Import Oracle DB utilities
 import oracle_db_utils #
+import db_migrate
+from llm_utils import get_llm_metrics
+from request_coalescing import SingleFlight, IdempotencyCache, IdempotencyConflict, request_fingerprint
 import oracledb # Import for error handling #
+from jobs.job_store import get_job_store
+from result_cache import result_cache, ResultPending
+from run_cache import RunCache
+from prewarm import prewarm_state, run_prewarm
+from health_monitor import health_monitor
+from admission import AdmissionRejected, get_admission_controller
+from storage.chat_store import get_chat_store
+from logging_config import setup_logging, shutdown_logging
+from export_formats import EXPORT_FORMATS, normalize_export_format, format_from_filename, convert_export, export_filename, export_mimetype
 
-# Configure logging with file output for debugging
-logging.basicConfig( #
-    level=logging.INFO, #
-    filename="chatbot.log", #
-    filemode="a", #
-    format="%(asctime)s:%(levelname)s:%(name)s:%(message)s" #
-)
+# Handlers and levels are configured centrally (logging_config.setup_logging, called at startup)
 logger = logging.getLogger("query_api") #
-console_handler = logging.StreamHandler() #
-console_handler.setLevel(logging.INFO) #
-logger.addHandler(console_handler) #
 
-app = FastAPI(title="Fusion Query Agent API") #
+# Agents are built on first use, not at import time: constructing them creates the LLM clients and
+# compiles the LangGraph workflows, which would otherwise be paid by every worker before it can serve.
+_agents: Dict[str, object] = {}
+_agents_lock = threading.Lock()
+
+def get_agent(agent_stream: str):
+    """Returns the agent for 'scm' or 'hcm', constructing it once per process on first request."""
+    agent = _agents.get(agent_stream)
+    if agent is not None:
+        return agent
+    with _agents_lock:
+        if agent_stream not in _agents:
+            # Imported here so that importing this module (and starting a worker) stays cheap.
+            from agents.base_agent import SCMAgent, HCMAgent
+            agent_classes = {"scm": SCMAgent, "hcm": HCMAgent}
+            if agent_stream not in agent_classes:
+                raise ValueError(f"Unknown agent stream: {agent_stream}")
+            logger.info(f"Initializing {agent_classes[agent_stream].__name__}")
+            _agents[agent_stream] = agent_classes[agent_stream]()
+        return _agents[agent_stream]
+
+# Concurrent identical questions (double-clicked send, dashboard refreshes) share one agent run, and
+# responses are remembered per caller and Idempotency-Key so a retried POST does not run and save everything twice.
+_query_flights = SingleFlight()
+# Keyed by the scoped Idempotency-Key: a retry arriving while the first attempt still runs waits for its result
+_idempotent_flights = SingleFlight()
+_idempotency_cache = IdempotencyCache(Config.IDEMPOTENCY_TTL_SECONDS, Config.IDEMPOTENCY_MAX_ENTRIES)
+# Agent runs of all /batch requests of this worker; created lazily so it binds to the serving event loop
+_batch_semaphore: Optional[asyncio.Semaphore] = None
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    setup_logging()
+    # Schema migration is a one-shot deployment step (python db_migrate.py). Workers only apply it when
+    # explicitly asked to, so "uvicorn --workers N" does not repeat the DDL N times; otherwise startup
+    # costs a single schema-version query.
+    # The migrations only manage the Oracle schema; a fully SQLite-backed deployment has nothing to check.
+    uses_oracle = "oracle" in (Config.CHAT_STORE_BACKEND, Config.JOB_STORE_BACKEND)
+    try:
+        if Config.RUN_MIGRATIONS_ON_STARTUP and uses_oracle:
+            await run_in_threadpool(db_migrate.migrate)
+        elif Config.SCHEMA_CHECK_ON_STARTUP and uses_oracle:
+            await run_in_threadpool(db_migrate.check_schema_version)
+    except Exception as e:
+        logger.error(f"Schema version check/migration failed at startup: {str(e)}", exc_info=True)
+        if Config.RUN_MIGRATIONS_ON_STARTUP:
+            raise
+    # Agents, contexts, pool sessions and keep-alive connections are set up now rather than by the first
+    # user requests after a deploy; /ready reports the worker ready once this has finished.
+    prewarm_task = None
+    if Config.PREWARM_ENABLED:
+        if Config.PREWARM_BLOCKING:
+            await run_in_threadpool(run_prewarm, get_agent, uses_oracle)
+        else:
+            prewarm_task = asyncio.ensure_future(run_in_threadpool(run_prewarm, get_agent, uses_oracle))
+    else:
+        prewarm_state.finish("disabled")
+    health_monitor.start(uses_oracle)
+    if Config.RETENTION_ENABLED:
+        from jobs.retention import retention_purger
+        retention_purger.start()
+    logger.info("Application startup complete.")
+    yield
+    logger.info("Shutting down application, closing Oracle connection pool.") #
+    if prewarm_task is not None and not prewarm_task.done():
+        logger.warning("Shutting down before the startup prewarm finished.")
+    if _agents:
+        from jobs.export_jobs import export_job_manager
+        export_job_manager.shutdown(wait=False)
+    if Config.RETENTION_ENABLED:
+        from jobs.retention import retention_purger
+        retention_purger.stop()
+    health_monitor.stop()
+    oracle_db_utils.close_oracle_connection_pool() #
+    shutdown_logging()
+
+app = FastAPI(title="Fusion Query Agent API", lifespan=lifespan) #
 
 # CORS middleware configuration
 app.add_middleware( #
@@ -40,492 +124,115 @@ app.add_middleware( #
     ],
     allow_credentials=True, #
     allow_methods=["GET", "POST", "OPTIONS"], #
-    allow_headers=["Content-Type", "Authorization", "Accept"], #
+    allow_headers=["Content-Type", "Authorization", "Accept", "Idempotency-Key"], #
     expose_headers=["*"], #
     max_age=600 #
 )
 
-logger.info("Initializing SCMAgent") #
-scm_agent = SCMAgent() #
-logger.info("Initializing HCMAgent") #
-hcm_agent = HCMAgent() #
-
-def initialize_query_contexts_db(): #
-    db_path = "query_contexts.db" # This is no longer used but keeping it for context of original file #
-    logger.info("Starting database initialization for Oracle query_contexts table") #
-    
-    conn = None #
-    try:
-        conn = oracle_db_utils.get_oracle_connection() #
-        cursor = conn.cursor() #
-        
-        logger.info("Creating QUERY_CONTEXTS table if not exists (Oracle)") #
-        try:
-            cursor.execute("""
-                CREATE TABLE QUERY_CONTEXTS (
-                    ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
-                    AGENT_TYPE VARCHAR2(50) NOT NULL,
-                    CONTEXT VARCHAR2(4000) NOT NULL,
-                    QUERY CLOB NOT NULL
-                )
-            """) #
-            logger.info("QUERY_CONTEXTS table created (Oracle).") #
-        except oracledb.Error as e:
-            error_obj, = e.args #
-            if error_obj.code == 955: # ORA-00955: name is already used by an existing object #
-                 logger.warning(f"Table QUERY_CONTEXTS already exists. Skipping creation. Error: {error_obj.message}") #
-            else:
-                raise # Re-raise other errors #
-
-
-        logger.info("Checking if QUERY_CONTEXTS table is empty (Oracle)") #
-        cursor.execute("SELECT COUNT(*) FROM QUERY_CONTEXTS") #
-        count = cursor.fetchone()[0] #
-        logger.debug(f"Found {count} rows in QUERY_CONTEXTS table (Oracle)") #
-        
-        if count == 0: #
-            logger.info("Table is empty, inserting initial queries into Oracle DB") #
-            
-            # SCM Inventory Query
-            scm_inventory_query = """
-            SELECT
-                esi.item_number                        AS "Item Number",
-                iop.organization_code                  AS "Organization Code",
-                ioqd.transaction_quantity              AS "Quantity Onhand",
-                ioqd.transaction_uom_code              AS "Primary UOM",
-                ioqd.secondary_transaction_quantity    AS "Secondary Quantity Onhand",
-                ioqd.secondary_uom_code                AS "Secondary UOM",
-                esi.description                        AS "Item Description",
-                ioqd.subinventory_code                 AS "Subinventory Code",
-                iil.segment1 || '.' || iil.segment2 || '.' || iil.segment3 AS Locator
-            FROM
-                egp_system_items esi,
-                inv_onhand_quantities_detail ioqd,
-                inv_org_parameters iop,
-                inv_item_locations iil
-            WHERE
-                esi.inventory_item_id = ioqd.inventory_item_id
-                AND esi.organization_id = ioqd.organization_id
-                AND esi.organization_id = iop.organization_id
-                AND ioqd.locator_id = iil.inventory_location_id(+)
-                AND ioqd.organization_id = iil.organization_id(+)
-                AND ioqd.subinventory_code = iil.subinventory_code(+)
-            """ #
-            cursor.execute( #
-                "INSERT INTO QUERY_CONTEXTS (AGENT_TYPE, CONTEXT, QUERY) VALUES (:agent_type, :context, :query)", #
-                agent_type="scm", #
-                context="Keywords: inventory, stock, quantity, item, subinventory, locator. Description: Retrieves item numbers, quantities on hand, and locations from inventory tables.", #
-                query=scm_inventory_query #
-            )
-            
-            # SCM Purchase Order Query
-            scm_po_query = """
-            WITH asn_data AS
-            (
-                SELECT
-                    rsl.po_line_location_id
-                    , rsh.shipment_header_id
-                    , rsh.shipment_num                                                                                                   asn
-                    , to_date(to_char(CAST(rsh.shipped_date AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY')                asn_date
-                    , nvl(rsl.quantity_shipped, 0)                                                                                       qty_inbound
-                FROM
-                    rcv_shipment_lines   rsl
-                    , rcv_shipment_headers rsh
-                WHERE
-                    rsl.shipment_header_id = rsh.shipment_header_id
-                    AND rsh.asn_type       = 'ASN'
-                    AND NOT EXISTS
-                    (
-                        SELECT
-                            1
-                        FROM
-                            rcv_transactions rt
-                        WHERE
-                            rt.shipment_line_id     = rsl.shipment_line_id
-                            AND rt.transaction_type = 'DELIVER'
-                    )
-            )
-            , po_co_data AS
-            (
-                SELECT
-                    pver1.po_header_id
-                    , (
-                        SELECT
-                            pu.username
-                        FROM
-                            per_users pu
-                        WHERE
-                            pver1.originator_id = pu.person_id
-                    ) order_last_changed_by
-                    , to_date(to_char(CAST(pver1.submitted_date AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY') date_changed
-                FROM
-                    po_versions pver1
-                WHERE
-                    pver1.change_order_status = 'PROCESSED'
-                    AND (pver1.co_canceled_flag IS NULL OR pver1.co_canceled_flag = 'N')
-                    AND pver1.co_num IS NOT NULL
-                    AND pver1.co_num = (
-                        SELECT MAX(pver.co_num)
-                        FROM po_versions pver
-                        WHERE
-                            pver.po_header_id = pver1.po_header_id
-                            AND pver.change_order_status = 'PROCESSED'
-                            AND (pver.co_canceled_flag IS NULL OR pver.co_canceled_flag = 'N')
-                            AND pver.co_num IS NOT NULL
-                    )
-            )
-            SELECT
-                po_data.*
-                , CASE
-                    WHEN matching_basis = 'QUANTITY' THEN nvl(local_cur_unit_price * qty_open, 0)
-                    ELSE nvl(local_cur_unit_price, 0)
-                END local_curr_amt_open
-                , CASE
-                    WHEN (lead_time IS NULL OR cur_promised_date IS NULL) THEN 'No Lead Time'
-                    WHEN (to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY') > (cur_promised_date - lead_time))
-                    AND asn IS NULL
-                    AND matching_basis = 'QUANTITY'
-                    THEN (to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY') - (cur_promised_date - lead_time)) || ' Days Late'
-                    ELSE NULL
-                END bol_status
-            FROM
-            (
-                SELECT
-                    po_detail.*
-                    , nvl(qty_ordered - qty_received, 0) qty_open
-                    , nvl((po_exchange_rate * po_unit_price), 0) local_cur_unit_price
-                    , nvl(qty_inbound * po_unit_price, 0) po_inbound_amt
-                    , CASE
-                        WHEN (cur_promised_date IS NULL OR prev_promised_date IS NULL) THEN NULL
-                        ELSE cur_promised_date - prev_promised_date
-                    END no_of_days_diff
-                FROM
-                (
-                    SELECT
-                        psv.segment1 vendor_number
-                        , psv.vendor_name
-                        , to_date(to_char(CAST(pha.creation_date AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY') po_date
-                        , pha.segment1 po_num
-                        , pla.line_num po_line_num
-                        , iodv.organization_code receiving_warehouse
-                        , pltv.line_type po_line_type
-                        , ecv.category_code product_class
-                        , ecv.category_name product_class_desc
-                        , nvl(esiv.item_number, REPLACE(REPLACE(pla.item_description, CHR(13), ' '), CHR(10), ' ')) item_code_or_desc
-                        , esiv.item_number ItemNumber
-                        , esiv.INVENTORY_ITEM_ID
-                        , plla.shipment_num po_schedule_no
-                        , pda.distribution_num po_dist_no
-                        , nvl(pha.rate, 1) po_exchange_rate
-                        , prha.requisition_number
-                        , pha.currency_code po_curr
-                        , fnd_flex_ext.get_segs('GL', 'GL#', gcc.chart_of_accounts_id, gcc.code_combination_id) po_charge_acct
-                        , CASE
-                            WHEN (SELECT COUNT(plla1.line_location_id) FROM po_line_locations_all plla1
-                                WHERE plla1.line_location_id = plla.line_location_id
-                                AND plla1.promised_date IS NULL AND plla1.need_by_date IS NULL) = 1 THEN NULL
-                            ELSE nvl(plla.promised_date, plla.need_by_date)
-                        END cur_promised_date
-                        , pu.username po_requisition_creator
-                        , flv.meaning po_line_location_status
-                        , pla.matching_basis
-                        , CASE
-                            WHEN pla.matching_basis = 'QUANTITY' THEN nvl(pda.quantity_ordered, 0)
-                            ELSE 0
-                        END qty_ordered
-                        , CASE
-                            WHEN pla.matching_basis = 'QUANTITY' THEN nvl(pda.quantity_delivered, 0)
-                            ELSE 0
-                        END qty_received
-                        , CASE
-                            WHEN pla.matching_basis = 'QUANTITY' THEN nvl(pla.unit_price, 0)
-                            ELSE nvl(pda.amount_ordered, 0)
-                        END po_unit_price
-                        , ad.asn
-                        , ad.asn_date
-                        , nvl(ad.qty_inbound, 0) qty_inbound
-                        , CASE
-                            WHEN (cur_promised_date IS NULL OR prev_promised_date IS NULL) THEN NULL
-                            WHEN (nvl(plla.promised_date, plla.need_by_date) - to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY')) >= 0
-                            THEN 'Due In ' || (nvl(plla.promised_date, plla.need_by_date) - to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY')) || ' Days'
-                            ELSE abs(nvl(plla.promised_date, plla.need_by_date) - to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY')) || ' Days Late'
-                        END order_status
-                        , CASE
-                            WHEN (SELECT COUNT(plla1.line_location_id) FROM po_line_locations_all plla1
-                                WHERE plla1.line_location_id = plla.line_location_id
-                                AND plla1.promised_date IS NULL AND plla1.need_by_date IS NULL) = 1 THEN NULL
-                            WHEN (SELECT COUNT(pllaa.line_location_id) FROM po_line_locations_archive_all pllaa
-                                WHERE pllaa.line_location_id = plla.line_location_id) = 0
-                            THEN (SELECT nvl(pllda.promised_date, pllda.need_by_date)
-                                FROM po_line_locations_draft_all pllda
-                                WHERE pllda.line_location_id = plla.line_location_id)
-                            WHEN (SELECT COUNT(pllaa.line_location_id) FROM po_line_locations_archive_all pllaa
-                                WHERE pllaa.line_location_id = plla.line_location_id) = 1
-                            THEN (SELECT nvl(pllaa.promised_date, pllaa.need_by_date)
-                                FROM po_line_locations_archive_all pllaa
-                                WHERE pllaa.line_location_id = plla.line_location_id)
-                            ELSE (
-                                SELECT a.prev_promised_date
-                                FROM (
-                                    SELECT
-                                        nvl(pllaa.promised_date, pllaa.need_by_date) prev_promised_date
-                                        , RANK() OVER(ORDER BY to_date(to_char(CAST(pllaa.last_update_date AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY HH24:MI:SS'), 'DD/MM/YYYY HH24:MI:SS') DESC) rnk
-                                    FROM po_line_locations_archive_all pllaa
-                                    WHERE pllaa.line_location_id = plla.line_location_id
-                                ) a
-                                WHERE a.rnk = 2
-                            )
-                        END prev_promised_date
-                        , pcd.order_last_changed_by
-                        , pcd.date_changed
-                        , pssv.attribute_number1 lead_time
-                        , CASE WHEN ad.asn IS NOT NULL THEN 'Yes' ELSE 'No' END asn_only
-                        , (SELECT hrl.country FROM inv_organization_definitions_v iodv1, hr_locations_all hrl
-                            WHERE iodv1.organization_id = plla.ship_to_organization_id AND iodv1.location_id = hrl.location_id) io_country
-                        , pssv.country sup_site_country
-                        , CASE
-                            WHEN (SELECT hrl.country FROM inv_organization_definitions_v iodv1, hr_locations_all hrl
-                                WHERE iodv1.organization_id = plla.ship_to_organization_id AND iodv1.location_id = hrl.location_id) = pssv.country THEN 'No'
-                            ELSE 'Yes'
-                        END overseas_supply
-                    FROM
-                        po_headers_all pha
-                        , poz_suppliers_v psv
-                        , po_lines_all pla
-                        , po_line_locations_all plla
-                        , fnd_lookup_values flv
-                        , inv_organization_definitions_v iodv
-                        , po_line_types_vl pltv
-                        , egp_system_items_vl esiv
-                        , egp_categories_vl ecv
-                        , po_distributions_all pda
-                        , por_req_distributions_all prda
-                        , por_requisition_lines_all prla
-                        , por_requisition_headers_all prha
-                        , gl_code_combinations gcc
-                        , per_users pu
-                        , asn_data ad
-                        , po_co_data pcd
-                        , poz_supplier_sites_v pssv
-                    WHERE
-                        pha.type_lookup_code = 'STANDARD'
-                        AND pha.vendor_id = psv.vendor_id
-                        AND pha.po_header_id = pla.po_header_id
-                        AND pla.po_line_id = plla.po_line_id
-                        AND plla.schedule_status = flv.lookup_code
-                        AND flv.lookup_type = 'ORDER_SCHEDULE_STATUS'
-                        AND flv.meaning = 'Open'
-                        AND flv.enabled_flag = 'Y'
-                        AND flv.language = userenv('LANG')
-                        AND nvl(trunc(flv.end_date_active), trunc(to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY'))) >= trunc(to_date(to_char(CAST(sysdate AS TIMESTAMP) AT TIME ZONE 'UTC', 'DD/MM/YYYY'), 'DD/MM/YYYY'))
-                        AND plla.ship_to_organization_id = iodv.organization_id
-                        AND pla.line_type_id = pltv.line_type_id
-                        AND pla.item_id = esiv.inventory_item_id (+)
-                        AND plla.ship_to_organization_id = esiv.organization_id (+)
-                        AND pla.category_id = ecv.category_id (+)
-                        AND plla.line_location_id = pda.line_location_id
-                        AND pda.req_distribution_id = prda.distribution_id (+)
-                        AND prda.requisition_line_id = prla.requisition_line_id (+)
-                        AND prla.requisition_header_id = prha.requisition_header_id (+)
-                        AND pda.code_combination_id = gcc.code_combination_id
-                        AND pda.deliver_to_person_id = pu.person_id (+)
-                        AND plla.line_location_id = ad.po_line_location_id (+)
-                        AND pha.po_header_id = pcd.po_header_id (+)
-                        AND pha.vendor_site_id = pssv.vendor_site_id
-                ) po_detail
-            ) po_data
-            WHERE
-                asn_only = nvl(:p_asn_only, asn_only)
-                AND overseas_supply = nvl(:p_overseas_supply, overseas_supply)
-            ORDER BY
-                po_date desc,
-                po_num,
-                po_line_num,
-                po_schedule_no,
-                po_dist_no
-            """ #
-            cursor.execute( #
-                "INSERT INTO QUERY_CONTEXTS (AGENT_TYPE, CONTEXT, QUERY) VALUES (:agent_type, :context, :query)", #
-                agent_type="scm", #
-                context="Keywords: purchase order, PO, supplier, order number, status, asn. Description: Fetches purchase order details including order numbers, suppliers, statuses, and ASN information.", #
-                query=scm_po_query #
-            )
-            
-            # HCM Employee Query
-            hcm_employee_query = """
-            SELECT papf.person_id,
-                papf.person_number AS employee_number,
-                ppnf.display_name AS employee_name,
-                paam.assignment_number,
-                paam.assignment_status_type AS assignment_status,
-                haou.name AS organization_name,
-                hp.name AS position_name,
-                hl.location_code AS location_name,
-                ppnf.full_name AS manager_name,
-                pg.name AS grade_name,
-                pp.date_of_birth,
-                ppos.date_start AS hire_date,
-                pcf.contract_end_date,
-                pea.email_address AS primary_email
-            FROM per_all_people_f papf
-            JOIN per_all_assignments_m paam ON papf.person_id = paam.person_id
-            JOIN hr_all_organization_units haou ON paam.organization_id = haou.organization_id
-            JOIN hr_all_positions hp ON paam.position_id = hp.position_id
-            JOIN hr_locations_all hl ON paam.location_id = hl.location_id
-            LEFT JOIN per_assignment_supervisors_f pasf ON paam.assignment_id = pasf.assignment_id
-            LEFT JOIN per_person_names_f ppnf ON pasf.manager_id = ppnf.person_id
-            LEFT JOIN per_grades pg ON paam.grade_id = pg.grade_id
-            LEFT JOIN per_periods_of_service ppos ON paam.period_of_service_id = ppos.period_of_service_id
-            LEFT JOIN per_persons pp ON papf.person_id = pp.person_id
-            LEFT JOIN per_contracts_f pcf ON paam.contract_id = pcf.contract_id
-            LEFT JOIN per_email_addresses pea ON papf.person_id = pea.person_id AND pea.email_type = 'W1'
-            WHERE TRUNC(SYSDATE) BETWEEN papf.effective_start_date AND papf.effective_end_date
-                AND TRUNC(SYSDATE) BETWEEN paam.effective_start_date AND paam.effective_end_date
-                AND paam.primary_flag = 'Y'
-            ORDER BY papf.person_number
-            """ #
-            cursor.execute( #
-                "INSERT INTO QUERY_CONTEXTS (AGENT_TYPE, CONTEXT, QUERY) VALUES (:agent_type, :context, :query)", #
-                agent_type="hcm", #
-                context="Keywords: employee, person, name, hire date, organization, assignment, count, total, number. Description: Retrieves employee details like person ID, name, hire date, and assignment information, or aggregates like total employee count.", #
-                query=hcm_employee_query #
-            )
-            
-            conn.commit() #
-            logger.info("Initialized QUERY_CONTEXTS database with initial queries (Oracle).") #
-        
-    except oracledb.Error as e: #
-        error_obj, = e.args #
-        if error_obj.code not in [942, 955]: # Log other errors #
-            logger.error(f"Error during Oracle database initialization for QUERY_CONTEXTS: {error_obj.message}", exc_info=True) #
-            raise #
-    except ConnectionError as e: #
-        logger.error(f"Failed to get Oracle DB connection during QUERY_CONTEXTS initialization: {str(e)}", exc_info=True) #
-        raise #
-    finally:
-        if conn: #
-            oracle_db_utils.release_oracle_connection(conn) #
-            logger.debug("Released connection after QUERY_CONTEXTS DB initialization.") #
-
-
-def initialize_conversation_history_table():
-    """Initializes the CHATBOT_CONVERSATION_HISTORY table in Oracle if it doesn't exist."""
-    logger.info("Starting database initialization for Oracle CHATBOT_CONVERSATION_HISTORY table") #
-    conn = None
-    try:
-        conn = oracle_db_utils.get_oracle_connection() #
-        cursor = conn.cursor() #
-        
-        logger.info("Creating CHATBOT_CONVERSATION_HISTORY table if not exists (Oracle)")
-        try:
-            cursor.execute("""
-                CREATE TABLE CHATBOT_CONVERSATION_HISTORY (
-                    MESSAGE_ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
-                    THREAD_ID VARCHAR2(255) NOT NULL,
-                    MESSAGE_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
-                    SENDER_ROLE VARCHAR2(10) NOT NULL CHECK (SENDER_ROLE IN ('USER', 'AI')),
-                    MESSAGE_CONTENT CLOB,
-                    AGENT_STREAM VARCHAR2(10) NOT NULL 
-                )
-            """)
-            logger.info("CHATBOT_CONVERSATION_HISTORY table created (Oracle).")
-            # Add indexes for performance
-            cursor.execute("CREATE INDEX idx_conv_hist_thread_stream_ts ON CHATBOT_CONVERSATION_HISTORY (THREAD_ID, AGENT_STREAM, MESSAGE_TIMESTAMP DESC)")
-            logger.info("Indexes created for CHATBOT_CONVERSATION_HISTORY table.")
-            conn.commit() #
-
-        except oracledb.Error as e:
-            error_obj, = e.args #
-            if error_obj.code == 955: # ORA-00955: name is already used by an existing object #
-                 logger.warning(f"Table CHATBOT_CONVERSATION_HISTORY or its index already exists. Skipping creation. Error: {error_obj.message}")
-            else:
-                logger.error(f"Error creating CHATBOT_CONVERSATION_HISTORY table: {error_obj.message}", exc_info=True) #
-                raise #
-        
-    except oracledb.Error as e: #
-        error_obj, = e.args #
-        logger.error(f"Oracle DB error during CHATBOT_CONVERSATION_HISTORY initialization: {error_obj.message}", exc_info=True) #
-        raise #
-    except ConnectionError as e: #
-        logger.error(f"Failed to get Oracle DB connection during CHATBOT_CONVERSATION_HISTORY initialization: {str(e)}", exc_info=True) #
-        raise #
-    finally:
-        if conn: #
-            oracle_db_utils.release_oracle_connection(conn) #
-            logger.debug("Released connection after CHATBOT_CONVERSATION_HISTORY DB initialization.")
-
-def initialize_attachments_table():
-    """Initializes the CHATBOT_ATTACHMENTS table in Oracle if it doesn't exist."""
-    logger.info("Starting database initialization for Oracle CHATBOT_ATTACHMENTS table")
-    conn = None
-    try:
-        conn = oracle_db_utils.get_oracle_connection()
-        cursor = conn.cursor()
-        
-        logger.info("Creating CHATBOT_ATTACHMENTS table if not exists (Oracle)")
-        try:
-            cursor.execute("""
-                CREATE TABLE CHATBOT_ATTACHMENTS (
-                    ATTACHMENT_ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
-                    MESSAGE_ID NUMBER NOT NULL,
-                    FILENAME VARCHAR2(255) NOT NULL,
-                    MIMETYPE VARCHAR2(100) NOT NULL,
-                    FILE_CONTENT BLOB NOT NULL,
-                    CREATED_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    CONSTRAINT fk_message
-                        FOREIGN KEY (MESSAGE_ID)
-                        REFERENCES CHATBOT_CONVERSATION_HISTORY(MESSAGE_ID)
-                        ON DELETE CASCADE
-                )
-            """)
-            logger.info("CHATBOT_ATTACHMENTS table created (Oracle).")
-            conn.commit()
-
-        except oracledb.Error as e:
-            error_obj, = e.args
-            if error_obj.code == 955: # ORA-00955: name is already used by an existing object
-                logger.warning(f"Table CHATBOT_ATTACHMENTS already exists. Skipping creation. Error: {error_obj.message}")
-            else:
-                logger.error(f"Error creating CHATBOT_ATTACHMENTS table: {error_obj.message}", exc_info=True)
-                raise
-        
-    except oracledb.Error as e:
-        error_obj, = e.args
-        logger.error(f"Oracle DB error during CHATBOT_ATTACHMENTS initialization: {error_obj.message}", exc_info=True)
-        raise
-    except ConnectionError as e:
-        logger.error(f"Failed to get Oracle DB connection during CHATBOT_ATTACHMENTS initialization: {str(e)}", exc_info=True)
-        raise
-    finally:
-        if conn:
-            oracle_db_utils.release_oracle_connection(conn)
-            logger.debug("Released connection after CHATBOT_ATTACHMENTS DB initialization.")
-
-
-# Initialize databases on startup
-try:
-    logger.info("Starting database initialization (Oracle QUERY_CONTEXTS)") #
-    initialize_query_contexts_db() #
-    logger.info("Starting database initialization (Oracle CHATBOT_CONVERSATION_HISTORY)") #
-    initialize_conversation_history_table() #
-    logger.info("Starting database initialization (Oracle CHATBOT_ATTACHMENTS)")
-    initialize_attachments_table()
-except Exception as e:
-    logger.error(f"Failed to initialize Oracle databases: {str(e)}") #
-    raise #
-
-@app.on_event("shutdown") #
-async def shutdown_event(): #
-    logger.info("Shutting down application, closing Oracle connection pool.") #
-    oracle_db_utils.close_oracle_connection_pool() #
 
 class QueryRequest(BaseModel): #
     question: str #
     thread_id: Optional[str] = None #
     format_preference: Optional[str] = "natural_language" #
     agent_type: str # # Renamed to agent_stream in DB, but request can keep agent_type
+    timeout_seconds: Optional[float] = None # Optional tighter end-to-end budget; capped at Config.REQUEST_TIMEOUT_SECONDS
+    export_format: Optional[str] = None # Download format of large results: "xlsx", "csv", "csv.gz" or "csv.zst" (default Config.DEFAULT_EXPORT_FORMAT)
+
+async def _run_agent_query(selected_agent, question: str, thread_id: Optional[str], format_preference: str, agent_stream: str, deadline_seconds: float, export_format: str = "xlsx", run_cache: Optional[RunCache] = None, tenant: Optional[str] = None) -> Dict:
+    """Runs the agent and builds the API response body; executed once per group of coalesced requests."""
+    logger.info(f"Invoking {selected_agent.__class__.__name__} to process question") #
+    # The agent blocks on LLM/BIP/DB calls; run it off the event loop so other requests keep being served
+    result = await run_in_threadpool(selected_agent.run, question, thread_id, format_preference, agent_stream, deadline_seconds, export_format, run_cache, tenant) # Pass agent_stream
+    
+    if result.get("error"): #
+        logger.error(f"Agent returned an error: {result['error']}") #
+        return { #
+            "status": "error", #
+            "message": result["error"], #
+            "response": result["response"], #
+            "thread_id": result["thread_id"], #
+            "question_type": result.get("question_type", "unknown"), #
+            "format_preference": format_preference #
+        }
+    logger.info(f"Query processed successfully, response: {result['response'][:100]}...") #
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Full agent result: {result}") #
+    response_body = { #
+        "status": "success", #
+        "response": result["response"], #
+        "thread_id": result["thread_id"], #
+        "question_type": result.get("question_type", "unknown"), #
+        "format_preference": format_preference #
+    }
+    if result.get("job_id"):
+        response_body["job_id"] = result["job_id"]
+        response_body["job_status_url"] = f"{Config.BASE_URL}/jobs/{result['job_id']}"
+    if result.get("result_id"):
+        response_body["result_id"] = result["result_id"]
+        response_body["results_url"] = f"{Config.BASE_URL}/results/{result['result_id']}"
+        response_body["total_rows"] = result.get("total_rows")
+    return response_body
+
+def _resolve_query_options(agent_type: Optional[str], format_preference: Optional[str], export_format: Optional[str],
+                           timeout_seconds) -> Tuple[str, str, str, float]:
+    """Validates the per-question options of /scm/query, /hcm/query and /batch; returns (agent_stream, format_preference, export_format, deadline_seconds)."""
+    if not agent_type: #
+        raise HTTPException(status_code=422, detail="Missing 'agent_type' field") #
 
-async def process_query(request: Request, agent_instance_placeholder): # agent_instance_placeholder not used directly due to logic change
+    # agent_stream will be used for DB interaction; agent_type is what client sends
+    agent_stream = agent_type.lower().replace("_agent", "") #
+    if agent_stream not in ["scm", "hcm"]: #
+        raise HTTPException(status_code=422, detail="Invalid 'agent_type'. Must be 'scm' or 'hcm'") #
+
+    if format_preference not in ["natural_language", "table"]: #
+        format_preference = "natural_language" #
+
+    requested_export_format = export_format
+    export_format = normalize_export_format(requested_export_format or Config.DEFAULT_EXPORT_FORMAT)
+    if export_format is None:
+        if requested_export_format:
+            raise HTTPException(status_code=422, detail="Invalid or unavailable 'export_format'. Use 'xlsx', 'csv', 'csv.gz' or 'csv.zst'")
+        export_format = "xlsx"
+
+    deadline_seconds = Config.REQUEST_TIMEOUT_SECONDS
+    if timeout_seconds is not None:
+        try:
+            deadline_seconds = min(float(timeout_seconds), Config.REQUEST_TIMEOUT_SECONDS)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=422, detail="'timeout_seconds' must be a number")
+        if deadline_seconds <= 0:
+            raise HTTPException(status_code=422, detail="'timeout_seconds' must be positive")
+    return agent_stream, format_preference, export_format, deadline_seconds
+
+def _tenant(request: Request) -> Optional[str]:
+    """The caller's tenant, from the header the gateway sets (Config.BIP_TENANT_HEADER); None when not configured or absent."""
+    if not Config.BIP_TENANT_HEADER:
+        return None
+    return request.headers.get(Config.BIP_TENANT_HEADER) or None
+
+def _caller_key(request: Request) -> str:
+    """
+    Who a request is counted against: the user header set by the gateway (Config.ADMISSION_USER_HEADER), else the
+    client address. Never anything from the body, which the caller could change per request to get a fresh bucket.
+    """
+    user = request.headers.get(Config.ADMISSION_USER_HEADER) if Config.ADMISSION_USER_HEADER else None
+    if user:
+        return f"user:{user}"
+    return f"addr:{request.client.host if request.client else 'unknown'}"
+
+async def _admit(caller: str) -> None:
+    """Waits for the caller's turn under admission control; raises 429 with Retry-After when it cannot get one in time."""
+    if not Config.ADMISSION_ENABLED:
+        return
+    try:
+        waited = await get_admission_controller().admit(caller)
+    except AdmissionRejected as e:
+        logger.warning(f"Rejected request: {str(e)}")
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": e.retry_after_header})
+    if waited > 0.05:
+        logger.info(f"Admitted {caller} after waiting {waited:.2f}s")
+
+async def process_query(request: Request, agent_instance_placeholder, response: Optional[Response] = None): # agent_instance_placeholder not used directly due to logic change
     logger.info("Received question") #
     body = await request.body() #
     logger.debug(f"Raw request body: {body}") #
@@ -533,6 +240,8 @@ async def process_query(request: Request, agent_instance_placeholder): # agent_i
     thread_id = None #
     format_preference = "natural_language" #
     agent_type_from_request = None # Use a different variable name to avoid confusion #
+    timeout_seconds = None
+    export_format = None
     try:
         try: #
             json_body = json.loads(body) #
@@ -542,6 +251,8 @@ async def process_query(request: Request, agent_instance_placeholder): # agent_i
                 thread_id = json_body.get("thread_id") #
                 format_preference = json_body.get("format_preference", "natural_language") #
                 agent_type_from_request = json_body.get("agent_type") #
+                timeout_seconds = json_body.get("timeout_seconds")
+                export_format = json_body.get("export_format")
             else: #
                 pass #
         except json.JSONDecodeError: #
@@ -556,111 +267,314 @@ async def process_query(request: Request, agent_instance_placeholder): # agent_i
                 thread_id = form_data.get("thread_id") #
                 format_preference = form_data.get("format_preference", "natural_language") #
                 agent_type_from_request = form_data.get("agent_type") #
+                timeout_seconds = form_data.get("timeout_seconds")
+                export_format = form_data.get("export_format")
             else: #
                 raise HTTPException(status_code=422, detail="Missing 'question' field in JSON or form data") #
         
-        if not agent_type_from_request: #
-            raise HTTPException(status_code=422, detail="Missing 'agent_type' field") #
-        
-        # agent_stream will be used for DB interaction; agent_type_from_request is what client sends
-        agent_stream = agent_type_from_request.lower().replace("_agent", "") #
-        if agent_stream not in ["scm", "hcm"]: #
-            raise HTTPException(status_code=422, detail="Invalid 'agent_type'. Must be 'scm' or 'hcm'") #
-        
-        if format_preference not in ["natural_language", "table"]: #
-            format_preference = "natural_language" #
+        agent_stream, format_preference, export_format, deadline_seconds = _resolve_query_options(
+            agent_type_from_request, format_preference, export_format, timeout_seconds
+        )
 
         logger.info(f"Received query request for agent_stream: {agent_stream}, question: {question}, thread_id: {thread_id}, format_preference: {format_preference}") #
         
-        selected_agent = None
-        if agent_stream == "scm":
-            selected_agent = scm_agent
-        elif agent_stream == "hcm":
-            selected_agent = hcm_agent
+        selected_agent = get_agent(agent_stream)
+        tenant = _tenant(request)
         
         if not selected_agent: #
              raise HTTPException(status_code=500, detail="Internal error: Agent not found")
 
-        logger.info(f"Invoking {selected_agent.__class__.__name__} to process question") #
-        result = selected_agent.run(question, thread_id, format_preference, agent_stream) # Pass agent_stream
-        
-        if result.get("error"): #
-            logger.error(f"Agent returned an error: {result['error']}") #
-            return { #
-                "status": "error", #
-                "message": result["error"], #
-                "response": result["response"], #
-                "thread_id": result["thread_id"], #
-                "question_type": result.get("question_type", "unknown"), #
-                "format_preference": format_preference #
-            }
-        logger.info(f"Query processed successfully, response: {result['response'][:100]}...") #
-        logger.debug(f"Full agent result: {result}") #
-        return { #
-            "status": "success", #
-            "response": result["response"], #
-            "thread_id": result["thread_id"], #
-            "question_type": result.get("question_type", "unknown"), #
-            "format_preference": format_preference #
-        }
+        fingerprint = request_fingerprint(question, agent_stream, thread_id, format_preference, export_format, tenant)
+        idempotency_key = request.headers.get("Idempotency-Key")
+        caller = _caller_key(request)
+        # Scoped to the caller: another caller reusing the key must neither get this response nor a conflict
+        cache_key = f"{caller}:{agent_stream}:{idempotency_key}" if idempotency_key else None
+
+        async def execute() -> Tuple[Dict, bool]:
+            # Replays are free; anything that runs the agent counts against the caller's rate
+            await _admit(caller)
+            # Only within a conversation: requests without a thread_id would all share the one new thread of the run
+            if Config.COALESCE_DUPLICATE_REQUESTS and thread_id:
+                response_body, shared = await _query_flights.do(
+                    fingerprint, _run_agent_query, selected_agent, question, thread_id, format_preference, agent_stream, deadline_seconds, export_format, None, tenant
+                )
+            else:
+                response_body = await _run_agent_query(selected_agent, question, thread_id, format_preference, agent_stream, deadline_seconds, export_format, tenant=tenant)
+                shared = False
+            # Only successful answers are stored: a failed run saved nothing, so a retry may safely run again
+            if cache_key and response_body.get("status") == "success":
+                _idempotency_cache.put(cache_key, fingerprint, response_body)
+            return response_body, shared
+
+        if cache_key:
+            try:
+                stored = _idempotency_cache.get(cache_key, fingerprint)
+                if stored is not None:
+                    logger.info(f"Replaying stored response for Idempotency-Key {idempotency_key}")
+                    if response is not None:
+                        response.headers["Idempotent-Replayed"] = "true"
+                    return dict(stored)
+                # Registered before anything is awaited, so a retry sent while this attempt runs joins it
+                (response_body, shared), replayed = await _idempotent_flights.do(cache_key, execute, tag=fingerprint)
+            except IdempotencyConflict as e:
+                raise HTTPException(status_code=422, detail=str(e))
+            if replayed and response is not None:
+                response.headers["Idempotent-Replayed"] = "true"
+        else:
+            response_body, shared = await execute()
+        if shared and response is not None:
+            response.headers["X-Request-Coalesced"] = "true"
+        return dict(response_body)
     except HTTPException as http_exc: #
         raise http_exc #
     except Exception as e: #
         logger.error(f"Error processing request: {str(e)}", exc_info=True) #
-        error_message = str(e) #
-        if isinstance(e, oracledb.Error): #
-            error_obj, = e.args #
-            error_message = f"Database error: {error_obj.message} (Code: {error_obj.code})" #
-        elif isinstance(e, ConnectionError): #
-            error_message = f"Database connection error: {str(e)}" #
-        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {error_message}") #
+        raise HTTPException(status_code=500, detail=f"An internal server error occurred: {_describe_error(e)}") #
+
+def _describe_error(e: Exception) -> str:
+    if isinstance(e, oracledb.Error): #
+        error_obj, = e.args #
+        return f"Database error: {error_obj.message} (Code: {error_obj.code})" #
+    if isinstance(e, ConnectionError): #
+        return f"Database connection error: {str(e)}" #
+    return str(e) #
 
 @app.post("/scm/query") #
-async def scm_query(request: Request): #
+async def scm_query(request: Request, response: Response): #
     logger.info("Processing SCM query request") #
-    return await process_query(request, None) # Pass None, agent determined in process_query #
+    return await process_query(request, None, response) # Pass None, agent determined in process_query #
 
 @app.post("/hcm/query") #
-async def hcm_query(request: Request): #
+async def hcm_query(request: Request, response: Response): #
     logger.info("Processing HCM query request") #
-    return await process_query(request, None) # Pass None, agent determined in process_query #
+    return await process_query(request, None, response) # Pass None, agent determined in process_query #
+
+class BatchQuestion(BaseModel):
+    question: str
+    id: Optional[str] = None # Echoed back on the result line, for matching answers to questions
+    thread_id: Optional[str] = None
+    agent_type: Optional[str] = None # Defaults to the batch's agent_type
+    format_preference: Optional[str] = None
+    export_format: Optional[str] = None
+    timeout_seconds: Optional[float] = None # Counted from when the question starts running, not from when the batch arrived
 
+class BatchRequest(BaseModel):
+    questions: List[BatchQuestion]
+    agent_type: Optional[str] = None
+    format_preference: Optional[str] = "natural_language"
+    export_format: Optional[str] = None
+    concurrency: Optional[int] = Field(default=None, ge=1) # Capped at Config.BATCH_MAX_CONCURRENCY_PER_REQUEST
+
+def _get_batch_semaphore() -> asyncio.Semaphore:
+    global _batch_semaphore
+    if _batch_semaphore is None:
+        _batch_semaphore = asyncio.Semaphore(Config.BATCH_MAX_CONCURRENCY)
+    return _batch_semaphore
+
+@app.post("/batch")
+async def batch_query(batch: BatchRequest, request: Request):
+    """
+    Answers many questions in one request. Results are streamed as NDJSON in completion order, one
+    line per question ({"index", "id", ...the /query response body}), then a {"summary": ...} line.
+    Questions of the batch share a RunCache, so contexts, classifications, context matches and
+    generated SQL that repeat across them are computed once. Each question takes one admission token as
+    it starts; a question the caller's rate does not admit gets a line with status_code 429 and retry_after.
+    """
+    if not batch.questions:
+        raise HTTPException(status_code=422, detail="'questions' must not be empty")
+    if len(batch.questions) > Config.BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=422, detail=f"At most {Config.BATCH_MAX_QUESTIONS} questions per batch")
+    caller = _caller_key(request)
+    concurrency = min(batch.concurrency or Config.BATCH_MAX_CONCURRENCY_PER_REQUEST, Config.BATCH_MAX_CONCURRENCY_PER_REQUEST)
+    batch_limit = asyncio.Semaphore(concurrency)
+    global_limit = _get_batch_semaphore()
+    run_cache = RunCache()
+    tenant = _tenant(request)
+    logger.info(f"Received batch of {len(batch.questions)} questions, concurrency {concurrency}")
+
+    async def answer(index: int, item: BatchQuestion) -> Dict:
+        line = {"index": index, "id": item.id}
+        try:
+            agent_stream, format_preference, export_format, deadline_seconds = _resolve_query_options(
+                item.agent_type or batch.agent_type, item.format_preference or batch.format_preference,
+                item.export_format or batch.export_format, item.timeout_seconds
+            )
+            # The batch's own slot first, so a batch waiting on its limit does not hold worker-wide slots. Each question
+            # is admitted as it starts, like a /query request of the same caller; a rejected one gets a 429 line.
+            async with batch_limit:
+                await _admit(caller)
+                async with global_limit:
+                    selected_agent = get_agent(agent_stream)
+                    if Config.COALESCE_DUPLICATE_REQUESTS and item.thread_id:
+                        fingerprint = request_fingerprint(item.question, agent_stream, item.thread_id, format_preference, export_format, tenant)
+                        response_body, _ = await _query_flights.do(
+                            fingerprint, _run_agent_query, selected_agent, item.question, item.thread_id, format_preference, agent_stream, deadline_seconds, export_format, run_cache, tenant
+                        )
+                    else:
+                        response_body = await _run_agent_query(selected_agent, item.question, item.thread_id, format_preference, agent_stream, deadline_seconds, export_format, run_cache, tenant)
+            line.update(response_body)
+        except HTTPException as http_exc:
+            line.update({"status": "error", "status_code": http_exc.status_code, "message": http_exc.detail})
+            if http_exc.headers and "Retry-After" in http_exc.headers:
+                line["retry_after"] = int(http_exc.headers["Retry-After"])
+        except Exception as e:
+            logger.error(f"Error processing batch question {index}: {str(e)}", exc_info=True)
+            line.update({"status": "error", "status_code": 500, "message": f"An internal server error occurred: {_describe_error(e)}"})
+        return line
+
+    async def stream_results():
+        started = time.monotonic()
+        tasks = [asyncio.ensure_future(answer(index, item)) for index, item in enumerate(batch.questions)]
+        counts = {"success": 0, "error": 0}
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line = await next_done
+                counts["success" if line.get("status") == "success" else "error"] += 1
+                yield json.dumps(line, default=str) + "\n"
+            summary = {
+                "questions": len(tasks), **counts,
+                "duration_seconds": round(time.monotonic() - started, 3),
+                "run_cache": run_cache.stats()
+            }
+            logger.info(f"Batch finished: {summary}")
+            yield json.dumps({"summary": summary}) + "\n"
+        finally:
+            # Client went away: drop the questions not started yet (runs already in a thread finish on their own)
+            pending = [task for task in tasks if not task.done()]
+            for task in pending:
+                task.cancel()
+            if pending:
+                logger.info(f"Batch stream closed early; cancelled {len(pending)} pending questions")
+
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# Probes only read the health monitor's cached results; they never touch the pool or the network.
 @app.get("/health") #
 async def health_check(): #
-    logger.info("Health check requested") #
-    try: #
-        conn = oracle_db_utils.get_oracle_connection() #
-        cursor = conn.cursor() #
-        cursor.execute("SELECT 1 FROM DUAL") #
-        cursor.fetchone() #
-        oracle_db_utils.release_oracle_connection(conn) #
-        return {"status": "healthy", "database_status": "connected"} #
-    except Exception as e: #
-        logger.error(f"Health check failed due to database connection issue: {str(e)}") #
-        return {"status": "unhealthy", "database_status": f"disconnected: {str(e)}"} #
+    checks = health_monitor.snapshot()
+    database = checks.get("database", {})
+    if database.get("status") in ("up", "skipped"):
+        database_status = "connected" if database["status"] == "up" else "not used"
+    else:
+        database_status = f"disconnected: {database.get('error', database.get('status', 'unknown'))}"
+    return {"status": "healthy" if health_monitor.healthy(checks) else "unhealthy", "database_status": database_status, "checks": checks} #
+
+@app.get("/health/live")
+async def liveness_check():
+    """The worker's event loop is serving requests."""
+    return {"status": "alive"}
+
+@app.get("/ready")
+@app.get("/health/ready")
+async def readiness_check():
+    """Ready once the startup prewarm has finished and the required dependencies passed their last check (503 otherwise)."""
+    checks = health_monitor.snapshot()
+    body = {"prewarm": prewarm_state.snapshot(), "checks": checks}
+    if not prewarm_state.ready:
+        return JSONResponse(status_code=503, content={"status": "starting", **body})
+    if not health_monitor.healthy(checks):
+        return JSONResponse(status_code=503, content={"status": "unavailable", **body})
+    return {"status": "ready", **body}
+
+@app.get("/metrics/llm")
+async def llm_metrics():
+    """Quota headroom, queueing and usage counters for each shared Azure OpenAI deployment client."""
+    return {"deployments": get_llm_metrics()}
+
+@app.get("/pool/stats")
+async def pool_stats():
+    """Oracle session pool size, busy sessions and acquisition wait counters."""
+    return oracle_db_utils.get_pool_stats()
+
+@app.get("/admission")
+async def admission_stats():
+    if not Config.ADMISSION_ENABLED:
+        return {"enabled": False}
+    return {"enabled": True, **get_admission_controller().stats()}
+
+@app.get("/bip/endpoints")
+async def bip_endpoint_stats():
+    from bip_routing import get_bip_router
+    return get_bip_router().stats()
+
+@app.get("/retention/status")
+async def retention_status():
+    """Retention policy and the report of the last purge run by this worker."""
+    from jobs.retention import retention_purger
+    return {
+        "enabled": Config.RETENTION_ENABLED,
+        "policy": vars(retention_purger.policy),
+        "last_run": retention_purger.last_report,
+    }
+
+@app.get("/results/{result_id}")
+async def get_result_page(result_id: str, offset: int = 0, limit: Optional[int] = None, sort: Optional[str] = None):
+    """One page of a cached query result (?offset=&limit=&sort=COL,-COL2), served without re-running the question."""
+    limit = Config.RESULT_PAGE_DEFAULT_LIMIT if limit is None else limit
+    if offset < 0 or limit < 1 or limit > Config.RESULT_PAGE_MAX_LIMIT:
+        raise HTTPException(status_code=422, detail=f"'offset' must be >= 0 and 'limit' between 1 and {Config.RESULT_PAGE_MAX_LIMIT}")
+    try:
+        # Parsing, sorting or reading a spilled result back from disk can take a while on large results
+        return await run_in_threadpool(result_cache.get_page, result_id, offset, limit, sort)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Result not found or expired; ask the question again")
+    except ResultPending:
+        raise HTTPException(status_code=409, detail="The result is still being fetched by a background export job; try again shortly")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/results")
+async def result_cache_stats():
+    """Size of the paging result cache of this worker: results in memory and spilled to disk, hits and spills."""
+    return result_cache.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_export_job(job_id: str):
+    """Reports status and progress of a background export job."""
+    job = await run_in_threadpool(get_job_store().get_job, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "stage": job["stage"],
+        "thread_id": job["thread_id"],
+        "message_id": job["message_id"],
+        "total_rows": job["total_rows"],
+        "attachment_id": job["attachment_id"],
+        "download_url": job["download_url"],
+        "error": job["error_message"],
+        "created_at": str(job["created_at"]),
+        "updated_at": str(job["updated_at"]),
+    }
 
 @app.get("/download/attachment/{attachment_id}")
-async def download_document(attachment_id: int):
-    """Downloads a document directly from the CHATBOT_ATTACHMENTS table."""
-    conn = None
+async def download_document(attachment_id: int, format: Optional[str] = None):
+    """Downloads a document from the configured chat store (CHATBOT_ATTACHMENTS), optionally re-encoded (?format=csv|csv.gz|csv.zst|xlsx)."""
+    target_format = None
+    if format:
+        target_format = normalize_export_format(format)
+        if target_format is None:
+            raise HTTPException(status_code=400, detail="Invalid or unavailable 'format'. Use 'xlsx', 'csv', 'csv.gz' or 'csv.zst'")
     try:
         logger.info(f"Downloading attachment with ID: {attachment_id}")
-        conn = oracle_db_utils.get_oracle_connection()
-        cursor = conn.cursor()
-        
-        # Query to fetch the file content (BLOB), filename, and mimetype
-        sql = "SELECT FILENAME, MIMETYPE, FILE_CONTENT FROM CHATBOT_ATTACHMENTS WHERE ATTACHMENT_ID = :id"
-        cursor.execute(sql, id=attachment_id)
-        result = cursor.fetchone()
+        result = await run_in_threadpool(get_chat_store().get_attachment, attachment_id)
         
         if not result:
             logger.error(f"Attachment with ID {attachment_id} not found in the database.")
             raise HTTPException(status_code=404, detail="Attachment not found")
         
-        filename, mimetype, file_content_blob = result
-        
-        # Read the content from the LOB object
-        file_bytes = file_content_blob.read()
+        filename, mimetype, file_bytes = result
+
+        source_format = format_from_filename(filename)
+        if target_format and target_format != source_format:
+            if source_format is None:
+                raise HTTPException(status_code=400, detail=f"Attachment {attachment_id} cannot be converted to {target_format}")
+            # Between CSV formats this is only (de)compression; xlsx conversions go through pandas
+            file_bytes = await run_in_threadpool(convert_export, file_bytes, source_format, target_format)
+            filename = export_filename(target_format, filename[:-len(EXPORT_FORMATS[source_format][0]) - 1])
+            mimetype = export_mimetype(target_format)
         
         logger.info(f"Attachment {attachment_id} ({filename}) retrieved successfully from database.")
         
@@ -669,6 +583,8 @@ async def download_document(attachment_id: int):
             media_type=mimetype,
             headers={"Content-Disposition": f'attachment; filename="{filename}"'}
         )
+    except HTTPException:
+        raise
     except oracledb.Error as e:
         error_obj, = e.args
         logger.error(f"Database error downloading attachment {attachment_id}: {error_obj.message}", exc_info=True)
@@ -676,10 +592,6 @@ async def download_document(attachment_id: int):
     except Exception as e:
         logger.error(f"Error processing attachment download for ID {attachment_id}: {str(e)}", exc_info=True)
         raise HTTPException(status_code=500, detail=f"Internal server error during file download: {str(e)}")
-    finally:
-        if conn:
-            oracle_db_utils.release_oracle_connection(conn)
-
 
 if __name__ == "__main__": #
     import uvicorn #
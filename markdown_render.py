@@ -0,0 +1,106 @@
+import logging
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+logger = logging.getLogger("markdown_render")
+
+ELLIPSIS = "…"
+# Rows are formatted in growing chunks so a byte budget stops the work early on large frames
+_FIRST_CHUNK_ROWS = 64
+_MAX_CHUNK_ROWS = 8192
+
+
+def _escape(text: str) -> str:
+    # "|" would end the cell and a newline the row
+    if "|" in text or "\n" in text or "\r" in text:
+        return text.replace("|", "\\|").replace("\r\n", " ").replace("\n", " ").replace("\r", " ")
+    return text
+
+
+def _column_kind(column: pd.Series) -> str:
+    if pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(column):
+        return "plain"
+    if pd.api.types.is_float_dtype(column):
+        return "float"
+    return "text"
+
+
+def _format_cells(kind: str, values: np.ndarray, max_width: int, float_decimals: int) -> List[str]:
+    """Cell texts of a slice of one column: floats rounded, missing values blank, text escaped and width capped."""
+    missing = pd.isna(values)
+    has_missing = bool(missing.any())
+    if kind == "float":
+        # "12.50" -> "12.5", "3.00" -> "3"; NaN -> ""
+        if float_decimals > 0:
+            cells = ["" if value != value else f"{value:.{float_decimals}f}".rstrip("0").rstrip(".") for value in values.tolist()]
+        else:
+            cells = ["" if value != value else f"{value:.0f}" for value in values.tolist()]
+        # Small negatives round to "-0" (-0.0001 -> "-0"); zero has no sign
+        return ["0" if cell == "-0" else cell for cell in cells]
+    if kind == "plain":
+        # Integers and booleans never need escaping or a width cap
+        cells = [str(value) for value in values.tolist()]
+    else:
+        cells = [_escape(str(value)) for value in values.tolist()]
+        if max_width > 0:
+            cells = [cell if len(cell) <= max_width else cell[:max_width - 1] + ELLIPSIS for cell in cells]
+    if has_missing:
+        cells = ["" if gap else cell for cell, gap in zip(cells, missing.tolist())]
+    return cells
+
+
+def _format_header(name, max_width: int) -> str:
+    text = _escape(str(name))
+    return text if max_width <= 0 or len(text) <= max_width else text[:max_width - 1] + ELLIPSIS
+
+
+def render_markdown_table(df: pd.DataFrame, max_rows: Optional[int] = None, max_column_width: Optional[int] = None,
+                          max_bytes: Optional[int] = None, float_decimals: Optional[int] = None) -> str:
+    """
+    Renders a DataFrame as a GitHub-style markdown table, formatting column by column rather than
+    cell by cell. Cells wider than max_column_width are cut with an ellipsis; rows beyond max_rows,
+    or beyond what fits in max_bytes of UTF-8, are left out (and not formatted at all) and counted
+    in a closing note. Defaults come from Config.MARKDOWN_*; 0 disables a limit.
+    """
+    max_column_width = Config.MARKDOWN_MAX_COLUMN_WIDTH if max_column_width is None else max_column_width
+    max_bytes = Config.MARKDOWN_MAX_BYTES if max_bytes is None else max_bytes
+    float_decimals = Config.MARKDOWN_FLOAT_DECIMALS if float_decimals is None else float_decimals
+
+    total_rows = len(df)
+    row_limit = min(total_rows, max_rows) if max_rows else total_rows
+    header = "| " + " | ".join(_format_header(col, max_column_width) for col in df.columns) + " |\n"
+    header += "| " + " | ".join(["---"] * len(df.columns)) + " |\n"
+    if len(df.columns) == 0:
+        return header
+
+    kinds = [_column_kind(df.iloc[:, i]) for i in range(len(df.columns))]
+    lines: List[str] = []
+    remaining = max_bytes - len(header.encode("utf-8")) if max_bytes > 0 else None
+    start, chunk_rows, full = 0, _FIRST_CHUNK_ROWS, False
+    while start < row_limit and not full:
+        end = min(start + chunk_rows, row_limit)
+        block = df.iloc[start:end].to_numpy(dtype=object)
+        cells = [_format_cells(kind, block[:, i], max_column_width, float_decimals) for i, kind in enumerate(kinds)]
+        rendered = ["| " + " | ".join(row) + " |\n" for row in zip(*cells)]
+        if remaining is not None:
+            for line in rendered:
+                size = len(line) if line.isascii() else len(line.encode("utf-8"))
+                if size > remaining:
+                    full = True
+                    break
+                remaining -= size
+                lines.append(line)
+        else:
+            lines.extend(rendered)
+        start = end
+        chunk_rows = min(chunk_rows * 2, _MAX_CHUNK_ROWS)
+
+    hidden = total_rows - len(lines)
+    if hidden > 0:
+        logger.debug(f"Markdown table truncated to {len(lines)} of {total_rows} rows (max_rows={max_rows}, max_bytes={max_bytes})")
+        return f"{header}{''.join(lines)}\n*{hidden} more row{'s' if hidden != 1 else ''} not shown.*\n"
+    return header + "".join(lines)
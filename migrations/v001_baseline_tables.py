@@ -0,0 +1,59 @@
+VERSION = 1
+DESCRIPTION = "Baseline tables: QUERY_CONTEXTS, CHATBOT_CONVERSATION_HISTORY, CHATBOT_ATTACHMENTS, CHATBOT_EXPORT_JOBS"
+
+# Deployments that predate versioned migrations already have some or all of these tables,
+# so this baseline tolerates ORA-00955 (name is already used by an existing object).
+IGNORED_ERROR_CODES = (955,)
+
+STATEMENTS = [
+    """
+    CREATE TABLE QUERY_CONTEXTS (
+        ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+        AGENT_TYPE VARCHAR2(50) NOT NULL,
+        CONTEXT VARCHAR2(4000) NOT NULL,
+        QUERY CLOB NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE CHATBOT_CONVERSATION_HISTORY (
+        MESSAGE_ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+        THREAD_ID VARCHAR2(255) NOT NULL,
+        MESSAGE_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        SENDER_ROLE VARCHAR2(10) NOT NULL CHECK (SENDER_ROLE IN ('USER', 'AI')),
+        MESSAGE_CONTENT CLOB,
+        AGENT_STREAM VARCHAR2(10) NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE CHATBOT_ATTACHMENTS (
+        ATTACHMENT_ID NUMBER GENERATED BY DEFAULT ON NULL AS IDENTITY PRIMARY KEY,
+        MESSAGE_ID NUMBER NOT NULL,
+        FILENAME VARCHAR2(255) NOT NULL,
+        MIMETYPE VARCHAR2(100) NOT NULL,
+        FILE_CONTENT BLOB NOT NULL,
+        CREATED_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        CONSTRAINT fk_message
+            FOREIGN KEY (MESSAGE_ID)
+            REFERENCES CHATBOT_CONVERSATION_HISTORY(MESSAGE_ID)
+            ON DELETE CASCADE
+    )
+    """,
+    """
+    CREATE TABLE CHATBOT_EXPORT_JOBS (
+        JOB_ID VARCHAR2(64) PRIMARY KEY,
+        STATUS VARCHAR2(20) NOT NULL,
+        PROGRESS NUMBER DEFAULT 0 NOT NULL,
+        STAGE VARCHAR2(100),
+        THREAD_ID VARCHAR2(255),
+        MESSAGE_ID NUMBER,
+        AGENT_STREAM VARCHAR2(10),
+        TOTAL_ROWS NUMBER,
+        QUERY_TEXT CLOB,
+        ATTACHMENT_ID NUMBER,
+        DOWNLOAD_URL VARCHAR2(1000),
+        ERROR_MESSAGE VARCHAR2(4000),
+        CREATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL,
+        UPDATED_AT TIMESTAMP DEFAULT CURRENT_TIMESTAMP NOT NULL
+    )
+    """,
+]
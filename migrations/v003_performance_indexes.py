@@ -0,0 +1,15 @@
+VERSION = 3
+DESCRIPTION = "Indexes for history loads, attachment lookups by message, context lookups and export job polling"
+
+# ORA-00955: index name already exists (the old initializer created idx_conv_hist_thread_stream_ts
+# only when it also created the table). ORA-01408: an index on that column list already exists.
+IGNORED_ERROR_CODES = (955, 1408)
+
+STATEMENTS = [
+    "CREATE INDEX idx_conv_hist_thread_stream_ts ON CHATBOT_CONVERSATION_HISTORY (THREAD_ID, AGENT_STREAM, MESSAGE_TIMESTAMP DESC)",
+    # The FK from CHATBOT_ATTACHMENTS has no index: every ON DELETE CASCADE from history and every
+    # attachment lookup by message scanned the whole LOB table.
+    "CREATE INDEX idx_attachments_message_id ON CHATBOT_ATTACHMENTS (MESSAGE_ID)",
+    "CREATE INDEX idx_query_contexts_agent_type ON QUERY_CONTEXTS (AGENT_TYPE)",
+    "CREATE INDEX idx_export_jobs_message_id ON CHATBOT_EXPORT_JOBS (MESSAGE_ID)",
+]
@@ -0,0 +1,39 @@
+VERSION = 4
+DESCRIPTION = "Content-addressed attachment storage: CHATBOT_ATTACHMENT_BLOBS keyed by content hash, with reference counts"
+
+# Re-running after a partial apply: ORA-00955 (name already used), ORA-01430 (column already exists),
+# ORA-01451 (column already nullable), ORA-01408 (index on that column list already exists).
+IGNORED_ERROR_CODES = (955, 1430, 1451, 1408)
+
+STATEMENTS = [
+    # One row per distinct file content; attachments point at it by hash instead of carrying their own BLOB.
+    """
+    CREATE TABLE CHATBOT_ATTACHMENT_BLOBS (
+        CONTENT_HASH VARCHAR2(64) PRIMARY KEY,
+        CONTENT_SIZE NUMBER NOT NULL,
+        REF_COUNT NUMBER DEFAULT 0 NOT NULL,
+        FILE_CONTENT BLOB NOT NULL,
+        CREATED_TIMESTAMP TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    """
+    ALTER TABLE CHATBOT_ATTACHMENTS ADD (
+        CONTENT_HASH VARCHAR2(64)
+            CONSTRAINT fk_attachment_blob REFERENCES CHATBOT_ATTACHMENT_BLOBS(CONTENT_HASH)
+    )
+    """,
+    # Rows written before this migration keep their inline FILE_CONTENT; new rows leave it NULL.
+    "ALTER TABLE CHATBOT_ATTACHMENTS MODIFY (FILE_CONTENT NULL)",
+    "CREATE INDEX idx_attachments_content_hash ON CHATBOT_ATTACHMENTS (CONTENT_HASH)",
+    # Keeps REF_COUNT right however an attachment goes away, including ON DELETE CASCADE from the
+    # history table. Blobs that drop to zero are removed by ChatStore.purge_unreferenced_blobs().
+    """
+    CREATE OR REPLACE TRIGGER trg_attachments_blob_refcount
+    AFTER DELETE ON CHATBOT_ATTACHMENTS
+    FOR EACH ROW
+    WHEN (OLD.CONTENT_HASH IS NOT NULL)
+    BEGIN
+        UPDATE CHATBOT_ATTACHMENT_BLOBS SET REF_COUNT = REF_COUNT - 1 WHERE CONTENT_HASH = :OLD.CONTENT_HASH;
+    END;
+    """,
+]
@@ -0,0 +1,11 @@
+VERSION = 5
+DESCRIPTION = "Index on CHATBOT_CONVERSATION_HISTORY.MESSAGE_TIMESTAMP for age-based retention purges"
+
+# ORA-00955: index name already exists. ORA-01408: an index on that column list already exists.
+IGNORED_ERROR_CODES = (955, 1408)
+
+STATEMENTS = [
+    # The retention purger looks up messages older than a cutoff in batches; without this each batch
+    # scanned the whole history table.
+    "CREATE INDEX idx_conv_hist_timestamp ON CHATBOT_CONVERSATION_HISTORY (MESSAGE_TIMESTAMP)",
+]
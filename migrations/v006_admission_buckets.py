@@ -0,0 +1,17 @@
+VERSION = 6
+DESCRIPTION = "ADMISSION_BUCKETS: per-caller token buckets shared by all workers (ADMISSION_BACKEND=oracle)"
+
+# ORA-00955: name already used by an existing object (re-run after a partial apply).
+IGNORED_ERROR_CODES = (955,)
+
+STATEMENTS = [
+    # One row per caller (plus one for the global limit); UPDATED_AT is the epoch time of the last refill.
+    # Rows of callers gone quiet are harmless: a bucket read after a long pause is simply full again.
+    """
+    CREATE TABLE ADMISSION_BUCKETS (
+        BUCKET_KEY VARCHAR2(256) PRIMARY KEY,
+        TOKENS NUMBER NOT NULL,
+        UPDATED_AT NUMBER NOT NULL
+    )
+    """,
+]
@@ -2,33 +2,52 @@ import oracledb
 import logging
 from config import Config
 import os
+import threading
+import time
 
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename="chatbot.log",
-    filemode="a",
-    format="%(asctime)s:%(levelname)s:%(name)s:%(message)s"
-)
+# Handlers and levels are configured centrally (logging_config.setup_logging)
 logger = logging.getLogger("oracle_db_utils")
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-logger.addHandler(console_handler)
 
 # Connection pool variable
 _connection_pool = None
+_pool_lock = threading.Lock()
+
+# Acquisition counters for /pool/stats; the pool itself only reports open/busy counts.
+_stats_lock = threading.Lock()
+_acquire_stats = {
+    "acquires": 0,
+    "acquire_failures": 0,
+    "waiting": 0,
+    "total_wait_seconds": 0.0,
+    "max_wait_seconds": 0.0,
+}
 
 # REMOVED: Thick mode client initialization is no longer needed for ATP wallet connections.
 # The oracledb library can handle this natively in "thin" mode.
 
+def _init_session(conn, requested_tag):
+    """Session callback: runs ORACLE_SESSION_INIT_SQL once per new pooled session (not on every acquire)."""
+    cursor = conn.cursor()
+    for statement in filter(None, (s.strip() for s in Config.ORACLE_SESSION_INIT_SQL.split(";"))):
+        cursor.execute(statement)
+
 def init_oracle_connection_pool():
     """Initializes the Oracle connection pool using ATP Wallet credentials."""
     global _connection_pool
-    if _connection_pool is None:
+    with _pool_lock:
+        if _connection_pool is not None:
+            return
         try:
-            logger.info("Initializing Oracle connection pool for ATP database with wallet.")
+            logger.info(
+                f"Initializing Oracle connection pool for ATP database with wallet "
+                f"(min={Config.POOL_MIN}, max={Config.POOL_MAX}, increment={Config.POOL_INCREMENT}, "
+                f"acquire timeout={Config.POOL_ACQUIRE_TIMEOUT_SECONDS}s, stmtcachesize={Config.POOL_STMT_CACHE_SIZE})."
+            )
             # MODIFIED: Connection pool now uses wallet configuration from Config.
             # This implements the connection approach you provided within a resilient connection pool.
+            # Acquisition waits at most POOL_ACQUIRE_TIMEOUT_SECONDS (0 = wait indefinitely) so a burst
+            # fails fast with a clear error instead of blocking request threads forever.
+            timed_wait = Config.POOL_ACQUIRE_TIMEOUT_SECONDS > 0
             _connection_pool = oracledb.create_pool(
                 user=Config.ORACLE_DB_USERNAME,
                 password=Config.ORACLE_DB_PASSWORD,
@@ -36,9 +55,15 @@ def init_oracle_connection_pool():
                 dsn=Config.ORACLE_DB_DSN,
                 wallet_location=Config.ORACLE_DB_WALLET_LOCATION,
                 wallet_password=Config.ORACLE_DB_WALLET_PASSWORD,
-                min=2,
-                max=10,
-                increment=1,
+                min=Config.POOL_MIN,
+                max=Config.POOL_MAX,
+                increment=Config.POOL_INCREMENT,
+                getmode=oracledb.POOL_GETMODE_TIMEDWAIT if timed_wait else oracledb.POOL_GETMODE_WAIT,
+                wait_timeout=int(Config.POOL_ACQUIRE_TIMEOUT_SECONDS * 1000) if timed_wait else 0,
+                stmtcachesize=Config.POOL_STMT_CACHE_SIZE,
+                ping_interval=Config.POOL_PING_INTERVAL_SECONDS,
+                timeout=Config.POOL_IDLE_TIMEOUT_SECONDS,
+                session_callback=_init_session if Config.ORACLE_SESSION_INIT_SQL else None,
             )
             logger.info("Oracle ATP connection pool initialized successfully.")
         except oracledb.Error as e:
@@ -50,14 +75,68 @@ def get_oracle_connection():
     """Gets a connection from the pool."""
     if _connection_pool is None:
         init_oracle_connection_pool()
+    started = time.monotonic()
+    with _stats_lock:
+        _acquire_stats["waiting"] += 1
     try:
         conn = _connection_pool.acquire()
+        waited = time.monotonic() - started
+        with _stats_lock:
+            _acquire_stats["acquires"] += 1
+            _acquire_stats["total_wait_seconds"] += waited
+            _acquire_stats["max_wait_seconds"] = max(_acquire_stats["max_wait_seconds"], waited)
+        if waited > 0.5:
+            logger.warning(f"Waited {waited:.2f}s for an Oracle connection (busy={_connection_pool.busy}, open={_connection_pool.opened}, max={_connection_pool.max})")
         logger.debug("Acquired connection from Oracle ATP pool.")
         return conn
     except oracledb.Error as e:
         error_obj, = e.args
+        with _stats_lock:
+            _acquire_stats["acquire_failures"] += 1
         logger.error(f"Error acquiring connection from Oracle ATP pool: {error_obj.message}", exc_info=True)
         raise ConnectionError(f"Failed to acquire database connection: {error_obj.message}")
+    finally:
+        with _stats_lock:
+            _acquire_stats["waiting"] -= 1
+
+def warm_oracle_connection_pool(target: int = 0) -> int:
+    """
+    Opens `target` sessions up front (default POOL_MIN, at most POOL_MAX) so the first requests do not pay
+    for them; holding them all at once makes the pool grow past its minimum. Returns the open count.
+    """
+    if _connection_pool is None:
+        init_oracle_connection_pool()
+    target = min(target or Config.POOL_MIN, Config.POOL_MAX)
+    connections = []
+    try:
+        for _ in range(target):
+            connections.append(get_oracle_connection())
+    finally:
+        for conn in connections:
+            release_oracle_connection(conn)
+    logger.info(f"Oracle connection pool warmed: {_connection_pool.opened} sessions open.")
+    return _connection_pool.opened
+
+def get_pool_stats() -> dict:
+    """Pool size and acquisition counters (busy/open come from the pool, waits are tracked here)."""
+    with _stats_lock:
+        stats = dict(_acquire_stats)
+    stats["average_wait_seconds"] = round(stats["total_wait_seconds"] / stats["acquires"], 4) if stats["acquires"] else 0.0
+    stats["total_wait_seconds"] = round(stats["total_wait_seconds"], 3)
+    stats["max_wait_seconds"] = round(stats["max_wait_seconds"], 3)
+    pool = _connection_pool
+    stats.update({
+        "initialized": pool is not None,
+        "busy": pool.busy if pool else 0,
+        "open": pool.opened if pool else 0,
+        "min": pool.min if pool else Config.POOL_MIN,
+        "max": pool.max if pool else Config.POOL_MAX,
+        "increment": pool.increment if pool else Config.POOL_INCREMENT,
+        "stmtcachesize": pool.stmtcachesize if pool else Config.POOL_STMT_CACHE_SIZE,
+        "ping_interval": pool.ping_interval if pool else Config.POOL_PING_INTERVAL_SECONDS,
+        "acquire_timeout_seconds": Config.POOL_ACQUIRE_TIMEOUT_SECONDS,
+    })
+    return stats
 
 def release_oracle_connection(conn):
     """Releases a connection back to the pool."""
@@ -80,9 +159,3 @@ def close_oracle_connection_pool():
         except oracledb.Error as e:
             error_obj, = e.args
             logger.error(f"Error closing Oracle ATP connection pool: {error_obj.message}", exc_info=True)
-
-# Initialize the pool on module import
-try:
-    init_oracle_connection_pool()
-except ConnectionError:
-    logger.critical("Application will not function without Oracle ATP DB connection.")
\ No newline at end of file
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from config import Config
+import oracle_db_utils
+
+logger = logging.getLogger("prewarm")
+
+
+class PrewarmState:
+    """
+    Progress of the startup prewarm, reported by /ready. The worker counts as ready once the prewarm
+    has finished, whether or not every step succeeded: a failed step only means the first requests
+    pay for that setup themselves, which is no reason to keep the worker out of rotation.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.status = "pending"
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("complete", "disabled")
+
+    def begin(self) -> None:
+        with self._lock:
+            self.status = "running"
+            self.started_at = time.time()
+
+    def finish(self, status: str = "complete") -> None:
+        with self._lock:
+            self.status = status
+            self.finished_at = time.time()
+
+    def record(self, step: str, ok: bool, seconds: float, detail: Any = None) -> None:
+        with self._lock:
+            self.steps[step] = {"ok": ok, "seconds": round(seconds, 3), "detail": detail}
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            snapshot = {"status": self.status, "steps": {name: dict(step) for name, step in self.steps.items()}}
+            if self.started_at is not None:
+                snapshot["duration_seconds"] = round((self.finished_at or time.time()) - self.started_at, 3)
+            return snapshot
+
+
+prewarm_state = PrewarmState()
+
+
+def _run_step(name: str, step: Callable[[], Any]) -> bool:
+    started = time.monotonic()
+    try:
+        detail = step()
+    except Exception as e:
+        logger.error(f"Prewarm step '{name}' failed: {str(e)}", exc_info=True)
+        prewarm_state.record(name, False, time.monotonic() - started, str(e))
+        return False
+    seconds = time.monotonic() - started
+    logger.info(f"Prewarm step '{name}' done in {seconds:.2f}s: {detail}")
+    prewarm_state.record(name, True, seconds, detail)
+    return True
+
+
+def _agent_streams():
+    return [stream.strip() for stream in Config.PREWARM_AGENT_STREAMS.split(",") if stream.strip()]
+
+
+def run_prewarm(get_agent: Callable[[str], Any], uses_oracle: bool) -> Dict[str, Any]:
+    """
+    Pays the first-request costs before traffic arrives. These steps run concurrently:
+      - agents:          build the agents (LLM clients, compiled graphs) and load their QUERY_CONTEXTS
+                         rows and context queries into the context cache
+      - oracle_pool:     open PREWARM_POOL_TARGET pool sessions (default POOL_MIN)
+      - llm_connections: open PREWARM_LLM_CONNECTIONS keep-alive connections to Azure OpenAI
+      - bip_connections: open PREWARM_BIP_CONNECTIONS keep-alive connections to the BIP host
+    Then, if PREWARM_QUESTION is set, that question runs end to end once per agent stream. Blocking;
+    the lifespan runs it in a worker thread. Returns the state snapshot.
+    """
+    prewarm_state.begin()
+    logger.info("Startup prewarm started.")
+
+    def warm_agents():
+        contexts = {}
+        for stream in _agent_streams():
+            agent = get_agent(stream)
+            contexts[stream] = agent.context_matcher.preload(stream)
+        return {"contexts": contexts}
+
+    def warm_pool():
+        return {"open": oracle_db_utils.warm_oracle_connection_pool(Config.PREWARM_POOL_TARGET)}
+
+    def warm_llm():
+        from llm_utils import warm_llm_connections
+        return {"connections": warm_llm_connections(min(Config.PREWARM_LLM_CONNECTIONS, Config.LLM_MAX_CONNECTIONS))}
+
+    def warm_bip():
+        from tools.base_query_tools import warm_bip_connections
+        return {"connections": warm_bip_connections(min(Config.PREWARM_BIP_CONNECTIONS, Config.BIP_MAX_CONNECTIONS))}
+
+    steps = {"agents": warm_agents}
+    # Only Oracle-backed stores use the pool; a fully SQLite-backed deployment has none to grow.
+    if uses_oracle and Config.POOL_WARM_ON_STARTUP:
+        steps["oracle_pool"] = warm_pool
+    if Config.PREWARM_LLM_CONNECTIONS > 0:
+        steps["llm_connections"] = warm_llm
+    if Config.PREWARM_BIP_CONNECTIONS > 0:
+        steps["bip_connections"] = warm_bip
+    with ThreadPoolExecutor(max_workers=len(steps), thread_name_prefix="prewarm") as executor:
+        for name, step in steps.items():
+            executor.submit(_run_step, name, step)
+
+    if Config.PREWARM_QUESTION:
+        for stream in _agent_streams():
+            def ask(stream=stream):
+                result = get_agent(stream).run(Config.PREWARM_QUESTION, None, "natural_language", stream, Config.REQUEST_TIMEOUT_SECONDS)
+                if result.get("error"):
+                    raise RuntimeError(result["error"])
+                return {"question_type": result.get("question_type"), "thread_id": result.get("thread_id")}
+            _run_step(f"question:{stream}", ask)
+
+    prewarm_state.finish()
+    snapshot = prewarm_state.snapshot()
+    logger.info(f"Startup prewarm finished in {snapshot.get('duration_seconds')}s.")
+    return snapshot
@@ -0,0 +1,70 @@
+import threading
+import time
+from typing import Optional
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Holds up to `capacity` tokens and refills continuously at
+    `refill_rate` tokens per second. Callers either block until enough tokens are available
+    (acquire) or ask how long they would have to wait (try_acquire).
+    """
+
+    def __init__(self, capacity: float, refill_rate: float):
+        if capacity <= 0 or refill_rate <= 0:
+            raise ValueError("capacity and refill_rate must be positive")
+        self.capacity = float(capacity)
+        self.refill_rate = float(refill_rate)
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+        self.waiting = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.refill_rate)
+        self._updated = now
+
+    def available(self) -> float:
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def try_acquire(self, amount: float) -> float:
+        """Takes `amount` tokens if available and returns 0.0; otherwise returns the seconds until they would be."""
+        amount = min(float(amount), self.capacity)
+        with self._condition:
+            self._refill()
+            if self._tokens >= amount:
+                self._tokens -= amount
+                return 0.0
+            return (amount - self._tokens) / self.refill_rate
+
+    def acquire(self, amount: float, timeout: Optional[float] = None) -> bool:
+        """Blocks until `amount` tokens are taken. Returns False if `timeout` seconds pass first."""
+        amount = min(float(amount), self.capacity)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            self.waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    if self._tokens >= amount:
+                        self._tokens -= amount
+                        return True
+                    wait = (amount - self._tokens) / self.refill_rate
+                    if deadline is not None:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return False
+                        wait = min(wait, remaining)
+                    self._condition.wait(wait)
+            finally:
+                self.waiting -= 1
+
+    def adjust(self, delta: float) -> None:
+        """Returns (positive delta) or charges (negative delta) tokens after the fact, e.g. once real usage is known."""
+        with self._condition:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + delta)
+            self._condition.notify_all()
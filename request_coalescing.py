@@ -0,0 +1,114 @@
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger("request_coalescing")
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case- and whitespace-insensitive form of a question, so "On hand for X " and "on hand for x" coalesce."""
+    return _WHITESPACE_RE.sub(" ", question or "").strip().casefold()
+
+
+def request_fingerprint(question: str, agent_stream: str, thread_id: Optional[str], format_preference: str,
+                        export_format: str = "xlsx", tenant: Optional[str] = None) -> str:
+    """Identifies requests that would produce the same answer: same question, stream, thread, formats and tenant."""
+    parts = (normalize_question(question), agent_stream or "", thread_id or "", format_preference or "", export_format or "", (tenant or "").lower())
+    return hashlib.sha1("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Shares one in-flight execution between concurrent callers with the same key. The first caller
+    starts the work; later callers await the same task until it finishes. The entry is dropped as
+    soon as the task completes, so only requests that overlap in time are coalesced.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, Tuple[asyncio.Future, Optional[str]]] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[..., Awaitable[Any]], *args: Any, tag: Optional[str] = None) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared) where shared is True if the result came from another caller's execution.
+        A caller whose `tag` differs from the in-flight execution's gets IdempotencyConflict instead of joining it.
+        """
+        entry = self._inflight.get(key)
+        shared = entry is not None
+        if shared:
+            task, running_tag = entry
+            if running_tag != tag:
+                raise IdempotencyConflict("The Idempotency-Key is in use by a different request that is still running")
+            self.coalesced += 1
+            logger.info(f"Coalescing duplicate request {key[:12]} onto the in-flight execution")
+        else:
+            task = asyncio.ensure_future(fn(*args))
+            self._inflight[key] = (task, tag)
+            task.add_done_callback(lambda t, k=key: self._finished(k, t))
+        # shield: a disconnecting caller must not cancel the execution the other callers are waiting on
+        return await asyncio.shield(task), shared
+
+    def _finished(self, key: str, task: asyncio.Future) -> None:
+        if self._inflight.get(key, (None, None))[0] is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            # Retrieved here so an execution whose callers all went away does not log "exception was never retrieved"
+            logger.debug(f"In-flight request {key[:12]} failed: {task.exception()}")
+
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+
+class IdempotencyConflict(Exception):
+    """Raised when an idempotency key is reused for a different request."""
+
+
+class IdempotencyCache:
+    """
+    Remembers the response sent for a client-supplied Idempotency-Key so a retried POST gets the
+    stored response instead of running the pipeline (and saving the conversation) a second time.
+    Entries expire after `ttl_seconds`; the oldest are evicted beyond `max_entries`. Kept per
+    process: retries are expected to reach the same worker within the TTL in the common case, and
+    a miss only costs a re-run.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[str, float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict_expired(self, now: float) -> None:
+        expired = [key for key, (_, expires_at, _) in self._entries.items() if expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+
+    def get(self, key: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            entry = self._entries.get(key)
+            if entry is None or entry[1] <= now:
+                return None
+            if entry[0] != fingerprint:
+                raise IdempotencyConflict(f"Idempotency-Key {key} was already used for a different request")
+            return entry[2]
+
+    def put(self, key: str, fingerprint: str, response: Dict[str, Any]) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._evict_expired(now)
+            self._entries[key] = (fingerprint, now + self.ttl_seconds, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
@@ -0,0 +1,48 @@
+import time
+from typing import Optional
+
+# Below this many seconds there is no point starting another LLM or BIP call.
+MIN_USEFUL_SECONDS = 1.0
+
+
+class DeadlineExceeded(Exception):
+    """Raised when the request's time budget is used up before a stage could start."""
+
+    def __init__(self, stage: str, budget: float):
+        self.stage = stage
+        self.budget = budget
+        super().__init__(f"Request time budget of {budget:.0f}s exhausted before {stage}")
+
+
+class Deadline:
+    """
+    End-to-end time budget for one request. Created at the API layer, carried through the
+    graph in AgentState, and used by every node to derive the timeout of its own LLM/BIP call.
+    """
+
+    def __init__(self, seconds: float):
+        self.budget = float(seconds)
+        self.expires_at = time.monotonic() + self.budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def __repr__(self) -> str:
+        return f"Deadline(budget={self.budget:.1f}s, remaining={self.remaining():.1f}s)"
+
+    def expired(self) -> bool:
+        return self.remaining() < MIN_USEFUL_SECONDS
+
+    def timeout(self, stage: str, cap: Optional[float] = None) -> float:
+        """Seconds the next call of `stage` may take: the remaining budget, capped at `cap`."""
+        remaining = self.remaining()
+        if remaining < MIN_USEFUL_SECONDS:
+            raise DeadlineExceeded(stage, self.budget)
+        return min(cap, remaining) if cap is not None else remaining
+
+
+def stage_timeout(deadline: Optional[Deadline], stage: str, cap: Optional[float] = None) -> Optional[float]:
+    """Timeout for a stage when a deadline may or may not be set (None means no overall budget)."""
+    if deadline is None:
+        return cap
+    return deadline.timeout(stage, cap)
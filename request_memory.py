@@ -0,0 +1,210 @@
+import logging
+import mmap
+import os
+import shutil
+import tempfile
+from io import BytesIO
+from typing import BinaryIO, Callable, Dict, Iterator, Optional, Union
+
+import pandas as pd
+
+from config import Config
+
+logger = logging.getLogger("request_memory")
+
+# A parsed DataFrame takes several times the size of its CSV (object columns of Python strings),
+# so a result is spilled once its CSV alone uses a quarter of the request's budget.
+FRAME_EXPANSION = 4
+# Spilled content is handed to compressors and LOBs in pieces of this size, never copied whole
+WRITE_CHUNK_BYTES = 1024 * 1024
+
+
+def _mb(nbytes: int) -> str:
+    return f"{nbytes / (1024 * 1024):.1f}MB"
+
+
+class MemoryBudget:
+    """
+    Memory budget for one request. Created at the API layer and carried through the graph in
+    AgentState like the Deadline; each stage records the size of what it holds (report bytes,
+    parsed frame, export file), and a stage going over the budget is logged with its name.
+    """
+
+    def __init__(self, limit_bytes: int, label: str = ""):
+        self.limit_bytes = int(limit_bytes)
+        self.label = label
+        self.stages: Dict[str, int] = {}
+        self.violations: Dict[str, int] = {}
+
+    @property
+    def spill_threshold(self) -> int:
+        """CSV size above which a result goes to a temp file instead of memory."""
+        return max(1, self.limit_bytes // FRAME_EXPANSION)
+
+    def record(self, stage: str, nbytes: int) -> bool:
+        """Records what `stage` holds; returns True (and logs once per stage) if it exceeds the budget."""
+        self.stages[stage] = max(self.stages.get(stage, 0), int(nbytes))
+        if nbytes <= self.limit_bytes:
+            return False
+        if stage not in self.violations:
+            logger.warning(
+                f"Request memory budget of {_mb(self.limit_bytes)} exceeded in stage '{stage}': {_mb(nbytes)}"
+                f"{' (' + self.label + ')' if self.label else ''}"
+            )
+        self.violations[stage] = max(self.violations.get(stage, 0), int(nbytes))
+        return True
+
+    def summary(self) -> str:
+        return ", ".join(f"{stage} {_mb(nbytes)}" for stage, nbytes in self.stages.items()) or "nothing recorded"
+
+    def __repr__(self) -> str:
+        return f"MemoryBudget(limit={_mb(self.limit_bytes)}, stages={{{self.summary()}}})"
+
+
+def record_stage(budget: Optional[MemoryBudget], stage: str, nbytes: int) -> bool:
+    """MemoryBudget.record when a budget may or may not be set (None means no budget)."""
+    return budget.record(stage, nbytes) if budget is not None else False
+
+
+def frame_bytes(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=True, deep=True).sum())
+
+
+def iter_chunks(data: Union[bytes, mmap.mmap], chunk_bytes: int = WRITE_CHUNK_BYTES) -> Iterator[memoryview]:
+    """Slices of bytes or of a memory-mapped file, for writing it on without copying it."""
+    with memoryview(data) as view:
+        for start in range(0, len(view), chunk_bytes):
+            yield view[start:start + chunk_bytes]
+
+
+def spill_file(suffix: str, spill_dir: Optional[str] = None):
+    """A new named temp file (opened "wb", not deleted on close) in spill_dir, default REQUEST_SPILL_DIR or the system temp dir."""
+    spill_dir = spill_dir or Config.REQUEST_SPILL_DIR or None
+    if spill_dir:
+        os.makedirs(spill_dir, exist_ok=True)
+    return tempfile.NamedTemporaryFile(prefix="fusion-assist-", suffix=suffix, dir=spill_dir, delete=False)
+
+
+class SpilledFile:
+    """
+    Content kept in a temp file and memory-mapped instead of held as bytes: a spilled report or an
+    export built from one. close() unmaps it and deletes the file unless its ownership was passed
+    on with detach().
+    """
+
+    def __init__(self, path: str, size: int):
+        self.path = path
+        self.size = size
+        self._file = None
+        self._buffer: Optional[mmap.mmap] = None
+        self._detached = False
+
+    @property
+    def buffer(self) -> Union[mmap.mmap, bytes]:
+        """The file's bytes, memory-mapped (pages are read from disk as they are touched)."""
+        if self.size == 0:
+            return b""
+        if self._buffer is None:
+            self._file = open(self.path, "rb")
+            self._buffer = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._buffer
+
+    def detach(self, target_path: str) -> str:
+        """Moves the file to target_path for a new owner (e.g. the result cache); close() then leaves it alone."""
+        self._unmap()
+        shutil.move(self.path, target_path)
+        self.path = target_path
+        self._detached = True
+        return target_path
+
+    def _unmap(self) -> None:
+        if self._buffer is not None:
+            self._buffer.close()
+            self._buffer = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def close(self) -> None:
+        self._unmap()
+        if not self._detached:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.path}, {_mb(self.size)})"
+
+
+def write_spilled(suffix: str, write: Callable[[BinaryIO], None]) -> SpilledFile:
+    """Runs write(file) on a new spill file and returns the result as a SpilledFile; the file is removed if write raises."""
+    output = spill_file(suffix)
+    try:
+        with output:
+            write(output)
+    except BaseException:
+        try:
+            os.remove(output.name)
+        except OSError:
+            pass
+        raise
+    return SpilledFile(output.name, os.path.getsize(output.name))
+
+
+class SpilledCSV(SpilledFile):
+    """A spilled CSV result. Downstream stages read it in chunks (iter_frames) or hand the mapped buffer to a compressor."""
+
+    def read_frame(self, nrows: Optional[int] = None) -> pd.DataFrame:
+        return pd.read_csv(self.path, nrows=nrows)
+
+    def iter_frames(self, chunksize: Optional[int] = None) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(self.path, chunksize=chunksize or Config.SPILL_CHUNK_ROWS) as reader:
+            for chunk in reader:
+                yield chunk
+
+    def head_text(self, nrows: int) -> str:
+        """The header and first nrows rows as CSV text (re-written by pandas so quoted newlines are handled)."""
+        return self.read_frame(nrows=nrows).to_csv(index=False)
+
+
+class SpillWriter:
+    """
+    Collects streamed report bytes in memory and switches to a temp file in `spill_dir` once they
+    pass `threshold` bytes (None: never). finish() returns the bytes, or a SpilledCSV.
+    """
+
+    def __init__(self, threshold: Optional[int] = None, spill_dir: Optional[str] = None):
+        self.threshold = threshold
+        self.spill_dir = spill_dir or Config.REQUEST_SPILL_DIR or None
+        self.size = 0
+        self._memory = BytesIO()
+        self._file = None
+
+    def write(self, data: bytes) -> None:
+        if not data:
+            return
+        self.size += len(data)
+        if self._file is not None:
+            self._file.write(data)
+            return
+        self._memory.write(data)
+        if self.threshold is not None and self.size > self.threshold:
+            self._file = spill_file(".csv", self.spill_dir)
+            self._file.write(self._memory.getbuffer())
+            self._memory = BytesIO()
+            logger.info(f"Result passed {_mb(self.threshold)}; spilling it to {self._file.name}")
+
+    def finish(self) -> Union[bytes, SpilledCSV]:
+        if self._file is None:
+            return self._memory.getvalue()
+        self._file.close()
+        return SpilledCSV(self._file.name, self.size)
+
+    def abort(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            try:
+                os.remove(self._file.name)
+            except OSError:
+                pass
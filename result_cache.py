@@ -0,0 +1,401 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from io import StringIO
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import pandas as pd
+
+from config import Config
+
+try:
+    import pyarrow  # noqa: F401  (DataFrame.to_feather / pd.read_feather)
+except ImportError:  # frames are spilled as CSV instead, which is slower to reload and loses dtypes
+    pyarrow = None
+
+logger = logging.getLogger("result_cache")
+
+# Data-only formats: spill files may come from other workers sharing the directory, so nothing that can
+# execute code on load (pickle) is ever read from it
+_SPILL_EXTENSIONS = (".feather", ".csv")
+# Spill files of other workers (or of a previous run) are cleaned up at most this often
+_SWEEP_INTERVAL_SECONDS = 60
+
+
+class ResultPending(Exception):
+    """Raised for a result whose rows are still being fetched by a background export job."""
+
+
+class _CachedResult:
+    def __init__(self, result_id: str, agent_stream: Optional[str], thread_id: Optional[str], total_rows: Optional[int], ttl: float):
+        self.result_id = result_id
+        self.agent_stream = agent_stream
+        self.thread_id = thread_id
+        self.total_rows = total_rows
+        self.expires_at = time.time() + ttl
+        self.data: Union[str, pd.DataFrame, None] = None  # CSV text as received, parsed on first page request
+        self.memory_bytes = 0
+        self.spill_path: Optional[str] = None
+        self.disk_bytes = 0
+        self.pending = True
+        # The row order of the most recent sort, so paging through a sorted result sorts once
+        self.sort_key: Optional[str] = None
+        self.sort_order = None
+        self.lock = threading.Lock()
+
+
+def _memory_size(data) -> int:
+    if isinstance(data, pd.DataFrame):
+        return int(data.memory_usage(index=True, deep=True).sum())
+    return len(data) if data is not None else 0
+
+
+def parse_sort(sort: Optional[str], columns: List[str]) -> List[Tuple[str, bool]]:
+    """Parses "COL", "-COL" or "COL:desc,COL2" into [(column, ascending)]; column names match case-insensitively."""
+    by_name = {str(col).lower(): col for col in columns}
+    keys = []
+    for item in filter(None, (part.strip() for part in (sort or "").split(","))):
+        ascending = True
+        if item.startswith("-"):
+            item, ascending = item[1:], False
+        elif ":" in item:
+            item, _, direction = item.rpartition(":")
+            if direction.lower() not in ("asc", "desc"):
+                raise ValueError(f"Invalid sort direction '{direction}'; use 'asc' or 'desc'")
+            ascending = direction.lower() == "asc"
+        column = by_name.get(item.strip().lower())
+        if column is None:
+            raise ValueError(f"Unknown sort column '{item}'")
+        keys.append((column, ascending))
+    return keys
+
+
+class ResultCache:
+    """
+    Keeps the executed result of recent questions so clients can page through it (/results/{id})
+    without re-running the LLM pipeline or the BIP report. Results live in memory up to
+    `max_memory_bytes`; beyond that the least recently used are spilled to files in `spill_dir`
+    (Feather frames, or CSV without pyarrow and for the CSV as received) and read back on access. Spill files are capped at
+    `max_disk_bytes`, oldest evicted first, and everything expires after `ttl_seconds`.
+
+    Entries are per worker. With write_through every result is also written to `spill_dir` when
+    it is stored, so any worker sharing that directory can serve it.
+    """
+
+    def __init__(self, max_memory_bytes: int, max_disk_bytes: int, ttl_seconds: float, spill_dir: str, write_through: bool = False):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl_seconds = ttl_seconds
+        self.spill_dir = spill_dir or os.path.join(tempfile.gettempdir(), "fusion-assist-results")
+        self.write_through = write_through
+        self._entries: "OrderedDict[str, _CachedResult]" = OrderedDict()  # least recently used first
+        self._lock = threading.Lock()
+        self._memory_bytes = 0
+        self._disk_bytes = 0
+        self._last_sweep = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+        self.reloads = 0
+
+    # --- storing -------------------------------------------------------------------------------
+
+    def register(self, agent_stream: Optional[str] = None, thread_id: Optional[str] = None, total_rows: Optional[int] = None) -> str:
+        """Reserves a result ID whose rows arrive later (put); page requests until then raise ResultPending."""
+        result_id = uuid.uuid4().hex
+        with self._lock:
+            self._entries[result_id] = _CachedResult(result_id, agent_stream, thread_id, total_rows, self.ttl_seconds)
+        return result_id
+
+    def add(self, data: Union[str, pd.DataFrame], agent_stream: Optional[str] = None, thread_id: Optional[str] = None,
+            total_rows: Optional[int] = None) -> str:
+        result_id = self.register(agent_stream, thread_id, total_rows)
+        self.put(result_id, data)
+        return result_id
+
+    def put(self, result_id: str, data: Union[str, pd.DataFrame]) -> None:
+        """Stores the rows (CSV text or a DataFrame) of a registered result."""
+        if isinstance(data, pd.DataFrame) and not data.index.equals(pd.RangeIndex(len(data))):
+            data = data.reset_index(drop=True)
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is None:
+                logger.debug(f"Result {result_id} expired before its rows arrived; not caching")
+                return
+            entry.data = data
+            entry.memory_bytes = _memory_size(data)
+            entry.pending = False
+            if isinstance(data, pd.DataFrame):
+                entry.total_rows = len(data)
+            self._memory_bytes += entry.memory_bytes
+            self._entries.move_to_end(result_id)
+        if self.write_through:
+            self._spill(entry, drop_from_memory=False)
+        self._enforce_limits()
+        logger.debug(f"Cached result {result_id} ({entry.memory_bytes} bytes, {entry.total_rows} rows)")
+
+    def put_spilled(self, result_id: str, spilled) -> None:
+        """Stores a registered result from a request_memory.SpilledCSV by moving its file into spill_dir (no copy in memory)."""
+        with self._lock:
+            entry = self._entries.get(result_id)
+        if entry is None:
+            return
+        try:
+            os.makedirs(self.spill_dir, exist_ok=True)
+            path = spilled.detach(os.path.join(self.spill_dir, result_id + ".csv"))
+        except Exception as e:
+            logger.error(f"Could not move spilled result {result_id} into {self.spill_dir}: {str(e)}", exc_info=True)
+            self.discard(result_id)
+            return
+        with self._lock:
+            entry.spill_path, entry.disk_bytes, entry.pending = path, spilled.size, False
+            self._disk_bytes += spilled.size
+            self._entries.move_to_end(result_id)
+        self._enforce_limits()
+        logger.debug(f"Cached spilled result {result_id} ({spilled.size} bytes on disk)")
+
+    def discard(self, result_id: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(result_id, None)
+        if entry is not None:
+            self._drop(entry)
+
+    # --- reading -------------------------------------------------------------------------------
+
+    def get_page(self, result_id: str, offset: int = 0, limit: int = 100, sort: Optional[str] = None) -> Dict[str, Any]:
+        """
+        One page of a cached result as {columns, rows, total_rows, offset, limit, next_offset, sort}.
+        Raises KeyError for unknown or expired IDs, ResultPending while the rows are still being
+        fetched and ValueError for an invalid sort.
+        """
+        entry = self._lookup(result_id)
+        with entry.lock:
+            df = self._frame(entry)
+            sort_keys = parse_sort(sort, list(df.columns))
+            if sort_keys:
+                sort_key = json.dumps(sort_keys, default=str)
+                if entry.sort_key != sort_key:
+                    # Stable sort; the frames have a RangeIndex, so the sorted index is the row positions
+                    entry.sort_order = df.sort_values(
+                        by=[col for col, _ in sort_keys], ascending=[asc for _, asc in sort_keys],
+                        kind="mergesort", na_position="last"
+                    ).index.to_numpy()
+                    entry.sort_key = sort_key
+                page = df.iloc[entry.sort_order[offset:offset + limit]]
+            else:
+                page = df.iloc[offset:offset + limit]
+        # Reading a result may have parsed or reloaded it; a result larger than the whole budget is spilled again right away
+        self._enforce_limits()
+        total_rows = len(df)
+        end = offset + len(page)
+        return {
+            "result_id": result_id,
+            "columns": [str(col) for col in df.columns],
+            "rows": json.loads(page.to_json(orient="values", date_format="iso")),
+            "total_rows": total_rows,
+            "offset": offset,
+            "limit": limit,
+            "next_offset": end if end < total_rows else None,
+            "sort": sort or None,
+        }
+
+    def _lookup(self, result_id: str) -> _CachedResult:
+        self._sweep()
+        with self._lock:
+            entry = self._entries.get(result_id)
+            if entry is not None and entry.expires_at < time.time():
+                del self._entries[result_id]
+                self._drop_locked(entry)
+                entry = None
+            if entry is None:
+                entry = self._adopt_spill_file(result_id)
+            if entry is None:
+                self.misses += 1
+                raise KeyError(result_id)
+            if entry.pending:
+                raise ResultPending(result_id)
+            self.hits += 1
+            self._entries.move_to_end(result_id)
+            return entry
+
+    def _adopt_spill_file(self, result_id: str) -> Optional[_CachedResult]:
+        """Picks up a result written to the shared spill directory by another worker (lock held)."""
+        if not all(c in "0123456789abcdef" for c in result_id):
+            return None
+        for extension in _SPILL_EXTENSIONS:
+            path = os.path.join(self.spill_dir, result_id + extension)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if stat.st_mtime + self.ttl_seconds < time.time():
+                return None
+            entry = _CachedResult(result_id, None, None, None, self.ttl_seconds)
+            entry.expires_at = stat.st_mtime + self.ttl_seconds
+            entry.spill_path, entry.disk_bytes, entry.pending = path, stat.st_size, False
+            self._entries[result_id] = entry
+            self._disk_bytes += entry.disk_bytes
+            logger.debug(f"Adopted spilled result {result_id} from {path}")
+            return entry
+        return None
+
+    def _frame(self, entry: _CachedResult) -> pd.DataFrame:
+        """The result as a DataFrame, reading it back from disk or parsing the CSV as needed (entry lock held)."""
+        data = entry.data
+        if data is None:
+            if entry.spill_path is None:
+                raise KeyError(entry.result_id)
+            started = time.monotonic()
+            if entry.spill_path.endswith(".feather"):
+                data = pd.read_feather(entry.spill_path)
+            else:
+                data = pd.read_csv(entry.spill_path)
+            self.reloads += 1
+            logger.debug(f"Reloaded result {entry.result_id} from {entry.spill_path} in {time.monotonic() - started:.3f}s")
+        elif isinstance(data, str):
+            data = pd.read_csv(StringIO(data))
+        if data is not entry.data:
+            size = _memory_size(data)
+            with self._lock:
+                self._memory_bytes += size - entry.memory_bytes
+                entry.data, entry.memory_bytes, entry.total_rows = data, size, len(data)
+                # A frame re-read from a CSV spill file is faster to reload from Feather next time
+                if pyarrow is not None and entry.spill_path is not None and entry.spill_path.endswith(".csv"):
+                    self._disk_bytes -= entry.disk_bytes
+                    self._remove_file(entry.spill_path)
+                    entry.spill_path, entry.disk_bytes = None, 0
+        return data
+
+    # --- limits and spilling ---------------------------------------------------------------------
+
+    def _enforce_limits(self) -> None:
+        """Spills least recently used results until memory fits; evicts oldest spill files until disk fits."""
+        with self._lock:
+            candidates = [e for e in self._entries.values() if e.data is not None] \
+                if self._memory_bytes > self.max_memory_bytes else []
+        for victim in candidates:
+            if self._memory_bytes <= self.max_memory_bytes:
+                break
+            if not victim.lock.acquire(blocking=False):
+                # Being read right now; spill the next one instead
+                continue
+            try:
+                self._spill(victim, drop_from_memory=True)
+            finally:
+                victim.lock.release()
+        with self._lock:
+            while self._disk_bytes > self.max_disk_bytes:
+                victim = next((e for e in self._entries.values() if e.spill_path is not None), None)
+                if victim is None:
+                    break
+                del self._entries[victim.result_id]
+                logger.info(f"Result cache disk limit reached; evicting result {victim.result_id}")
+                self._drop_locked(victim)
+
+    def _spill(self, entry: _CachedResult, drop_from_memory: bool) -> None:
+        data = entry.data
+        if data is None:
+            return
+        if entry.spill_path is None:
+            extension = ".feather" if isinstance(data, pd.DataFrame) and pyarrow is not None else ".csv"
+            path = os.path.join(self.spill_dir, entry.result_id + extension)
+            try:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                # Written under a temporary name so other workers never adopt a partial file
+                temp_path = f"{path}.{os.getpid()}.tmp"
+                if isinstance(data, pd.DataFrame) and pyarrow is not None:
+                    data.to_feather(temp_path)
+                elif isinstance(data, pd.DataFrame):
+                    data.to_csv(temp_path, index=False)
+                else:
+                    with open(temp_path, "w", encoding="utf-8") as spill_file:
+                        spill_file.write(data)
+                os.replace(temp_path, path)
+            except Exception as e:
+                logger.error(f"Could not spill result {entry.result_id} to {self.spill_dir}: {str(e)}", exc_info=True)
+                if drop_from_memory:
+                    self.discard(entry.result_id)
+                return
+            size = os.path.getsize(path)
+            with self._lock:
+                entry.spill_path, entry.disk_bytes = path, size
+                self._disk_bytes += size
+                self.spills += 1
+        if drop_from_memory:
+            with self._lock:
+                self._memory_bytes -= entry.memory_bytes
+                entry.data, entry.memory_bytes = None, 0
+            logger.debug(f"Spilled result {entry.result_id} to {entry.spill_path}")
+
+    def _drop(self, entry: _CachedResult) -> None:
+        with self._lock:
+            self._drop_locked(entry)
+
+    def _drop_locked(self, entry: _CachedResult) -> None:
+        self._memory_bytes -= entry.memory_bytes
+        self._disk_bytes -= entry.disk_bytes
+        if entry.spill_path is not None:
+            self._remove_file(entry.spill_path)
+        entry.data, entry.memory_bytes, entry.spill_path, entry.disk_bytes = None, 0, None, 0
+
+    @staticmethod
+    def _remove_file(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _sweep(self) -> None:
+        """Drops expired results and stale spill files (also those left by other workers)."""
+        now = time.time()
+        if now - self._last_sweep < _SWEEP_INTERVAL_SECONDS:
+            return
+        self._last_sweep = now
+        with self._lock:
+            for result_id in [rid for rid, e in self._entries.items() if e.expires_at < now]:
+                self._drop_locked(self._entries.pop(result_id))
+        try:
+            names = os.listdir(self.spill_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.spill_dir, name)
+            try:
+                if os.stat(path).st_mtime + self.ttl_seconds < now:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_memory = sum(1 for e in self._entries.values() if e.data is not None)
+            spilled = sum(1 for e in self._entries.values() if e.data is None and e.spill_path is not None)
+            pending = sum(1 for e in self._entries.values() if e.pending)
+            return {
+                "results": len(self._entries),
+                "in_memory": in_memory,
+                "spilled": spilled,
+                "pending": pending,
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "spills": self.spills,
+                "reloads": self.reloads,
+            }
+
+
+result_cache = ResultCache(
+    max_memory_bytes=Config.RESULT_CACHE_MAX_MEMORY_MB * 1024 * 1024,
+    max_disk_bytes=Config.RESULT_CACHE_MAX_DISK_MB * 1024 * 1024,
+    ttl_seconds=Config.RESULT_CACHE_TTL_SECONDS,
+    spill_dir=Config.RESULT_CACHE_SPILL_DIR,
+    write_through=Config.RESULT_CACHE_WRITE_THROUGH,
+)
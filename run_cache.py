@@ -0,0 +1,63 @@
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+logger = logging.getLogger("run_cache")
+
+
+class RunCache:
+    """
+    Memoizes lookups that come out the same for every question of one batch: the QUERY_CONTEXTS
+    rows of a stream, context queries, question classifications, context matches and generated
+    SQL. Created per /batch request and carried through the graph in AgentState; concurrent
+    lookups of the same key wait for the first one instead of repeating it.
+    """
+
+    def __init__(self):
+        self._values: Dict[tuple, Any] = {}
+        self._pending: Dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, namespace: str, key: Hashable, compute: Callable[[], Any],
+                       keep: Optional[Callable[[Any], bool]] = None) -> Any:
+        """
+        Returns the cached value of (namespace, key), computing it once. Exceptions are not cached,
+        nor are values for which keep(value) is False (e.g. the empty list of a failed lookup).
+        """
+        cache_key = (namespace, key)
+        while True:
+            with self._lock:
+                if cache_key in self._values:
+                    self.hits += 1
+                    return self._values[cache_key]
+                event = self._pending.get(cache_key)
+                if event is None:
+                    event = self._pending[cache_key] = threading.Event()
+                    self.misses += 1
+                    break
+            # Another question of the batch is computing it; if that fails, try ourselves
+            event.wait()
+        try:
+            value = compute()
+            if keep is None or keep(value):
+                with self._lock:
+                    self._values[cache_key] = value
+            return value
+        finally:
+            with self._lock:
+                self._pending.pop(cache_key, None)
+            event.set()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._values), "hits": self.hits, "misses": self.misses}
+
+
+def cached(run_cache: Optional[RunCache], namespace: str, key: Hashable, compute: Callable[[], Any],
+           keep: Optional[Callable[[Any], bool]] = None) -> Any:
+    """RunCache.get_or_compute when a run cache may or may not be set (None means compute every time)."""
+    if run_cache is None:
+        return compute()
+    return run_cache.get_or_compute(namespace, key, compute, keep)
@@ -0,0 +1,855 @@
+import base64
+import hashlib
+import logging
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+from config import Config
+from request_memory import WRITE_CHUNK_BYTES, SpilledFile, iter_chunks
+from storage.compression import compress_blob, compress_spilled_blob, compress_text, decompress_blob, decompress_text
+
+# Import Oracle DB utilities and oracledb for error handling
+import oracle_db_utils
+import oracledb
+
+try:
+    import xxhash
+except ImportError:  # content hashes fall back to blake2b (same digest size, different prefix)
+    xxhash = None
+
+logger = logging.getLogger("chat_store")
+
+
+def _content_view(file_content: Union[bytes, SpilledFile]):
+    """The attachment's bytes; for an export kept on disk, its memory map (hashed and sized without reading it into memory)."""
+    return file_content.buffer if isinstance(file_content, SpilledFile) else file_content
+
+
+@contextmanager
+def _stored_blob(file_content: Union[bytes, SpilledFile]) -> Iterator[Any]:
+    """The value for FILE_CONTENT (compressed when enabled). A compressed copy of an on-disk export is a spill file removed on exit."""
+    if not isinstance(file_content, SpilledFile):
+        yield compress_blob(file_content)
+        return
+    stored = compress_spilled_blob(file_content)
+    try:
+        yield stored.buffer
+    finally:
+        if stored is not file_content:
+            stored.close()
+
+
+def content_hash(data: bytes) -> str:
+    """Key of a file in CHATBOT_ATTACHMENT_BLOBS: the algorithm name and a 128-bit hex digest."""
+    if xxhash is not None:
+        return "xxh3_128:" + xxhash.xxh3_128_hexdigest(data)
+    return "blake2b_128:" + hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+class ChatStore(ABC):
+    """
+    Persistence used on the request path: query contexts, conversation history and attachments.
+    Implementations must be safe to call from worker threads. Write methods return the new ID, or
+    None if the write failed (the failure is logged, callers degrade instead of raising).
+    """
+
+    @abstractmethod
+    def get_contexts(self, agent_type: str) -> List[Dict[str, Any]]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_context_query(self, context_id: int) -> Optional[str]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_message(self, thread_id: str, sender_role: str, content: str, agent_stream: str) -> Optional[int]:
+        raise NotImplementedError
+
+    @abstractmethod
+    def load_recent_messages(self, thread_id: str, agent_stream: str, limit: int = 20) -> List[Tuple[str, str]]:
+        """Returns up to `limit` most recent (sender_role, content) pairs, oldest first."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def update_message_content(self, message_id: int, content: str) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def save_attachment(self, message_id: int, filename: str, mimetype: str, file_content: Union[bytes, SpilledFile]) -> Optional[int]:
+        """
+        Stores the content once per distinct hash: a repeat of an existing file only adds an
+        attachment row and bumps the blob's reference count. file_content may be an export kept on
+        disk (SpilledFile); it is then read from its memory map and stays owned by the caller.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def get_attachment(self, attachment_id: int) -> Optional[Tuple[str, str, bytes]]:
+        """Returns (filename, mimetype, file_content) or None if the attachment does not exist."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def purge_unreferenced_blobs(self) -> Tuple[int, int]:
+        """Deletes blobs no attachment refers to any more. Returns (blobs_deleted, bytes_freed)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def sample_message_contents(self, limit: int) -> List[str]:
+        """Most recent AI message texts, used to train the zstd message dictionary."""
+        raise NotImplementedError
+
+    # Retention (jobs/retention.py). Candidate queries return at most `limit` MESSAGE_IDs per call so the
+    # purger can delete in short transactions.
+
+    @abstractmethod
+    def expired_message_ids(self, max_age_days: float, limit: int, agent_stream: Optional[str] = None,
+                            exclude_streams: Sequence[str] = ()) -> List[int]:
+        """Messages older than max_age_days, optionally for one stream only or excluding some streams."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def excess_message_ids(self, keep_per_thread: int, limit: int) -> List[int]:
+        """Messages beyond the newest keep_per_thread of their (thread, stream) conversation."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def export_messages(self, message_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        """Messages and their attachments (content decompressed) as JSON-serializable records, for archiving."""
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete_messages(self, message_ids: Sequence[int]) -> Tuple[int, int, int]:
+        """
+        Deletes the messages and, by cascade, their attachments. Returns (messages_deleted,
+        attachments_deleted, bytes_reclaimed); shared attachment blobs are only released (see
+        purge_unreferenced_blobs).
+        """
+        raise NotImplementedError
+
+
+def _read_lob(value: Any) -> Any:
+    return value.read() if hasattr(value, "read") else value
+
+
+def _write_lob(lob, data) -> None:
+    """Fills a new LOB piece by piece (LOB.write at increasing offsets), so a large file is never bound as one value."""
+    chunk_bytes = max(1, WRITE_CHUNK_BYTES // lob.getchunksize()) * lob.getchunksize()
+    offset = 1
+    for chunk in iter_chunks(data, chunk_bytes):
+        lob.write(bytes(chunk), offset)
+        offset += len(chunk)
+
+
+def _archive_records(message_rows, attachment_rows) -> List[Dict[str, Any]]:
+    """Shapes (id, thread, timestamp, role, content, stream) and (id, message id, filename, mimetype, hash, content) rows."""
+    records = [
+        {"type": "message", "message_id": row[0], "thread_id": row[1], "timestamp": str(row[2]), "sender_role": row[3],
+         "content": decompress_text(_read_lob(row[4])), "agent_stream": row[5]}
+        for row in message_rows
+    ]
+    for row in attachment_rows:
+        content = decompress_blob(bytes(_read_lob(row[5]) or b""))
+        records.append(
+            {"type": "attachment", "attachment_id": row[0], "message_id": row[1], "filename": row[2], "mimetype": row[3],
+             "content_hash": row[4], "file_content_base64": base64.b64encode(content).decode("ascii")}
+        )
+    return records
+
+
+def _in_clause(message_ids: Sequence[int], placeholder: str = ":id{}") -> Tuple[str, Any]:
+    """IN-list placeholders and binds for a batch of IDs: named binds for Oracle, positional for sqlite3."""
+    if placeholder == "?":
+        return ", ".join("?" * len(message_ids)), list(message_ids)
+    return ", ".join(placeholder.format(i) for i in range(len(message_ids))), {f"id{i}": value for i, value in enumerate(message_ids)}
+
+
+class OracleChatStore(ChatStore):
+    """The ATP tables created by the migrations in migrations/."""
+
+    def get_contexts(self, agent_type: str) -> List[Dict[str, Any]]:
+        logger.info(f"Fetching contexts for agent_type: {agent_type} from Oracle DB")
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT ID, CONTEXT FROM QUERY_CONTEXTS WHERE AGENT_TYPE = :agent_type", agent_type=agent_type)
+            contexts = [{"id": row[0], "context": row[1]} for row in cursor.fetchall()]
+            logger.debug(f"Fetched {len(contexts)} contexts: {contexts}")
+            return contexts
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error fetching contexts for agent_type {agent_type}: {error_obj.message}", exc_info=True)
+            return []
+        except ConnectionError as e:
+            logger.error(f"Connection error fetching contexts: {str(e)}", exc_info=True)
+            return []
+        except Exception as e:
+            logger.error(f"Unexpected error fetching contexts: {str(e)}", exc_info=True)
+            return []
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def get_context_query(self, context_id: int) -> Optional[str]:
+        logger.info(f"Fetching query for context_id: {context_id} from Oracle DB")
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT QUERY FROM QUERY_CONTEXTS WHERE ID = :context_id", context_id=context_id)
+            result = cursor.fetchone()
+            if result:
+                # Read the content from the LOB object
+                query_content = _read_lob(result[0])
+                logger.debug(f"Retrieved query: {query_content[:100]}...")
+                return query_content
+            logger.warning(f"No query found for context_id: {context_id}")
+            return None
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error fetching query for context_id {context_id}: {error_obj.message}", exc_info=True)
+            return None
+        except ConnectionError as e:
+            logger.error(f"Connection error fetching query: {str(e)}", exc_info=True)
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error fetching query: {str(e)}", exc_info=True)
+            return None
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def save_message(self, thread_id: str, sender_role: str, content: str, agent_stream: str) -> Optional[int]:
+        """Saves a single message turn to Oracle and returns the new MESSAGE_ID."""
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+
+            # Create a variable to hold the returned ID
+            new_id_var = cursor.var(oracledb.NUMBER)
+
+            sql = """
+                INSERT INTO CHATBOT_CONVERSATION_HISTORY
+                (THREAD_ID, MESSAGE_TIMESTAMP, SENDER_ROLE, MESSAGE_CONTENT, AGENT_STREAM)
+                VALUES (:thread_id, CURRENT_TIMESTAMP, :sender_role, :message_content, :agent_stream)
+                RETURNING MESSAGE_ID INTO :new_id
+            """
+            logger.debug(f"Saving message to Oracle: Thread ID {thread_id}, Sender Role {sender_role}, Agent Stream {agent_stream}, Content (truncated): {content[:100]}")
+            cursor.execute(sql, thread_id=thread_id, sender_role=sender_role, message_content=compress_text(content), agent_stream=agent_stream, new_id=new_id_var)
+
+            # Get the returned ID
+            message_id = new_id_var.getvalue()[0]
+
+            conn.commit()
+            logger.info(f"Message saved to Oracle with MESSAGE_ID: {message_id} for thread_id: {thread_id}")
+            return message_id
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error saving message for thread_id {thread_id}: {error_obj.message}", exc_info=True)
+            return None
+        except ConnectionError as e:
+            logger.error(f"Connection error saving message to Oracle: {str(e)}", exc_info=True)
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error saving message to Oracle: {str(e)}", exc_info=True)
+            return None
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def load_recent_messages(self, thread_id: str, agent_stream: str, limit: int = 20) -> List[Tuple[str, str]]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            sql = """
+                SELECT SENDER_ROLE, MESSAGE_CONTENT
+                FROM (
+                    SELECT SENDER_ROLE, MESSAGE_CONTENT, MESSAGE_TIMESTAMP
+                    FROM CHATBOT_CONVERSATION_HISTORY
+                    WHERE THREAD_ID = :thread_id AND AGENT_STREAM = :agent_stream
+                    ORDER BY MESSAGE_TIMESTAMP DESC
+                )
+                WHERE ROWNUM <= :limit
+            """
+            cursor.execute(sql, thread_id=thread_id, agent_stream=agent_stream, limit=limit)
+
+            fetched_rows = cursor.fetchall()
+            logger.debug(f"Loaded {len(fetched_rows)} message rows from Oracle for thread {thread_id}, agent_stream {agent_stream}.")
+            return [(role, decompress_text(_read_lob(content))) for role, content in reversed(fetched_rows) if content is not None]
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error loading messages for thread_id {thread_id}: {error_obj.message}", exc_info=True)
+            return []
+        except ConnectionError as e:
+            logger.error(f"Connection error loading messages from Oracle: {str(e)}", exc_info=True)
+            return []
+        except Exception as e:
+            logger.error(f"Unexpected error loading messages from Oracle: {str(e)}", exc_info=True)
+            return []
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def update_message_content(self, message_id: int, content: str) -> None:
+        """Updates the content of an existing message in the history table."""
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            sql = "UPDATE CHATBOT_CONVERSATION_HISTORY SET MESSAGE_CONTENT = :content WHERE MESSAGE_ID = :msg_id"
+            cursor.execute(sql, content=compress_text(content), msg_id=message_id)
+            conn.commit()
+            logger.info(f"Updated message content for MESSAGE_ID: {message_id}")
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error updating message {message_id}: {error_obj.message}", exc_info=True)
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def save_attachment(self, message_id: int, filename: str, mimetype: str, file_content: Union[bytes, SpilledFile]) -> Optional[int]:
+        """Saves a file as a CHATBOT_ATTACHMENTS row pointing at its (shared) CHATBOT_ATTACHMENT_BLOBS row."""
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            content = _content_view(file_content)
+            digest = content_hash(content)
+
+            # Identical content already stored: one indexed UPDATE instead of a multi-MB BLOB insert.
+            cursor.execute(
+                "UPDATE CHATBOT_ATTACHMENT_BLOBS SET REF_COUNT = REF_COUNT + 1 WHERE CONTENT_HASH = :hash", hash=digest
+            )
+            deduplicated = cursor.rowcount > 0
+            if not deduplicated:
+                # The hash is of the original bytes, so deduplication does not depend on the compression setting
+                with _stored_blob(file_content) as stored_content:
+                    # Explicitly create a LOB object for the file content.
+                    # This is the most reliable way to handle BLOBs.
+                    file_blob = conn.createlob(oracledb.DB_TYPE_BLOB)
+                    _write_lob(file_blob, stored_content)
+                    stored_size = len(stored_content)
+                try:
+                    cursor.execute(
+                        """
+                        INSERT INTO CHATBOT_ATTACHMENT_BLOBS (CONTENT_HASH, CONTENT_SIZE, REF_COUNT, FILE_CONTENT)
+                        VALUES (:hash, :content_size, 1, :content)
+                        """,
+                        hash=digest, content_size=stored_size, content=file_blob
+                    )
+                except oracledb.Error as e:
+                    error_obj, = e.args
+                    if error_obj.code != 1: # ORA-00001: another session stored the same content first
+                        raise
+                    cursor.execute(
+                        "UPDATE CHATBOT_ATTACHMENT_BLOBS SET REF_COUNT = REF_COUNT + 1 WHERE CONTENT_HASH = :hash", hash=digest
+                    )
+                    deduplicated = True
+
+            attachment_id_var = cursor.var(oracledb.NUMBER)
+            sql = """
+                INSERT INTO CHATBOT_ATTACHMENTS (MESSAGE_ID, FILENAME, MIMETYPE, CONTENT_HASH)
+                VALUES (:msg_id, :fname, :mtype, :hash)
+                RETURNING ATTACHMENT_ID INTO :att_id
+            """
+            cursor.execute(sql, msg_id=message_id, fname=filename, mtype=mimetype, hash=digest, att_id=attachment_id_var)
+
+            attachment_id = attachment_id_var.getvalue()[0]
+            conn.commit()
+            logger.info(
+                f"Saved attachment to Oracle with ATTACHMENT_ID: {attachment_id} for MESSAGE_ID: {message_id} "
+                f"({len(content)} bytes, {'deduplicated' if deduplicated else 'new content'}, {digest})"
+            )
+            return attachment_id
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error saving attachment for MESSAGE_ID {message_id}: {error_obj.message}", exc_info=True)
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error saving attachment: {str(e)}", exc_info=True)
+            return None
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def get_attachment(self, attachment_id: int) -> Optional[Tuple[str, str, bytes]]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            # Attachments saved before content addressing still carry their own FILE_CONTENT
+            sql = """
+                SELECT a.FILENAME, a.MIMETYPE, a.FILE_CONTENT, b.FILE_CONTENT
+                FROM CHATBOT_ATTACHMENTS a
+                LEFT JOIN CHATBOT_ATTACHMENT_BLOBS b ON b.CONTENT_HASH = a.CONTENT_HASH
+                WHERE a.ATTACHMENT_ID = :id
+            """
+            cursor.execute(sql, id=attachment_id)
+            result = cursor.fetchone()
+            if not result:
+                return None
+            filename, mimetype, inline_blob, shared_blob = result
+            # Read the content from the LOB object
+            return filename, mimetype, decompress_blob(_read_lob(shared_blob if shared_blob is not None else inline_blob))
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def purge_unreferenced_blobs(self) -> Tuple[int, int]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            cursor.execute("SELECT NVL(SUM(CONTENT_SIZE), 0) FROM CHATBOT_ATTACHMENT_BLOBS WHERE REF_COUNT <= 0")
+            freed = int(cursor.fetchone()[0])
+            cursor.execute("DELETE FROM CHATBOT_ATTACHMENT_BLOBS WHERE REF_COUNT <= 0")
+            deleted = cursor.rowcount
+            conn.commit()
+            logger.info(f"Purged {deleted} unreferenced attachment blobs ({freed} bytes)")
+            return deleted, freed
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error purging unreferenced attachment blobs: {error_obj.message}", exc_info=True)
+            return 0, 0
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def sample_message_contents(self, limit: int) -> List[str]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            sql = """
+                SELECT MESSAGE_CONTENT FROM (
+                    SELECT MESSAGE_CONTENT FROM CHATBOT_CONVERSATION_HISTORY
+                    WHERE SENDER_ROLE = 'AI' AND MESSAGE_CONTENT IS NOT NULL
+                    ORDER BY MESSAGE_ID DESC
+                )
+                WHERE ROWNUM <= :limit
+            """
+            cursor.execute(sql, limit=limit)
+            return [decompress_text(_read_lob(row[0])) for row in cursor.fetchall()]
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def expired_message_ids(self, max_age_days: float, limit: int, agent_stream: Optional[str] = None,
+                            exclude_streams: Sequence[str] = ()) -> List[int]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            # The cutoff is computed by the database so it uses the same clock as MESSAGE_TIMESTAMP
+            sql = "SELECT MESSAGE_ID FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_TIMESTAMP < CURRENT_TIMESTAMP - NUMTODSINTERVAL(:days, 'DAY')"
+            binds = {"days": max_age_days, "limit": limit}
+            if agent_stream:
+                sql += " AND AGENT_STREAM = :agent_stream"
+                binds["agent_stream"] = agent_stream
+            if exclude_streams:
+                sql += " AND AGENT_STREAM NOT IN (" + ", ".join(f":ex{i}" for i in range(len(exclude_streams))) + ")"
+                binds.update({f"ex{i}": stream for i, stream in enumerate(exclude_streams)})
+            cursor.execute(sql + " AND ROWNUM <= :limit", binds)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def excess_message_ids(self, keep_per_thread: int, limit: int) -> List[int]:
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            sql = """
+                SELECT MESSAGE_ID FROM (
+                    SELECT MESSAGE_ID, ROW_NUMBER() OVER (
+                        PARTITION BY THREAD_ID, AGENT_STREAM ORDER BY MESSAGE_TIMESTAMP DESC, MESSAGE_ID DESC
+                    ) AS POSITION_IN_THREAD
+                    FROM CHATBOT_CONVERSATION_HISTORY
+                )
+                WHERE POSITION_IN_THREAD > :keep AND ROWNUM <= :limit
+            """
+            cursor.execute(sql, keep=keep_per_thread, limit=limit)
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def export_messages(self, message_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        if not message_ids:
+            return []
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            placeholders, binds = _in_clause(message_ids)
+            cursor.execute(
+                "SELECT MESSAGE_ID, THREAD_ID, MESSAGE_TIMESTAMP, SENDER_ROLE, MESSAGE_CONTENT, AGENT_STREAM "
+                f"FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_ID IN ({placeholders}) ORDER BY MESSAGE_ID", binds
+            )
+            message_rows = [row[:4] + (_read_lob(row[4]),) + row[5:] for row in cursor.fetchall()]
+            cursor.execute(
+                f"""
+                SELECT a.ATTACHMENT_ID, a.MESSAGE_ID, a.FILENAME, a.MIMETYPE, a.CONTENT_HASH, b.FILE_CONTENT, a.FILE_CONTENT
+                FROM CHATBOT_ATTACHMENTS a
+                LEFT JOIN CHATBOT_ATTACHMENT_BLOBS b ON b.CONTENT_HASH = a.CONTENT_HASH
+                WHERE a.MESSAGE_ID IN ({placeholders}) ORDER BY a.ATTACHMENT_ID
+                """, binds
+            )
+            attachment_rows = [row[:5] + (_read_lob(row[5] if row[5] is not None else row[6]),) for row in cursor.fetchall()]
+            return _archive_records(message_rows, attachment_rows)
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+    def delete_messages(self, message_ids: Sequence[int]) -> Tuple[int, int, int]:
+        if not message_ids:
+            return 0, 0, 0
+        conn = None
+        try:
+            conn = oracle_db_utils.get_oracle_connection()
+            cursor = conn.cursor()
+            placeholders, binds = _in_clause(message_ids)
+            cursor.execute(
+                "SELECT COUNT(*), NVL(SUM(DBMS_LOB.GETLENGTH(FILE_CONTENT)), 0) "
+                f"FROM CHATBOT_ATTACHMENTS WHERE MESSAGE_ID IN ({placeholders})", binds
+            )
+            attachments, attachment_bytes = cursor.fetchone()
+            cursor.execute(
+                "SELECT NVL(SUM(DBMS_LOB.GETLENGTH(MESSAGE_CONTENT)), 0) "
+                f"FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_ID IN ({placeholders})", binds
+            )
+            message_bytes = cursor.fetchone()[0]
+            # ON DELETE CASCADE removes the attachments; their trigger releases the shared blobs
+            cursor.execute(f"DELETE FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_ID IN ({placeholders})", binds)
+            deleted = cursor.rowcount
+            conn.commit()
+            return deleted, int(attachments), int(attachment_bytes) + int(message_bytes)
+        except oracledb.Error as e:
+            error_obj, = e.args
+            logger.error(f"Oracle DB error deleting {len(message_ids)} messages: {error_obj.message}", exc_info=True)
+            return 0, 0, 0
+        finally:
+            if conn:
+                oracle_db_utils.release_oracle_connection(conn)
+
+
+class _NamedBindCursor:
+    """Lets Oracle-style `cursor.execute(sql, name=value)` calls (the seed migration) run on sqlite3."""
+
+    def __init__(self, cursor: sqlite3.Cursor):
+        self._cursor = cursor
+
+    def execute(self, sql: str, **binds: Any):
+        return self._cursor.execute(sql, binds)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+
+class SQLiteChatStore(ChatStore):
+    """
+    Single-file store for edge deployments, development and load tests (no ATP wallet or network
+    hop). The schema mirrors the Oracle tables and QUERY_CONTEXTS is seeded from the same migration
+    on first use.
+    """
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS QUERY_CONTEXTS (
+            ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            AGENT_TYPE TEXT NOT NULL,
+            CONTEXT TEXT NOT NULL,
+            QUERY TEXT NOT NULL
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS CHATBOT_CONVERSATION_HISTORY (
+            MESSAGE_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            THREAD_ID TEXT NOT NULL,
+            MESSAGE_TIMESTAMP TEXT DEFAULT CURRENT_TIMESTAMP NOT NULL,
+            SENDER_ROLE TEXT NOT NULL CHECK (SENDER_ROLE IN ('USER', 'AI')),
+            MESSAGE_CONTENT TEXT,
+            AGENT_STREAM TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS IDX_HISTORY_THREAD_STREAM ON CHATBOT_CONVERSATION_HISTORY (THREAD_ID, AGENT_STREAM, MESSAGE_ID)",
+        "CREATE INDEX IF NOT EXISTS IDX_HISTORY_TIMESTAMP ON CHATBOT_CONVERSATION_HISTORY (MESSAGE_TIMESTAMP)",
+        """
+        CREATE TABLE IF NOT EXISTS CHATBOT_ATTACHMENT_BLOBS (
+            CONTENT_HASH TEXT PRIMARY KEY,
+            CONTENT_SIZE INTEGER NOT NULL,
+            REF_COUNT INTEGER DEFAULT 0 NOT NULL,
+            FILE_CONTENT BLOB NOT NULL,
+            CREATED_TIMESTAMP TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS CHATBOT_ATTACHMENTS (
+            ATTACHMENT_ID INTEGER PRIMARY KEY AUTOINCREMENT,
+            MESSAGE_ID INTEGER NOT NULL REFERENCES CHATBOT_CONVERSATION_HISTORY(MESSAGE_ID) ON DELETE CASCADE,
+            FILENAME TEXT NOT NULL,
+            MIMETYPE TEXT NOT NULL,
+            FILE_CONTENT BLOB,
+            CREATED_TIMESTAMP TEXT DEFAULT CURRENT_TIMESTAMP,
+            CONTENT_HASH TEXT REFERENCES CHATBOT_ATTACHMENT_BLOBS(CONTENT_HASH)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS IDX_ATTACHMENTS_MESSAGE_ID ON CHATBOT_ATTACHMENTS (MESSAGE_ID)",
+    ]
+
+    # Created after any upgrade of an older file (see _upgrade_schema)
+    POST_UPGRADE_SCHEMA = [
+        "CREATE INDEX IF NOT EXISTS IDX_ATTACHMENTS_CONTENT_HASH ON CHATBOT_ATTACHMENTS (CONTENT_HASH)",
+        # Same bookkeeping as the Oracle trigger from migration v004, including cascaded deletes
+        """
+        CREATE TRIGGER IF NOT EXISTS TRG_ATTACHMENTS_BLOB_REFCOUNT
+        AFTER DELETE ON CHATBOT_ATTACHMENTS
+        FOR EACH ROW WHEN OLD.CONTENT_HASH IS NOT NULL
+        BEGIN
+            UPDATE CHATBOT_ATTACHMENT_BLOBS SET REF_COUNT = REF_COUNT - 1 WHERE CONTENT_HASH = OLD.CONTENT_HASH;
+        END
+        """,
+    ]
+
+    def __init__(self, path: str):
+        self.path = path
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA:
+                conn.execute(statement)
+            self._upgrade_schema(conn)
+            for statement in self.POST_UPGRADE_SCHEMA:
+                conn.execute(statement)
+            # Same seed data as the Oracle deployment; the migration skips itself if contexts already exist
+            from migrations import v002_seed_query_contexts
+            v002_seed_query_contexts.upgrade(_NamedBindCursor(conn.cursor()))
+            conn.commit()
+        logger.info(f"SQLiteChatStore initialized at {path}")
+
+    @staticmethod
+    def _upgrade_schema(conn: sqlite3.Connection) -> None:
+        """Adds CONTENT_HASH to files created before content-addressed attachments (their FILE_CONTENT stays NOT NULL)."""
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(CHATBOT_ATTACHMENTS)")}
+        if "CONTENT_HASH" not in columns:
+            conn.execute("ALTER TABLE CHATBOT_ATTACHMENTS ADD COLUMN CONTENT_HASH TEXT REFERENCES CHATBOT_ATTACHMENT_BLOBS(CONTENT_HASH)")
+            logger.info("Added CONTENT_HASH to CHATBOT_ATTACHMENTS")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _execute(self, sql: str, params: Any = (), fetch: Optional[str] = None) -> Any:
+        """Runs one statement in its own connection; returns all rows, one row, or the last row ID."""
+        with closing(self._connect()) as conn:
+            with conn:
+                cursor = conn.execute(sql, params)
+                if fetch == "all":
+                    return cursor.fetchall()
+                if fetch == "one":
+                    return cursor.fetchone()
+                return cursor.lastrowid
+
+    def get_contexts(self, agent_type: str) -> List[Dict[str, Any]]:
+        try:
+            rows = self._execute("SELECT ID, CONTEXT FROM QUERY_CONTEXTS WHERE AGENT_TYPE = ?", (agent_type,), fetch="all")
+            return [{"id": row[0], "context": row[1]} for row in rows]
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error fetching contexts for agent_type {agent_type}: {str(e)}", exc_info=True)
+            return []
+
+    def get_context_query(self, context_id: int) -> Optional[str]:
+        try:
+            row = self._execute("SELECT QUERY FROM QUERY_CONTEXTS WHERE ID = ?", (context_id,), fetch="one")
+            return row[0] if row else None
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error fetching query for context_id {context_id}: {str(e)}", exc_info=True)
+            return None
+
+    def save_message(self, thread_id: str, sender_role: str, content: str, agent_stream: str) -> Optional[int]:
+        try:
+            message_id = self._execute(
+                "INSERT INTO CHATBOT_CONVERSATION_HISTORY (THREAD_ID, SENDER_ROLE, MESSAGE_CONTENT, AGENT_STREAM) VALUES (?, ?, ?, ?)",
+                (thread_id, sender_role, compress_text(content), agent_stream)
+            )
+            logger.info(f"Message saved to SQLite with MESSAGE_ID: {message_id} for thread_id: {thread_id}")
+            return message_id
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error saving message for thread_id {thread_id}: {str(e)}", exc_info=True)
+            return None
+
+    def load_recent_messages(self, thread_id: str, agent_stream: str, limit: int = 20) -> List[Tuple[str, str]]:
+        try:
+            rows = self._execute(
+                """
+                SELECT SENDER_ROLE, MESSAGE_CONTENT FROM CHATBOT_CONVERSATION_HISTORY
+                WHERE THREAD_ID = ? AND AGENT_STREAM = ?
+                ORDER BY MESSAGE_TIMESTAMP DESC, MESSAGE_ID DESC
+                LIMIT ?
+                """,
+                (thread_id, agent_stream, limit), fetch="all"
+            )
+            return [(role, decompress_text(content)) for role, content in reversed(rows) if content is not None]
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error loading messages for thread_id {thread_id}: {str(e)}", exc_info=True)
+            return []
+
+    def update_message_content(self, message_id: int, content: str) -> None:
+        try:
+            self._execute("UPDATE CHATBOT_CONVERSATION_HISTORY SET MESSAGE_CONTENT = ? WHERE MESSAGE_ID = ?", (compress_text(content), message_id))
+            logger.info(f"Updated message content for MESSAGE_ID: {message_id}")
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error updating message {message_id}: {str(e)}", exc_info=True)
+
+    def save_attachment(self, message_id: int, filename: str, mimetype: str, file_content: Union[bytes, SpilledFile]) -> Optional[int]:
+        content = _content_view(file_content)
+        digest = content_hash(content)
+        try:
+            with closing(self._connect()) as conn:
+                with conn:
+                    # The UPDATE takes the write lock, so a concurrent save of the same content waits for this one
+                    deduplicated = conn.execute(
+                        "UPDATE CHATBOT_ATTACHMENT_BLOBS SET REF_COUNT = REF_COUNT + 1 WHERE CONTENT_HASH = ?", (digest,)
+                    ).rowcount > 0
+                    if not deduplicated:
+                        # sqlite3 binds the buffer (a spilled export's memory map) without a Python-side copy
+                        with _stored_blob(file_content) as stored_content:
+                            conn.execute(
+                                "INSERT INTO CHATBOT_ATTACHMENT_BLOBS (CONTENT_HASH, CONTENT_SIZE, REF_COUNT, FILE_CONTENT) VALUES (?, ?, 1, ?)",
+                                (digest, len(stored_content), sqlite3.Binary(stored_content))
+                            )
+                    # An empty inline FILE_CONTENT keeps files created before CONTENT_HASH (NOT NULL column) writable
+                    attachment_id = conn.execute(
+                        "INSERT INTO CHATBOT_ATTACHMENTS (MESSAGE_ID, FILENAME, MIMETYPE, FILE_CONTENT, CONTENT_HASH) VALUES (?, ?, ?, ?, ?)",
+                        (message_id, filename, mimetype, sqlite3.Binary(b""), digest)
+                    ).lastrowid
+            logger.info(
+                f"Saved attachment to SQLite with ATTACHMENT_ID: {attachment_id} for MESSAGE_ID: {message_id} "
+                f"({len(content)} bytes, {'deduplicated' if deduplicated else 'new content'}, {digest})"
+            )
+            return attachment_id
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error saving attachment for MESSAGE_ID {message_id}: {str(e)}", exc_info=True)
+            return None
+
+    def get_attachment(self, attachment_id: int) -> Optional[Tuple[str, str, bytes]]:
+        row = self._execute(
+            """
+            SELECT a.FILENAME, a.MIMETYPE, COALESCE(b.FILE_CONTENT, a.FILE_CONTENT)
+            FROM CHATBOT_ATTACHMENTS a
+            LEFT JOIN CHATBOT_ATTACHMENT_BLOBS b ON b.CONTENT_HASH = a.CONTENT_HASH
+            WHERE a.ATTACHMENT_ID = ?
+            """,
+            (attachment_id,), fetch="one"
+        )
+        return (row[0], row[1], decompress_blob(bytes(row[2]))) if row else None
+
+    def purge_unreferenced_blobs(self) -> Tuple[int, int]:
+        try:
+            with closing(self._connect()) as conn:
+                with conn:
+                    freed = conn.execute("SELECT COALESCE(SUM(CONTENT_SIZE), 0) FROM CHATBOT_ATTACHMENT_BLOBS WHERE REF_COUNT <= 0").fetchone()[0]
+                    deleted = conn.execute("DELETE FROM CHATBOT_ATTACHMENT_BLOBS WHERE REF_COUNT <= 0").rowcount
+            logger.info(f"Purged {deleted} unreferenced attachment blobs ({freed} bytes)")
+            return deleted, freed
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error purging unreferenced attachment blobs: {str(e)}", exc_info=True)
+            return 0, 0
+
+    def sample_message_contents(self, limit: int) -> List[str]:
+        rows = self._execute(
+            "SELECT MESSAGE_CONTENT FROM CHATBOT_CONVERSATION_HISTORY WHERE SENDER_ROLE = 'AI' AND MESSAGE_CONTENT IS NOT NULL ORDER BY MESSAGE_ID DESC LIMIT ?",
+            (limit,), fetch="all"
+        )
+        return [decompress_text(row[0]) for row in rows]
+
+    def expired_message_ids(self, max_age_days: float, limit: int, agent_stream: Optional[str] = None,
+                            exclude_streams: Sequence[str] = ()) -> List[int]:
+        # CURRENT_TIMESTAMP (the column default) is UTC, as is datetime('now')
+        sql = "SELECT MESSAGE_ID FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_TIMESTAMP < datetime('now', ?)"
+        params: List[Any] = [f"-{max_age_days} days"]
+        if agent_stream:
+            sql += " AND AGENT_STREAM = ?"
+            params.append(agent_stream)
+        if exclude_streams:
+            sql += " AND AGENT_STREAM NOT IN (" + ", ".join("?" * len(exclude_streams)) + ")"
+            params.extend(exclude_streams)
+        rows = self._execute(sql + " LIMIT ?", params + [limit], fetch="all")
+        return [row[0] for row in rows]
+
+    def excess_message_ids(self, keep_per_thread: int, limit: int) -> List[int]:
+        rows = self._execute(
+            """
+            SELECT MESSAGE_ID FROM (
+                SELECT MESSAGE_ID, ROW_NUMBER() OVER (
+                    PARTITION BY THREAD_ID, AGENT_STREAM ORDER BY MESSAGE_TIMESTAMP DESC, MESSAGE_ID DESC
+                ) AS POSITION_IN_THREAD
+                FROM CHATBOT_CONVERSATION_HISTORY
+            )
+            WHERE POSITION_IN_THREAD > ? LIMIT ?
+            """,
+            (keep_per_thread, limit), fetch="all"
+        )
+        return [row[0] for row in rows]
+
+    def export_messages(self, message_ids: Sequence[int]) -> List[Dict[str, Any]]:
+        if not message_ids:
+            return []
+        placeholders, params = _in_clause(message_ids, "?")
+        message_rows = self._execute(
+            "SELECT MESSAGE_ID, THREAD_ID, MESSAGE_TIMESTAMP, SENDER_ROLE, MESSAGE_CONTENT, AGENT_STREAM "
+            f"FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_ID IN ({placeholders}) ORDER BY MESSAGE_ID", params, fetch="all"
+        )
+        attachment_rows = self._execute(
+            f"""
+            SELECT a.ATTACHMENT_ID, a.MESSAGE_ID, a.FILENAME, a.MIMETYPE, a.CONTENT_HASH, COALESCE(b.FILE_CONTENT, a.FILE_CONTENT)
+            FROM CHATBOT_ATTACHMENTS a
+            LEFT JOIN CHATBOT_ATTACHMENT_BLOBS b ON b.CONTENT_HASH = a.CONTENT_HASH
+            WHERE a.MESSAGE_ID IN ({placeholders}) ORDER BY a.ATTACHMENT_ID
+            """, params, fetch="all"
+        )
+        return _archive_records(message_rows, attachment_rows)
+
+    def delete_messages(self, message_ids: Sequence[int]) -> Tuple[int, int, int]:
+        if not message_ids:
+            return 0, 0, 0
+        placeholders, params = _in_clause(message_ids, "?")
+        try:
+            with closing(self._connect()) as conn:
+                with conn:
+                    attachments, attachment_bytes = conn.execute(
+                        f"SELECT COUNT(*), COALESCE(SUM(LENGTH(FILE_CONTENT)), 0) FROM CHATBOT_ATTACHMENTS WHERE MESSAGE_ID IN ({placeholders})",
+                        params
+                    ).fetchone()
+                    message_bytes = conn.execute(
+                        f"SELECT COALESCE(SUM(LENGTH(CAST(MESSAGE_CONTENT AS BLOB))), 0) FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_ID IN ({placeholders})",
+                        params
+                    ).fetchone()[0]
+                    deleted = conn.execute(f"DELETE FROM CHATBOT_CONVERSATION_HISTORY WHERE MESSAGE_ID IN ({placeholders})", params).rowcount
+            return deleted, attachments, attachment_bytes + message_bytes
+        except sqlite3.Error as e:
+            logger.error(f"SQLite error deleting {len(message_ids)} messages: {str(e)}", exc_info=True)
+            return 0, 0, 0
+
+
+_chat_store: Optional[ChatStore] = None
+_chat_store_lock = threading.Lock()
+
+
+def get_chat_store() -> ChatStore:
+    """Returns the configured store (CHAT_STORE_BACKEND = "oracle" or "sqlite"), creating it on first use."""
+    global _chat_store
+    with _chat_store_lock:
+        if _chat_store is None:
+            if Config.CHAT_STORE_BACKEND == "sqlite":
+                _chat_store = SQLiteChatStore(Config.CHAT_STORE_SQLITE_PATH)
+            else:
+                _chat_store = OracleChatStore()
+            logger.info(f"Using {_chat_store.__class__.__name__} for contexts, history and attachments")
+        return _chat_store
@@ -0,0 +1,235 @@
+"""
+Optional zstd compression of stored message content and attachment blobs.
+
+Compressed values carry a marker prefix, so rows written before compression was enabled (or
+after it is turned off again) are read back unchanged:
+  - MESSAGE_CONTENT (CLOB):  TEXT_MARKER / TEXT_DICT_PREFIX + dict id + "\x1f" + base64(zstd frame)
+  - FILE_CONTENT (BLOB):     BLOB_MARKER + zstd frame
+Values are only stored compressed when that saves at least STORE_COMPRESSION_MIN_SAVING, so
+already-compressed workbooks stay as they are.
+
+Dictionary mode: markdown history is short and repetitive, which plain zstd handles poorly. A
+dictionary trained on existing messages (python -m storage.compression train --out message.dict)
+and configured as STORE_COMPRESSION_DICT_PATH is used for message content. The marker records the
+dictionary id, so a retrained dictionary can replace it: list the previous files in
+STORE_COMPRESSION_OLD_DICT_PATHS for as long as rows compressed with them exist; they cannot be read
+without them.
+"""
+import argparse
+import base64
+import logging
+import threading
+from typing import Dict, List, Optional
+
+from config import Config
+from request_memory import SpilledFile, iter_chunks, write_spilled
+
+try:
+    import zstandard
+except ImportError:  # content is stored uncompressed; compressed rows cannot be read back
+    zstandard = None
+
+logger = logging.getLogger("compression")
+
+# \x1f (unit separator) does not occur in chat text, and gzip output starts with \x1f\x8b
+TEXT_MARKER = "\x1fzstd1\x1f"
+TEXT_DICT_PREFIX = "\x1fzstd1d:"
+# Rows written before the dictionary id was recorded; the id is read from the zstd frame header instead
+LEGACY_TEXT_DICT_MARKER = "\x1fzstd1d\x1f"
+BLOB_MARKER = b"\x1fzstd1\x1f"
+
+# zstd (de)compressor objects must not be shared between threads
+_local = threading.local()
+_dictionary_lock = threading.Lock()
+_dictionary = None
+_dictionaries: Dict[int, object] = {}
+_dictionary_loaded = False
+_missing_warned = False
+
+
+def compression_enabled() -> bool:
+    global _missing_warned
+    if Config.STORE_COMPRESSION != "zstd":
+        return False
+    if zstandard is None:
+        if not _missing_warned:
+            logger.warning("STORE_COMPRESSION=zstd but the zstandard package is not installed; storing content uncompressed.")
+            _missing_warned = True
+        return False
+    return True
+
+
+def _load_dictionary(path: str):
+    try:
+        with open(path, "rb") as dict_file:
+            dictionary = zstandard.ZstdCompressionDict(dict_file.read())
+        logger.info(f"Loaded zstd message dictionary {path} (id {dictionary.dict_id()})")
+        return dictionary
+    except OSError as e:
+        logger.error(f"Could not load zstd dictionary {path}: {str(e)}", exc_info=True)
+        return None
+
+
+def _load_dictionaries() -> None:
+    """Loads STORE_COMPRESSION_DICT_PATH (used for writing) and STORE_COMPRESSION_OLD_DICT_PATHS, once."""
+    global _dictionary, _dictionary_loaded
+    if _dictionary_loaded:
+        return
+    with _dictionary_lock:
+        if not _dictionary_loaded:
+            if zstandard is not None:
+                old_paths = [path.strip() for path in Config.STORE_COMPRESSION_OLD_DICT_PATHS.split(",") if path.strip()]
+                for path in old_paths:
+                    dictionary = _load_dictionary(path)
+                    if dictionary is not None:
+                        _dictionaries[dictionary.dict_id()] = dictionary
+                if Config.STORE_COMPRESSION_DICT_PATH:
+                    _dictionary = _load_dictionary(Config.STORE_COMPRESSION_DICT_PATH)
+                    if _dictionary is not None:
+                        _dictionaries[_dictionary.dict_id()] = _dictionary
+            _dictionary_loaded = True
+
+
+def _get_dictionary():
+    """The trained message dictionary from STORE_COMPRESSION_DICT_PATH (None if not configured)."""
+    _load_dictionaries()
+    return _dictionary
+
+
+def _get_dictionary_by_id(dict_id: int):
+    """A configured dictionary (current or old) by its zstd dictionary id, or None."""
+    _load_dictionaries()
+    return _dictionaries.get(dict_id)
+
+
+def _compressor(dictionary=None):
+    attr = "dict_compressor" if dictionary is not None else "compressor"
+    compressor = getattr(_local, attr, None)
+    if compressor is None:
+        compressor = zstandard.ZstdCompressor(level=Config.STORE_COMPRESSION_LEVEL, dict_data=dictionary)
+        setattr(_local, attr, compressor)
+    return compressor
+
+
+def _decompressor(dictionary=None):
+    if dictionary is None:
+        decompressor = getattr(_local, "decompressor", None)
+        if decompressor is None:
+            decompressor = _local.decompressor = zstandard.ZstdDecompressor()
+        return decompressor
+    decompressors = getattr(_local, "dict_decompressors", None)
+    if decompressors is None:
+        decompressors = _local.dict_decompressors = {}
+    dict_id = dictionary.dict_id()
+    if dict_id not in decompressors:
+        decompressors[dict_id] = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return decompressors[dict_id]
+
+
+def _worth_it(original_size: int, stored_size: int) -> bool:
+    return stored_size <= original_size * (1 - Config.STORE_COMPRESSION_MIN_SAVING)
+
+
+def compress_text(text: Optional[str]) -> Optional[str]:
+    """Value to store in MESSAGE_CONTENT: the text itself, or its marked, base64-encoded zstd frame."""
+    if not text or len(text) < Config.STORE_COMPRESSION_MIN_BYTES or not compression_enabled():
+        return text
+    raw = text.encode("utf-8")
+    dictionary = _get_dictionary()
+    frame = _compressor(dictionary).compress(raw)
+    marker = f"{TEXT_DICT_PREFIX}{dictionary.dict_id()}\x1f" if dictionary is not None else TEXT_MARKER
+    encoded = marker + base64.b64encode(frame).decode("ascii")
+    return encoded if _worth_it(len(raw), len(encoded)) else text
+
+
+def decompress_text(value: Optional[str]) -> Optional[str]:
+    """Inverse of compress_text; values without a marker are returned unchanged."""
+    if not value or value[0] != "\x1f":
+        return value
+    if value.startswith(TEXT_DICT_PREFIX):
+        dict_id, _, payload = value[len(TEXT_DICT_PREFIX):].partition("\x1f")
+        uses_dictionary = True
+    elif value.startswith(LEGACY_TEXT_DICT_MARKER):
+        dict_id, payload, uses_dictionary = "", value[len(LEGACY_TEXT_DICT_MARKER):], True
+    elif value.startswith(TEXT_MARKER):
+        dict_id, payload, uses_dictionary = "", value[len(TEXT_MARKER):], False
+    else:
+        return value
+    if zstandard is None:
+        logger.error("Message content is zstd-compressed but the zstandard package is not installed.")
+        return "[Message content unavailable: zstandard is not installed]"
+    frame = base64.b64decode(payload)
+    dictionary = None
+    if uses_dictionary:
+        dict_id = int(dict_id) if dict_id else zstandard.get_frame_parameters(frame).dict_id
+        dictionary = _get_dictionary_by_id(dict_id)
+        if dictionary is None:
+            logger.error(f"Message was compressed with zstd dictionary {dict_id}, which is not configured "
+                         f"(STORE_COMPRESSION_DICT_PATH / STORE_COMPRESSION_OLD_DICT_PATHS).")
+            return "[Message content unavailable: compression dictionary is not configured]"
+    return _decompressor(dictionary).decompress(frame).decode("utf-8")
+
+
+def compress_blob(data: bytes) -> bytes:
+    """Value to store in FILE_CONTENT: the bytes themselves, or the marked zstd frame."""
+    if len(data) < Config.STORE_COMPRESSION_MIN_BYTES or not compression_enabled():
+        return data
+    stored = BLOB_MARKER + _compressor().compress(data)
+    return stored if _worth_it(len(data), len(stored)) else data
+
+
+def compress_spilled_blob(content: SpilledFile) -> SpilledFile:
+    """
+    compress_blob for content kept on disk: the marked zstd frame is streamed into a new spill file.
+    Returns `content` itself when it is stored as-is; otherwise the caller closes the returned file.
+    """
+    if content.size < Config.STORE_COMPRESSION_MIN_BYTES or not compression_enabled():
+        return content
+
+    def write(target):
+        target.write(BLOB_MARKER)
+        with _compressor().stream_writer(target, size=content.size, closefd=False) as writer:
+            for chunk in iter_chunks(content.buffer):
+                writer.write(chunk)
+
+    stored = write_spilled(".zst", write)
+    if _worth_it(content.size, stored.size):
+        return stored
+    stored.close()
+    return content
+
+
+def decompress_blob(data: bytes) -> bytes:
+    """Inverse of compress_blob; unmarked content is returned unchanged."""
+    if not data.startswith(BLOB_MARKER):
+        return data
+    if zstandard is None:
+        raise RuntimeError("Attachment is zstd-compressed but the zstandard package is not installed")
+    return _decompressor().decompress(data[len(BLOB_MARKER):])
+
+
+def train_dictionary(samples: List[str], dict_size: int = 112640) -> bytes:
+    """Trains a zstd dictionary on message texts (zstd recommends ~100x dict_size of samples)."""
+    if zstandard is None:
+        raise RuntimeError("Training a dictionary requires the zstandard package")
+    encoded = [sample.encode("utf-8") for sample in samples if sample]
+    return zstandard.train_dictionary(dict_size, encoded, level=Config.STORE_COMPRESSION_LEVEL).as_bytes()
+
+
+if __name__ == "__main__":
+    # python -m storage.compression train --out message.dict [--limit 5000] [--dict-size 112640]
+    from logging_config import setup_logging
+    from storage.chat_store import get_chat_store
+
+    parser = argparse.ArgumentParser(description="Train a zstd dictionary on stored AI messages")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("--out", required=True)
+    parser.add_argument("--limit", type=int, default=5000)
+    parser.add_argument("--dict-size", type=int, default=112640)
+    args = parser.parse_args()
+    setup_logging()
+    samples = get_chat_store().sample_message_contents(args.limit)
+    dictionary = train_dictionary(samples, args.dict_size)
+    with open(args.out, "wb") as output:
+        output.write(dictionary)
+    print(f"Trained a {len(dictionary)}-byte dictionary on {len(samples)} messages: {args.out}")
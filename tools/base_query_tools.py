@@ -1,67 +1,65 @@
 import pandas as pd
 import logging
-from typing import Dict, Any, Optional, List
-from langchain_openai import AzureChatOpenAI
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Tuple, Union
 from config import Config
+from llm_utils import get_llm
+from storage.chat_store import get_chat_store
+from request_memory import MemoryBudget, SpilledCSV, SpillWriter, record_stage
+from bip_routing import BIPEndpoint, BIPEndpointBusy, get_bip_router
 import base64
+import binascii
 import requests
-from xml.etree import ElementTree as ET
 import re
 
-# Import Oracle DB utilities and oracledb for error handling
-import oracle_db_utils
-import oracledb
-
-# Configure logging with file output
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename="chatbot.log",
-    filemode="a",
-    format="%(asctime)s:%(levelname)s:%(name)s:%(message)s"
-)
+
+# Handlers and levels are configured centrally (logging_config.setup_logging)
 logger = logging.getLogger("query_tools")
-# Ensure console output
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.DEBUG)
-logger.addHandler(console_handler)
 
 class ContextMatcher:
+    # Shared by every agent in the process: QUERY_CONTEXTS rows per agent type and context queries by
+    # ID, kept for CONTEXT_CACHE_TTL_SECONDS (0: read the table on every request). Failed reads are not kept.
+    _cache_lock = threading.Lock()
+    _contexts_by_type: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+    _queries_by_id: Dict[int, Tuple[float, str]] = {}
+
     def __init__(self):
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=Config.AZURE_OPENAI_ENDPOINT,
-            api_key=Config.AZURE_OPENAI_KEY,
-            api_version="2024-08-01-preview",
-            deployment_name="gpt-35-turbo"
-        )
+        self.llm = get_llm()
+        self.chat_store = get_chat_store()
         logger.info("ContextMatcher initialized")
 
+    @staticmethod
+    def _fresh(entry: Optional[Tuple[float, Any]]) -> bool:
+        return entry is not None and time.monotonic() - entry[0] < Config.CONTEXT_CACHE_TTL_SECONDS
+
     def get_contexts(self, agent_type: str) -> List[Dict[str, Any]]:
-        logger.info(f"Fetching contexts for agent_type: {agent_type} from Oracle DB")
-        conn = None
-        try:
-            conn = oracle_db_utils.get_oracle_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT ID, CONTEXT FROM QUERY_CONTEXTS WHERE AGENT_TYPE = :agent_type", agent_type=agent_type)
-            contexts = [{"id": row[0], "context": row[1]} for row in cursor.fetchall()]
-            logger.debug(f"Fetched {len(contexts)} contexts: {contexts}")
-            return contexts
-        except oracledb.Error as e:
-            error_obj, = e.args
-            logger.error(f"Oracle DB error fetching contexts for agent_type {agent_type}: {error_obj.message}", exc_info=True)
-            return []
-        except ConnectionError as e:
-            logger.error(f"Connection error fetching contexts: {str(e)}", exc_info=True)
-            return []
-        except Exception as e:
-            logger.error(f"Unexpected error fetching contexts: {str(e)}", exc_info=True)
-            return []
-        finally:
-            if conn:
-                oracle_db_utils.release_oracle_connection(conn)
+        if Config.CONTEXT_CACHE_TTL_SECONDS > 0:
+            entry = self._contexts_by_type.get(agent_type)
+            if self._fresh(entry):
+                return entry[1]
+        contexts = self.chat_store.get_contexts(agent_type)
+        if contexts and Config.CONTEXT_CACHE_TTL_SECONDS > 0:
+            with self._cache_lock:
+                self._contexts_by_type[agent_type] = (time.monotonic(), contexts)
+        return contexts
+
+    def preload(self, agent_type: str) -> int:
+        """Reads the contexts of agent_type and their queries into the cache (startup prewarm); returns the context count."""
+        with self._cache_lock:
+            self._contexts_by_type.pop(agent_type, None)
+        contexts = self.get_contexts(agent_type)
+        for context in contexts:
+            self.get_query_by_id(context["id"])
+        return len(contexts)
 
-    def match_context(self, question: str, agent_type: str) -> Optional[int]:
+    def match_context(self, question: str, agent_type: str, timeout: Optional[float] = None,
+                      contexts: Optional[List[Dict[str, Any]]] = None) -> Optional[int]:
+        """Picks the QUERY_CONTEXTS row for the question; `contexts` saves fetching them again when the caller has them."""
         logger.info(f"Matching context for question: {question}, agent_type: {agent_type}")
-        contexts = self.get_contexts(agent_type)
+        if contexts is None:
+            contexts = self.get_contexts(agent_type)
         if not contexts:
             logger.warning(f"No contexts found for agent_type: {agent_type}")
             return None
@@ -91,7 +89,7 @@ class ContextMatcher:
         """
         logger.debug(f"Context matching prompt: {prompt}") # Increased length for better debug view
         try:
-            response = self.llm.invoke(prompt)
+            response = self.llm.invoke(prompt, timeout=timeout)
             response_text = response.content.strip()
             logger.debug(f"Raw LLM response for context ID: {response_text}")
 
@@ -125,45 +123,22 @@ class ContextMatcher:
             return None
 
     def get_query_by_id(self, context_id: int) -> Optional[str]:
-        logger.info(f"Fetching query for context_id: {context_id} from Oracle DB")
-        conn = None
-        try:
-            conn = oracle_db_utils.get_oracle_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT QUERY FROM QUERY_CONTEXTS WHERE ID = :context_id", context_id=context_id)
-            result = cursor.fetchone()
-            if result:
-                # Read the content from the LOB object
-                query_content = result[0].read() if isinstance(result[0], oracledb.LOB) else result[0]
-                logger.debug(f"Retrieved query: {query_content[:100]}...")
-                return query_content
-            logger.warning(f"No query found for context_id: {context_id}")
-            return None
-        except oracledb.Error as e:
-            error_obj, = e.args
-            logger.error(f"Oracle DB error fetching query for context_id {context_id}: {error_obj.message}", exc_info=True)
-            return None
-        except ConnectionError as e:
-            logger.error(f"Connection error fetching query: {str(e)}", exc_info=True)
-            return None
-        except Exception as e:
-            logger.error(f"Unexpected error fetching query: {str(e)}", exc_info=True)
-            return None
-        finally:
-            if conn:
-                oracle_db_utils.release_oracle_connection(conn)
+        if Config.CONTEXT_CACHE_TTL_SECONDS > 0:
+            entry = self._queries_by_id.get(context_id)
+            if self._fresh(entry):
+                return entry[1]
+        query = self.chat_store.get_context_query(context_id)
+        if query and Config.CONTEXT_CACHE_TTL_SECONDS > 0:
+            with self._cache_lock:
+                self._queries_by_id[context_id] = (time.monotonic(), query)
+        return query
 
 class BaseQueryTools:
     def __init__(self):
-        self.llm = AzureChatOpenAI(
-            azure_endpoint=Config.AZURE_OPENAI_ENDPOINT,
-            api_key=Config.AZURE_OPENAI_KEY,
-            api_version="2024-08-01-preview",
-            deployment_name="gpt-35-turbo"
-        )
+        self.llm = get_llm()
         logger.info("BaseQueryTools initialized")
 
-    def modify_query_based_on_input(self, user_input: str, base_query: str, prompt_template: str, columns: Dict[str, str]) -> Dict[str, Any]:
+    def modify_query_based_on_input(self, user_input: str, base_query: str, prompt_template: str, columns: Dict[str, str], feedback: Optional[str] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
         logger.info(f"Modifying query based on user input: {user_input}")
         logger.debug(f"Base query: {base_query}")
         try:
@@ -172,8 +147,16 @@ class BaseQueryTools:
                 original_query=base_query,
                 columns=columns
             )
+            if feedback:
+                # Regeneration after a failed pre-flight validation: tell the model exactly what was wrong.
+                prompt += f"""
+        Your previous attempt was rejected before execution for the following reasons:
+        {feedback}
+
+        Fix every problem listed above and return ONLY the corrected SQL query.
+        """
             logger.debug(f"Query modification prompt: {prompt[:200]}...")
-            response = self.llm.invoke(prompt)
+            response = self.llm.invoke(prompt, timeout=timeout)
             modified_query = response.content.strip()
             logger.info("Modified query created")
             logger.debug(f"Modified query: {modified_query}")
@@ -189,9 +172,9 @@ class BaseQueryTools:
                 "modified_query": None
             }
 
-    def generate_sql(self, user_input: str, base_query: str, prompt_template: str, columns: Dict[str, str]) -> str:
+    def generate_sql(self, user_input: str, base_query: str, prompt_template: str, columns: Dict[str, str], feedback: Optional[str] = None, timeout: Optional[float] = None) -> str:
         logger.info("Generating SQL query")
-        result = self.modify_query_based_on_input(user_input, base_query, prompt_template, columns)
+        result = self.modify_query_based_on_input(user_input, base_query, prompt_template, columns, feedback, timeout)
         if not result.get("success"):
             logger.error(f"Failed to generate SQL: {result.get('error')}")
             raise Exception(result.get("error"))
@@ -260,10 +243,10 @@ class SCMQueryTools(BaseQueryTools):
         }
         logger.info("SCMQueryTools initialized")
 
-    def generate_sql(self, user_input: str, base_query: str) -> str:
+    def generate_sql(self, user_input: str, base_query: str, feedback: Optional[str] = None, timeout: Optional[float] = None) -> str:
         logger.info(f"SCMQueryTools: Generating SQL for input: {user_input}")
         logger.debug(f"SCMQueryTools: Base query: {base_query[:100]}...")
-        result = super().generate_sql(user_input, base_query, self.prompt_template, self.columns)
+        result = super().generate_sql(user_input, base_query, self.prompt_template, self.columns, feedback, timeout)
         logger.info("SCMQueryTools: SQL generation completed")
         logger.debug(f"SCMQueryTools: Generated SQL: {result[:100]}...")
         return result
@@ -338,27 +321,90 @@ class HCMQueryTools(BaseQueryTools):
         }
         logger.info("HCMQueryTools initialized") #
 
-    def generate_sql(self, user_input: str, base_query: str) -> str:
+    def generate_sql(self, user_input: str, base_query: str, feedback: Optional[str] = None, timeout: Optional[float] = None) -> str:
         logger.info(f"HCMQueryTools: Generating SQL for input: {user_input}") #
         logger.debug(f"HCMQueryTools: Base query: {base_query[:100]}...") #
-        result = super().generate_sql(user_input, base_query, self.prompt_template, self.columns) #
+        result = super().generate_sql(user_input, base_query, self.prompt_template, self.columns, feedback, timeout) #
         logger.info("HCMQueryTools: SQL generation completed") #
         logger.debug(f"HCMQueryTools: Generated SQL: {result[:100]}...") #
         return result
 
+# Name of the analytic COUNT(*) column added to preview queries
+PREVIEW_TOTAL_COLUMN = "PREVIEW_TOTAL_ROWS"
+
+# The SOAP response is read in chunks of this size and its reportBytes decoded as they arrive
+_DOWNLOAD_CHUNK_BYTES = 256 * 1024
+_REPORT_BYTES_OPEN_RE = re.compile(rb"<(?:[\w.-]+:)?reportBytes(?:\s[^>]*)?>")
+_BASE64_WHITESPACE = b" \t\r\n"
+
+def warm_bip_connections(count: int) -> int:
+    """
+    Opens up to `count` keep-alive connections to each BIP endpoint (concurrent GETs of the service WSDL), so
+    the first reports after startup skip the TCP/TLS handshake. Returns how many requests got a response.
+    """
+    probes = [endpoint for endpoint in get_bip_router().all() for _ in range(min(count, endpoint.max_connections))]
+    def probe(endpoint: BIPEndpoint):
+        endpoint.session.get(endpoint.url, timeout=Config.BIP_TIMEOUT_SECONDS).close()
+        return True
+    opened = 0
+    with ThreadPoolExecutor(max_workers=max(1, len(probes))) as executor:
+        for endpoint, future in [(endpoint, executor.submit(probe, endpoint)) for endpoint in probes]:
+            try:
+                opened += future.result()
+            except requests.exceptions.RequestException as e:
+                logger.warning(f"BIP connection warm-up request to '{endpoint.name}' failed: {e}")
+    return opened
+
 class OracleBIPTool:
-    def __init__(self, endpoint_url: Optional[str] = None):
-        self.endpoint_url = Config.ORACLE_BIP_ENDPOINT
+    """Runs SQL through a BIP report. Calls go to the given BIPEndpoint (see bip_routing), or the default one."""
+
+    def __init__(self):
         logger.info("OracleBIPTool initialized")
 
-    def execute_query(self, query: str) -> str:
-        logger.info("OracleBIPTool: Encoding query for execution")
+    @staticmethod
+    def clean_query(query: str) -> str:
+        """Strips markdown fences, a leading 'sql' tag and trailing semicolons from LLM output."""
+        clean_query = query.replace("```", "").strip()
+        if clean_query.endswith(";"):
+            clean_query = clean_query.rstrip(";").strip()
+        if clean_query.lower().startswith("sql"): # Handle 'sql' prefix case-insensitively
+            clean_query = clean_query[3:].strip()
+        return clean_query
+
+    @classmethod
+    def build_preview_query(cls, query: str, row_limit: int) -> str:
+        """
+        Wraps a query so BIP returns at most row_limit rows plus the total row count of the
+        full result in an extra PREVIEW_TOTAL_COLUMN column (one round trip, small payload).
+        """
+        clean_query = cls.clean_query(query)
+        return f"""SELECT * FROM (
+    SELECT preview_src.*, COUNT(*) OVER () AS {PREVIEW_TOTAL_COLUMN}
+    FROM (
+{clean_query}
+    ) preview_src
+) WHERE ROWNUM <= {int(row_limit)}"""
+
+    def execute_query(self, query: str, timeout: Optional[float] = None, endpoint: Optional[BIPEndpoint] = None) -> str:
+        csv_data = self.execute_query_bytes(query, timeout, endpoint).decode("utf-8")
+        logger.debug(f"OracleBIPTool: CSV Data: {csv_data[:200]}...")
+        return csv_data
+
+    def execute_query_bytes(self, query: str, timeout: Optional[float] = None, endpoint: Optional[BIPEndpoint] = None) -> bytes:
+        """Runs the query and returns the report's CSV bytes undecoded (file exports store them as-is)."""
+        return self.execute_query_spillable(query, timeout, endpoint=endpoint)
+
+    def execute_query_spillable(self, query: str, timeout: Optional[float] = None, budget: Optional[MemoryBudget] = None,
+                                stage: str = "bip download", endpoint: Optional[BIPEndpoint] = None) -> Union[bytes, SpilledCSV]:
+        """
+        Runs the query and returns the report's CSV bytes, or, when a memory budget is given and the
+        report outgrows its spill threshold, a SpilledCSV holding them in a memory-mapped temp file.
+        Waiting for one of the endpoint's execution slots counts against the timeout.
+        """
+        endpoint = endpoint or get_bip_router().get(None)
+        logger.info(f"OracleBIPTool: Encoding query for execution on BIP endpoint '{endpoint.name}'")
         try:
-            clean_query = query.replace("```", "").strip()
-            if clean_query.endswith(";"):
-                clean_query = clean_query.rstrip(";").strip()
-            if clean_query.lower().startswith("sql"): # Handle 'sql' prefix case-insensitively
-                clean_query = clean_query[3:].strip()
+            clean_query = self.clean_query(query)
             
             # Replace 'sysdate' with 'SYSDATE' for consistency with Oracle
             # Replace 'fnd_global.timezone' with a fixed timezone like 'UTC' if it's not directly available in the environment
@@ -388,7 +434,7 @@ class OracleBIPTool:
                 </pub:values>
             </pub:item>
             </pub:parameterNameValues>
-            <pub:reportAbsolutePath>/Custom/SCM AI Agent/SQLConnectReportCSV.xdo</pub:reportAbsolutePath>
+            <pub:reportAbsolutePath>{endpoint.report_path}</pub:reportAbsolutePath>
             <pub:sizeOfDataChunkDownload>-1</pub:sizeOfDataChunkDownload>
         </pub:reportRequest>
         </pub:runReport>
@@ -400,41 +446,76 @@ class OracleBIPTool:
                 "Content-Type": "application/soap+xml;charset=UTF-8",
                 "SOAPAction": "runReport"
             }
-            logger.info("OracleBIPTool: Sending SOAP request to Oracle BIP service")
-            response = requests.post(
-                self.endpoint_url,
-                data=xml_payload,
-                auth=(Config.ORACLE_FUSION_USER, Config.ORACLE_FUSION_PASS),
-                headers=headers,
-                timeout=60  # Set a reasonable timeout for the request
-            )
-
-
-
-            
-            logger.info(f"OracleBIPTool: Received response with status code: {response.status_code}")
-            print("OracleBIPTool: SOAP Response Text:"+response.text)
-            response.raise_for_status()
-            logger.info("OracleBIPTool: Parsing XML response from Oracle BIP service")
-            root = ET.fromstring(response.text)
-            namespaces = {     "env": "http://www.w3.org/2003/05/soap-envelope",     "ns2": "http://xmlns.oracle.com/oxp/service/PublicReportService" }
-            report_bytes_elem = root.find(".//ns2:reportBytes", namespaces)
-            if report_bytes_elem is None or report_bytes_elem.text is None:
-                logger.error("OracleBIPTool: reportBytes element not found or empty in the response")
-                raise ValueError("reportBytes element not found or empty in the response from BIP service.")
-            base64_data = report_bytes_elem.text
-            csv_data = base64.b64decode(base64_data).decode("utf-8")
-            logger.info("OracleBIPTool: Successfully decoded CSV data from Oracle BIP response")
-            logger.debug(f"OracleBIPTool: CSV Data: {csv_data[:200]}...")
-            return csv_data
+            request_timeout = min(timeout, Config.BIP_TIMEOUT_SECONDS) if timeout else Config.BIP_TIMEOUT_SECONDS
+            started = time.monotonic()
+            with endpoint.slot(request_timeout):
+                logger.info("OracleBIPTool: Sending SOAP request to Oracle BIP service")
+                response = endpoint.session.post(
+                    endpoint.url,
+                    data=xml_payload,
+                    auth=endpoint.auth,
+                    headers=headers,
+                    timeout=max(0.1, request_timeout - (time.monotonic() - started)),
+                    stream=True
+                )
+
+                logger.info(f"OracleBIPTool: Received response with status code: {response.status_code}")
+                with response:
+                    response.raise_for_status()
+                    # The base64 reportBytes are decoded chunk by chunk as they arrive, instead of holding the
+                    # response text, its parsed XML tree, the base64 string and the decoded bytes at once.
+                    logger.info("OracleBIPTool: Decoding reportBytes from the Oracle BIP response stream")
+                    sink = SpillWriter(budget.spill_threshold if budget is not None else None)
+                    try:
+                        self._stream_report_bytes(response, sink)
+                    except Exception:
+                        sink.abort()
+                        raise
+            result = sink.finish()
+            # A spilled report held at most the spill threshold in memory before moving to disk
+            record_stage(budget, stage, min(sink.size, sink.threshold) if isinstance(result, SpilledCSV) else len(result))
+            logger.info(f"OracleBIPTool: Successfully decoded {sink.size} bytes of CSV data from Oracle BIP response"
+                        f"{' (spilled to disk)' if isinstance(result, SpilledCSV) else ''}")
+            return result
+        except BIPEndpointBusy as busy_e:
+            logger.warning(f"OracleBIPTool: {busy_e}")
+            raise
         except requests.exceptions.RequestException as req_e:
             logger.error(f"OracleBIPTool: HTTP/Request error executing query: {req_e}", exc_info=True)
             raise RuntimeError(f"Failed to connect to Oracle BIP service: {req_e}")
-        except ET.ParseError as parse_e:
-            logger.error(f"OracleBIPTool: XML parsing error: {parse_e}. Response: {response.text[:500] if 'response' in locals() else 'No response'}", exc_info=True)
+        except binascii.Error as parse_e:
+            logger.error(f"OracleBIPTool: Response parsing error: {parse_e}", exc_info=True)
             raise RuntimeError(f"Failed to parse BIP response: {parse_e}")
         except Exception as e:
             logger.error(f"OracleBIPTool: Unexpected error executing query: {str(e)}", exc_info=True)
             raise RuntimeError(f"An unexpected error occurred during BIP query execution: {str(e)}")
 
+    @staticmethod
+    def _stream_report_bytes(response, sink: SpillWriter) -> None:
+        """Finds the reportBytes element in the streamed SOAP response and base64-decodes its text into sink."""
+        pending = b""
+        in_report = False
+        for chunk in response.iter_content(chunk_size=_DOWNLOAD_CHUNK_BYTES):
+            pending += chunk
+            if not in_report:
+                match = _REPORT_BYTES_OPEN_RE.search(pending)
+                if match is None:
+                    # Keep a tail in case the opening tag is split across two chunks
+                    pending = pending[-512:]
+                    continue
+                in_report = True
+                pending = pending[match.end():]
+            end = pending.find(b"<")
+            data = (pending if end < 0 else pending[:end]).translate(None, _BASE64_WHITESPACE)
+            # Decode whole 4-character groups; the remainder waits for the next chunk
+            usable = len(data) if end >= 0 else len(data) - len(data) % 4
+            sink.write(base64.b64decode(data[:usable]))
+            if end >= 0:
+                if sink.size == 0:
+                    break
+                return
+            pending = data[usable:]
+        logger.error(f"OracleBIPTool: reportBytes element not found or empty in the response: {pending[:500]!r}")
+        raise ValueError("reportBytes element not found or empty in the response from BIP service.")
+
 oracle_bip_tool = OracleBIPTool()
\ No newline at end of file
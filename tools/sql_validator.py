@@ -0,0 +1,314 @@
+import hashlib
+import logging
+import re
+import threading
+from typing import Dict, Any, Optional, List, Set, Tuple
+
+logger = logging.getLogger("sql_validator")
+
+# Statements that must never reach BIP. The generated SQL is only ever meant to be a read-only SELECT.
+FORBIDDEN_KEYWORDS = {
+    "INSERT", "UPDATE", "DELETE", "MERGE", "DROP", "ALTER", "CREATE", "TRUNCATE",
+    "GRANT", "REVOKE", "BEGIN", "DECLARE", "EXECUTE", "EXEC", "CALL", "COMMIT", "ROLLBACK"
+}
+
+# Keywords that end a FROM/JOIN item list; an identifier with one of these names is never an alias.
+CLAUSE_KEYWORDS = {
+    "WHERE", "GROUP", "ORDER", "HAVING", "UNION", "MINUS", "INTERSECT", "EXCEPT", "CONNECT", "START",
+    "FETCH", "OFFSET", "FOR", "ON", "USING", "JOIN", "INNER", "LEFT", "RIGHT", "FULL", "OUTER", "CROSS",
+    "NATURAL", "SELECT", "FROM", "AS", "PARTITION", "MODEL", "PIVOT", "UNPIVOT", "SAMPLE", "WITH", "AND",
+    "OR", "NOT", "LATERAL", "APPLY", "WINDOW", "QUALIFY", "LIMIT", "RETURNING", "INTO", "VALUES", "SET",
+    "BY", "THEN", "ELSE", "END", "WHEN", "CASE", "IS", "NULL", "IN", "EXISTS", "BETWEEN", "LIKE",
+}
+
+# Functions whose argument list uses FROM as a keyword rather than introducing a table (EXTRACT(YEAR FROM x)).
+FROM_ARGUMENT_FUNCTIONS = {"EXTRACT", "TRIM", "SUBSTRING", "OVERLAY", "POSITION"}
+
+# Pseudo-qualifiers that look like alias.column but are sequences, packages or session objects.
+NON_ALIAS_QUALIFIERS = {"DUAL", "SYS", "USERENV", "DBMS_LOB", "DBMS_RANDOM"}
+
+_TOKEN_RE = re.compile(
+    r"""
+    (?P<ident>[A-Za-z_][A-Za-z0-9_$#]*(?:\s*\.\s*(?:[A-Za-z_][A-Za-z0-9_$#]*|\*))*)
+    | (?P<number>\d+(?:\.\d+)?)
+    | (?P<punct>[(),;*])
+    | (?P<other>\S)
+    """,
+    re.VERBOSE,
+)
+
+
+def strip_literals_and_comments(sql: str) -> str:
+    """Blanks out string literals, quoted identifiers and comments so they cannot be mistaken for SQL."""
+    result = []
+    i = 0
+    length = len(sql)
+    while i < length:
+        ch = sql[i]
+        if ch == "-" and sql.startswith("--", i):
+            end = sql.find("\n", i)
+            i = length if end == -1 else end
+            result.append(" ")
+        elif ch == "/" and sql.startswith("/*", i):
+            end = sql.find("*/", i + 2)
+            i = length if end == -1 else end + 2
+            result.append(" ")
+        elif ch in ("'", '"'):
+            quote = ch
+            i += 1
+            while i < length:
+                if sql[i] == quote:
+                    if i + 1 < length and sql[i + 1] == quote:  # escaped quote ('' or "")
+                        i += 2
+                        continue
+                    break
+                i += 1
+            i += 1
+            # A quoted identifier is kept as a neutral word so "AS "Item Number"" still parses as an alias.
+            result.append(" QUOTED_IDENT " if quote == '"' else " '' ")
+        else:
+            result.append(ch)
+            i += 1
+    return "".join(result)
+
+
+def _tokenize(sql: str) -> List[Tuple[str, str]]:
+    tokens = []
+    for match in _TOKEN_RE.finditer(sql):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "ident":
+            value = re.sub(r"\s+", "", value)
+        tokens.append((kind, value))
+    return tokens
+
+
+def _is_alias_token(token: Optional[Tuple[str, str]]) -> bool:
+    return (
+        token is not None
+        and token[0] == "ident"
+        and "." not in token[1]
+        and token[1].upper() not in CLAUSE_KEYWORDS
+    )
+
+
+def _matching_paren(tokens: List[Tuple[str, str]], start: int) -> int:
+    depth = 0
+    for idx in range(start, len(tokens)):
+        if tokens[idx][1] == "(":
+            depth += 1
+        elif tokens[idx][1] == ")":
+            depth -= 1
+            if depth == 0:
+                return idx
+    return len(tokens) - 1
+
+
+def analyze_sql(sql: str) -> Dict[str, Any]:
+    """
+    Extracts the structural facts the validator needs from a SELECT statement:
+    table aliases (alias -> table), derived aliases (CTEs and inline views) and
+    qualified column references (alias -> set of columns).
+    """
+    tokens = _tokenize(strip_literals_and_comments(sql))
+    table_aliases: Dict[str, str] = {}
+    derived_aliases: Set[str] = set()
+    references: Dict[str, Set[str]] = {}
+    function_stack: List[Optional[str]] = []
+    from_positions: Set[int] = set()
+
+    def parse_item(idx: int, allow_list: bool) -> None:
+        while idx < len(tokens):
+            kind, value = tokens[idx]
+            if value == "(":
+                close = _matching_paren(tokens, idx)
+                nxt = close + 1
+                if nxt < len(tokens) and tokens[nxt][1].upper() == "AS":
+                    nxt += 1
+                if nxt < len(tokens) and _is_alias_token(tokens[nxt]):
+                    derived_aliases.add(tokens[nxt][1].upper())
+                    nxt += 1
+                idx = nxt
+            elif kind == "ident" and value.upper() not in CLAUSE_KEYWORDS:
+                from_positions.add(idx)
+                table_name = value.upper()
+                nxt = idx + 1
+                if nxt < len(tokens) and tokens[nxt][1] == "(":  # TABLE(...) collection expression
+                    close = _matching_paren(tokens, nxt)
+                    nxt = close + 1
+                    table_name = None
+                if nxt < len(tokens) and tokens[nxt][1].upper() == "AS":
+                    nxt += 1
+                if nxt < len(tokens) and _is_alias_token(tokens[nxt]):
+                    alias = tokens[nxt][1].upper()
+                    nxt += 1
+                else:
+                    alias = table_name.split(".")[-1] if table_name else None
+                if alias:
+                    if table_name:
+                        table_aliases[alias] = table_name
+                    else:
+                        derived_aliases.add(alias)
+                idx = nxt
+            else:
+                return
+            if allow_list and idx < len(tokens) and tokens[idx][1] == ",":
+                idx += 1
+                continue
+            return
+
+    # CTE names: WITH name AS (...), name AS (...)
+    cte_names: Set[str] = set()
+    if tokens and tokens[0][1].upper() == "WITH":
+        idx = 1
+        while idx + 2 < len(tokens) and _is_alias_token(tokens[idx]) and tokens[idx + 1][1].upper() == "AS":
+            cte_names.add(tokens[idx][1].upper())
+            idx = _matching_paren(tokens, idx + 2) + 1
+            if idx < len(tokens) and tokens[idx][1] == ",":
+                idx += 1
+                continue
+            break
+
+    previous_ident: Optional[str] = None
+    for idx, (kind, value) in enumerate(tokens):
+        upper = value.upper()
+        if value == "(":
+            function_stack.append(previous_ident)
+        elif value == ")":
+            if function_stack:
+                function_stack.pop()
+        elif kind == "ident" and upper in ("FROM", "JOIN"):
+            inside_function = function_stack and function_stack[-1] in FROM_ARGUMENT_FUNCTIONS
+            if not inside_function:
+                parse_item(idx + 1, allow_list=(upper == "FROM"))
+        previous_ident = upper if kind == "ident" else None
+
+    # A FROM item naming a CTE is a derived source, not a base table.
+    for alias, table in list(table_aliases.items()):
+        if table in cte_names:
+            derived_aliases.add(alias)
+            del table_aliases[alias]
+    derived_aliases.update(cte_names)
+
+    for idx, (kind, value) in enumerate(tokens):
+        if kind != "ident" or "." not in value or idx in from_positions:
+            continue
+        is_outer_join_marker = idx + 3 < len(tokens) and [t[1] for t in tokens[idx + 1:idx + 4]] == ["(", "+", ")"]
+        if idx + 1 < len(tokens) and tokens[idx + 1][1] == "(" and not is_outer_join_marker:  # package.function(...) call
+            continue
+        parts = value.upper().split(".")
+        qualifier, column = parts[-2], parts[-1]
+        if qualifier in NON_ALIAS_QUALIFIERS or column in ("NEXTVAL", "CURRVAL"):
+            continue
+        references.setdefault(qualifier, set()).add(column)
+
+    return {
+        "first_keyword": tokens[0][1].upper() if tokens else "",
+        "keywords": {value.upper() for kind, value in tokens if kind == "ident" and "." not in value},
+        "statement_count": 1 + sum(1 for idx, (_, value) in enumerate(tokens) if value == ";" and idx < len(tokens) - 1),
+        "table_aliases": table_aliases,
+        "derived_aliases": derived_aliases,
+        "references": references,
+    }
+
+
+def _unqualified(table: str) -> str:
+    # FUSION.MTL_SYSTEM_ITEMS_B and MTL_SYSTEM_ITEMS_B are the same table to the BIP data source
+    return table.rsplit(".", 1)[-1]
+
+
+class SQLValidator:
+    """
+    Local pre-flight checks for LLM-generated SQL, run before the query is sent to BIP.
+    Metadata about each base query (its aliases and the columns the columns map allows)
+    is computed once per context and cached.
+    """
+
+    def __init__(self):
+        self._metadata_cache: Dict[Any, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        logger.info("SQLValidator initialized")
+
+    def get_metadata(self, base_query: str, columns: Dict[str, str], context_id: Optional[int] = None) -> Dict[str, Any]:
+        """Returns the cached validation metadata for a base query, computing it on first use."""
+        digest = hashlib.sha1((base_query + repr(sorted(columns.items()))).encode("utf-8")).hexdigest()
+        cache_key = context_id if context_id is not None else digest
+        with self._lock:
+            cached = self._metadata_cache.get(cache_key)
+            if cached and cached["digest"] == digest:
+                return cached
+
+        base = analyze_sql(base_query)
+        allowed_columns: Dict[str, Set[str]] = {}
+        for alias, cols in base["references"].items():
+            allowed_columns.setdefault(alias, set()).update(cols)
+        for expression in columns.values():
+            for alias, cols in analyze_sql(f"SELECT {expression} FROM DUAL")["references"].items():
+                allowed_columns.setdefault(alias, set()).update(cols)
+
+        # Generated SQL may reach a base table under an alias of its own (e.g. in a subquery), so the allowed
+        # columns are also kept per table: those of every alias the base query gives that table
+        table_columns: Dict[str, Set[str]] = {}
+        for alias, table in base["table_aliases"].items():
+            table_columns.setdefault(_unqualified(table), set()).update(allowed_columns.get(alias, set()))
+
+        metadata = {
+            "digest": digest,
+            "table_aliases": {alias: _unqualified(table) for alias, table in base["table_aliases"].items()},
+            "table_columns": table_columns,
+        }
+        with self._lock:
+            self._metadata_cache[cache_key] = metadata
+        logger.debug(f"SQLValidator: Cached metadata for context {context_id}: aliases={sorted(base['table_aliases'])}")
+        return metadata
+
+    def validate(self, sql: str, base_query: str, columns: Dict[str, str], context_id: Optional[int] = None) -> Dict[str, Any]:
+        """Validates generated SQL against the matched base query. Returns {"valid": bool, "errors": [...]}."""
+        errors: List[str] = []
+        if not sql or not sql.strip():
+            return {"valid": False, "errors": ["The generated SQL is empty."]}
+
+        metadata = self.get_metadata(base_query, columns, context_id)
+        generated = analyze_sql(sql)
+
+        if generated["first_keyword"] not in ("SELECT", "WITH"):
+            errors.append(f"Only SELECT statements are allowed, but the query starts with '{generated['first_keyword'] or sql.strip()[:20]}'.")
+        forbidden = sorted(generated["keywords"] & FORBIDDEN_KEYWORDS)
+        if forbidden:
+            errors.append(f"The query contains forbidden keyword(s): {', '.join(forbidden)}.")
+        if generated["statement_count"] > 1:
+            errors.append("The query must be a single statement.")
+
+        base_aliases = metadata["table_aliases"]
+        defined = set(generated["table_aliases"]) | generated["derived_aliases"]
+        table_columns = metadata["table_columns"]
+        generated_tables = {alias: _unqualified(table) for alias, table in generated["table_aliases"].items()}
+        for alias, table in sorted(generated_tables.items()):
+            if alias in base_aliases and base_aliases[alias] != table:
+                errors.append(f"Alias '{alias.lower()}' refers to {table.lower()}, but in the base query it refers to {base_aliases[alias].lower()}.")
+            elif table not in table_columns:
+                errors.append(f"Table {table.lower()} (alias '{alias.lower()}') is not used in the base query.")
+
+        for alias, cols in sorted(generated["references"].items()):
+            if alias not in defined:
+                errors.append(f"Alias '{alias.lower()}' is referenced but no table with that alias is in the FROM clause.")
+                continue
+            if alias not in generated_tables:
+                continue  # columns of CTEs and inline views are not tracked
+            if generated_tables[alias] not in table_columns:
+                continue  # the table itself was reported above
+            allowed = table_columns[generated_tables[alias]]
+            if "*" in allowed:
+                continue
+            unknown = sorted(col for col in cols if col != "*" and col not in allowed)
+            if unknown:
+                errors.append(f"Column(s) {', '.join(f'{alias.lower()}.{c.lower()}' for c in unknown)} are not used in the base query or the columns map.")
+
+        if errors:
+            logger.warning(f"SQLValidator: Rejected generated SQL with {len(errors)} error(s): {errors}")
+        else:
+            logger.debug("SQLValidator: Generated SQL passed validation")
+        return {"valid": not errors, "errors": errors}
+
+
+sql_validator = SQLValidator()